@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули приложения лежат плоско в мл_итог/tikcet и импортируются по имени
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'мл_итог', 'tikcet'))
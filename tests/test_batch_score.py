@@ -0,0 +1,32 @@
+import csv
+import io
+import sys
+
+import pytest
+
+import batch_score
+import model_bundle
+
+
+def run(argv):
+    return batch_score.run(batch_score.parse_args(argv))
+
+
+def test_scores_training_csv_from_stdin(tmp_path, monkeypatch):
+    # Обучающий CSV разделен одними CR - stdin должен читаться так же, как файл
+    with open(model_bundle.TRAINING_DATA, 'rb') as f:
+        monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BytesIO(f.read())))
+    output = tmp_path / 'out.csv'
+    assert run(['-', '-o', str(output)]) == 0
+    with open(output, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1000
+    assert {row['prediction'] for row in rows} <= {'N', 'P', 'Y'}
+
+
+@pytest.mark.parametrize('content', ['', 'ID,Gender,AGE\n1,M,50\n'], ids=['empty', 'missing-columns'])
+def test_bad_input_exits_with_error(tmp_path, capsys, content):
+    source = tmp_path / 'in.csv'
+    source.write_text(content, encoding='utf-8')
+    assert run([str(source), '-o', str(tmp_path / 'out.csv')]) == 1
+    assert capsys.readouterr().err.startswith("ошибка:")
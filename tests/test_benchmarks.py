@@ -0,0 +1,68 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+import benchmarks
+from benchmarks import SyntheticPatients, compare, metric
+from prediction_store import INSERT_SQL, create_schema
+
+
+@pytest.fixture(scope='module')
+def patients():
+    return SyntheticPatients(seed=3)
+
+
+def test_synthetic_patients_are_reproducible_and_in_range(patients):
+    X = patients.sample(2000)
+    np.testing.assert_array_equal(X, SyntheticPatients(seed=3).sample(2000))
+    assert (X >= patients.low).all() and (X <= patients.high).all()
+    assert set(np.unique(X[:, 0])) <= {0.0, 1.0}
+    np.testing.assert_array_equal(X[:, 1], np.round(X[:, 1]))
+
+
+def test_history_rows_fit_the_predictions_table(patients):
+    rows = list(patients.history_rows(50))
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+    conn = sqlite3.connect(':memory:')
+    create_schema(conn)
+    conn.executemany(INSERT_SQL, rows)
+    assert conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 50
+    conn.close()
+
+
+def test_compare_counts_regressions_over_threshold(capsys):
+    baseline = {
+        'slow': metric(10.0, 'ms'),
+        'steady': metric(10.0, 'ms'),
+        'throughput': metric(1000.0, 'rows/s', better='higher'),
+        'zero': metric(0.0, 'ms'),
+    }
+    results = {
+        'slow': metric(11.5, 'ms'),
+        'steady': metric(10.9, 'ms'),
+        'throughput': metric(850.0, 'rows/s', better='higher'),
+        'zero': metric(5.0, 'ms'),
+        'new': metric(1.0, 'ms'),
+    }
+    assert compare(results, baseline) == 2
+    out = capsys.readouterr().out
+    assert out.count("РЕГРЕССИЯ") == 2
+    assert 'new' not in out and 'zero' not in out
+
+
+def test_main_writes_report_and_compares(tmp_path):
+    output = tmp_path / 'bench.json'
+    assert benchmarks.main(['--only', 'dataset', '-o', str(output)]) == 0
+    with open(output, encoding='utf-8') as f:
+        report = json.load(f)
+    assert {'revision', 'python', 'numpy', 'cpus'} <= set(report['meta'])
+    assert report['results'] and all(name.startswith('dataset.') for name in report['results'])
+
+    # Прошлый прогон в 100 раз быстрее - код возврата сообщает о регрессии
+    for result in report['results'].values():
+        result['value'] /= 100 if result['better'] == 'lower' else 0.01
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f)
+    assert benchmarks.main(['--only', 'dataset', '--compare', str(output)]) == 1
@@ -0,0 +1,111 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+import drift_monitor
+import scoring
+from drift_monitor import EDGES, MIN_ROWS, PSI_FLOOR, DriftMonitor, open_history
+from model_bundle import BundleScaler
+from prediction_store import INSERT_SQL, create_schema
+
+N_FEATURES = len(scoring.FEATURES)
+N_BINS = len(EDGES) + 1
+
+
+def unit_scaler():
+    return BundleScaler(np.zeros(N_FEATURES), np.ones(N_FEATURES))
+
+
+def test_block_merge_matches_numpy():
+    rng = np.random.default_rng(0)
+    X = rng.normal(loc=np.arange(N_FEATURES), scale=np.arange(1, N_FEATURES + 1), size=(1000, N_FEATURES))
+    monitor = DriftMonitor(unit_scaler(), np.full((N_FEATURES, N_BINS), 1 / N_BINS))
+    start = 0
+    for size in (1, 7, 300, 2, 690):
+        block = X[start:start + size]
+        start += size
+        # Строка с пропуском не учитывается
+        monitor.update(np.vstack([block, np.full((1, N_FEATURES), np.nan)]))
+    assert monitor.count == len(X)
+    np.testing.assert_allclose(monitor.mean, X.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(monitor.m2 / monitor.count, X.var(axis=0), rtol=1e-10)
+    np.testing.assert_array_equal(monitor.hist, drift_monitor._bin_counts(X))
+
+    restored = DriftMonitor(unit_scaler(), monitor.reference)
+    assert restored.restore(monitor.state())
+    restored.update(X[:10])
+    np.testing.assert_allclose(restored.mean, np.vstack([X, X[:10]]).mean(axis=0), rtol=1e-12)
+
+
+def test_psi_values():
+    reference = np.full((N_FEATURES, N_BINS), 1 / N_BINS)
+    monitor = DriftMonitor(unit_scaler(), reference)
+    # Все строки в одной корзине: PSI считается по формуле с полом PSI_FLOOR для пустых корзин
+    monitor.update(np.full((MIN_ROWS, N_FEATURES), 0.1))
+    e = 1 / N_BINS
+    psi = (1 - e) * np.log(1 / e) + (N_BINS - 1) * (PSI_FLOOR - e) * np.log(PSI_FLOOR / e)
+    report = monitor.report()
+    assert [item['psi'] for item in report['features']] == [round(psi, 4)] * N_FEATURES
+    assert {item['status'] for item in report['features']} == {'drift'}
+
+    same = DriftMonitor(unit_scaler(), drift_monitor._bin_counts(np.full((1, N_FEATURES), 0.1)))
+    same.update(np.full((MIN_ROWS - 1, N_FEATURES), 0.1))
+    assert {item['psi'] for item in same.report()['features']} == {0.0}
+    assert {item['status'] for item in same.report()['features']} == {'few'}
+    same.update(np.full((1, N_FEATURES), 0.1))
+    assert {item['status'] for item in same.report()['features']} == {'ok'}
+
+
+def test_normal_reference_flags_only_shifted_feature():
+    rng = np.random.default_rng(1)
+    monitor = DriftMonitor(unit_scaler(), drift_monitor.reference_histogram(unit_scaler(), None))
+    X = rng.standard_normal((20000, N_FEATURES))
+    X[:, 4] += 1.0
+    monitor.update(X)
+    assert monitor.drifted() == [scoring.FEATURES[4]]
+
+
+ROW = ('2026-01-02 10:00:00', 'МУЖСКОЙ', 50, 4.7, 46.0, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24.0, 'N', 0.95, None)
+
+
+def history_db(path, n):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.executemany(INSERT_SQL, [ROW] * n)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope='module')
+def scaler():
+    return scoring.load_artifacts()[1]
+
+
+def test_history_state_is_resumed_and_reset_for_recreated_db(tmp_path, scaler):
+    path, cache_dir = str(tmp_path / 'predictions.db'), str(tmp_path / 'cache')
+    history_db(path, 5)
+    assert open_history(scaler, path, cache_dir=cache_dir).count == 5
+
+    # Прочитанные строки удалены: 7 наберется, только если состояние взято из файла
+    conn = sqlite3.connect(path)
+    conn.execute("DELETE FROM predictions")
+    conn.executemany(INSERT_SQL, [ROW] * 2)
+    conn.commit()
+    conn.close()
+    monitor = open_history(scaler, path, cache_dir=cache_dir)
+    assert (monitor.count, monitor.last_id) == (7, 7)
+
+    # Пересозданная база: id снова с 1, прежнее состояние отбрасывается
+    history_db(path, 3)
+    monitor = open_history(scaler, path, cache_dir=cache_dir)
+    assert (monitor.count, monitor.last_id) == (3, 3)
+    # Другая база - свой файл состояния
+    other = str(tmp_path / 'other.db')
+    history_db(other, 1)
+    assert drift_monitor.state_path(scaler, other, cache_dir=cache_dir) != \
+        drift_monitor.state_path(scaler, path, cache_dir=cache_dir)
+    assert open_history(scaler, other, cache_dir=cache_dir).count == 1
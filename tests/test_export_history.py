@@ -0,0 +1,56 @@
+import csv
+import sqlite3
+
+import numpy as np
+
+import export_history
+from export_history import EXPORT_COLUMNS, export
+from prediction_store import INSERT_SQL, SCHEMA, create_schema
+
+ROWS = [
+    ('2026-01-02 10:00:00', 'МУЖСКОЙ', 50, 4.7, 46.0, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24.0, 'N', 0.95, None),
+    ('2026-01-03 11:30:00', 'ЖЕНСКИЙ', 45.5, 5.0, 70.0, 9.5, 5.0, 2.0, 1.0, 3.0, 1.0, 31.0, 'Y', 0.81,
+     '{"HbA1c": 0.3121, "BMI": -0.0456, "AGE": 0.0123}'),
+    ('2026-01-04 09:15:00', 'ЖЕНСКИЙ', 61, 3.1, 52.0, 6.1, 4.0, 1.1, 2.0, 2.2, 0.9, 27.5, 'P', 0.5,
+     '{' + ', '.join(f'"{name}": -0.1234' for name in export_history.FEATURES) + '}'),
+]
+
+
+def test_export_round_trips_every_column(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'predictions.db'))
+    create_schema(conn)
+    conn.executemany(INSERT_SQL, ROWS)
+    conn.commit()
+    expected = conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM predictions ORDER BY id").fetchall()
+    assert set(EXPORT_COLUMNS) == {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}
+
+    csv_path, npz_path = str(tmp_path / 'history.csv'), str(tmp_path / 'history.npz')
+    assert export(conn, csv_path, npz_path, chunk_size=2) == (3, 3)
+    conn.close()
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        assert next(reader) == EXPORT_COLUMNS
+        assert list(reader) == [['' if value is None else str(value) for value in row] for row in expected]
+
+    with np.load(npz_path) as npz:
+        assert sorted(npz.files) == sorted(EXPORT_COLUMNS)
+        for i, name in enumerate(EXPORT_COLUMNS):
+            values = [row[i] for row in expected]
+            if name == 'explanation':
+                values = ['' if value is None else value for value in values]
+            assert npz[name].tolist() == values, name
+        assert npz['age'].dtype == np.float64
+
+
+def test_export_database_without_explanation_column(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'old.db'))
+    conn.execute(SCHEMA.replace(',\n    explanation TEXT', ''))
+    conn.executemany(INSERT_SQL.replace(', explanation', '').replace(', ?)', ')'), [row[:-1] for row in ROWS])
+    conn.commit()
+    npz_path = str(tmp_path / 'history.npz')
+    assert export(conn, npz_path=npz_path) == (3, 3)
+    conn.close()
+    with np.load(npz_path) as npz:
+        assert npz['explanation'].tolist() == ['', '', '']
+        assert npz['age'].tolist() == [50.0, 45.5, 61.0]
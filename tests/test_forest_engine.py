@@ -0,0 +1,117 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import scoring
+from forest_engine import SMALL_BATCH, CompiledForest
+
+
+def synthetic():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 11)) * rng.uniform(0.5, 50, size=11) + rng.uniform(-5, 100, size=11)
+    y = (X[:, 4] > np.median(X[:, 4])).astype(int) + (X[:, 10] > np.percentile(X[:, 10], 70))
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=30, max_depth=8, random_state=0).fit(scaler.transform(X), y)
+    return model, scaler, rng.permutation(X)[:300]
+
+
+def shipped():
+    model, scaler, _ = scoring.load_artifacts()
+    with open(os.path.join(scoring.ARTIFACT_DIR, 'Dataset of Diabetes .csv'), newline='', encoding='utf-8-sig') as f:
+        records = list(csv.DictReader(f))
+    X = np.array([[scoring.encode_gender(r['Gender'])] + [float(r[name]) for name in scoring.FEATURES[1:]]
+                  for r in records])
+    return model, scaler, X
+
+
+@pytest.fixture(params=[synthetic, shipped], ids=['synthetic', 'shipped'], scope='module')
+def forest(request):
+    model, scaler, X_raw = request.param()
+    # Без имен колонок scaler, обученный на DataFrame, предупреждает; сверяемся с ним как есть
+    X_scaled = scaler.transform(pd.DataFrame(X_raw, columns=getattr(scaler, 'feature_names_in_', None)))
+    return model, scaler, X_raw, X_scaled
+
+
+def test_predict_matches_sklearn(forest):
+    model, _, _, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    assert len(X) > SMALL_BATCH
+    np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('rows', [1, 2, SMALL_BATCH])
+def test_small_batch_path_matches_sklearn(forest, rows):
+    model, _, _, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    X = X[:2 * SMALL_BATCH]
+    for start in range(0, len(X) - rows + 1, rows):
+        chunk = X[start:start + rows]
+        np.testing.assert_array_equal(engine.predict(chunk), model.predict(chunk))
+        np.testing.assert_allclose(engine.predict_proba(chunk), model.predict_proba(chunk), rtol=0, atol=1e-12)
+
+
+def test_fused_scaler_matches_two_step_path(forest):
+    model, scaler, X_raw, X_scaled = forest
+    fused = CompiledForest.from_sklearn(model).fuse_scaler(scaler)
+    np.testing.assert_array_equal(fused.predict(X_raw), model.predict(X_scaled))
+    np.testing.assert_allclose(fused.predict_proba(X_raw), model.predict_proba(X_scaled), rtol=0, atol=1e-12)
+    for start in range(0, len(X_raw), SMALL_BATCH):
+        np.testing.assert_allclose(fused.predict_proba(X_raw[start:start + SMALL_BATCH]),
+                                   model.predict_proba(X_scaled[start:start + SMALL_BATCH]), rtol=0, atol=1e-12)
+
+
+def test_early_exit_exact_mode_matches_predict(forest):
+    model, _, _, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    engine.tree_order = engine.order_trees(X)
+    labels, _, used = engine.predict_early(X)
+    np.testing.assert_array_equal(labels, model.predict(X))
+    assert (used <= engine.n_estimators).all()
+
+
+@pytest.mark.parametrize('rows', [1, 3, 5])
+def test_early_exit_small_batches_stop_early(forest, rows):
+    model, _, _, X = forest
+    engine = CompiledForest.from_sklearn(model)
+    engine.tree_order = engine.order_trees(X)
+    X = X[:20 * rows]
+    expected = model.predict(X)
+    used_exact, used_confident = [], []
+    for start in range(0, len(X), rows):
+        labels, _, used = engine.predict_early(X[start:start + rows])
+        np.testing.assert_array_equal(labels, expected[start:start + rows])
+        used_exact.extend(used)
+        used_confident.extend(engine.predict_early(X[start:start + rows], confidence=0.9)[2])
+    assert min(used_exact) < engine.n_estimators
+    assert np.mean(used_confident) < np.mean(used_exact)
+
+
+def test_standardize_matches_scaler_transform(forest):
+    _, scaler, X_raw, X_scaled = forest
+    np.testing.assert_array_equal(scoring.standardize(scaler, X_raw), X_scaled)
+
+
+def test_contributions_add_up_to_proba(forest):
+    model, scaler, X_raw, X_scaled = forest
+    for engine, X in ((CompiledForest.from_sklearn(model), X_scaled),
+                      (CompiledForest.from_sklearn(model).fuse_scaler(scaler), X_raw)):
+        bias, contrib = engine.contributions(X)
+        assert contrib.shape == (len(X), 11, len(model.classes_))
+        np.testing.assert_allclose(bias + contrib.sum(axis=1), model.predict_proba(X_scaled), rtol=0, atol=1e-9)
+
+
+def test_constant_feature_gets_no_contribution():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(300, 11))
+    X[:, 3] = 7.0
+    y = (X[:, 0] + X[:, 5] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    _, contrib = CompiledForest.from_sklearn(model).contributions(X[:5])
+    assert not contrib[:, 3].any()
+    assert contrib[:, [0, 5]].any()
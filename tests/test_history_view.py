@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+import history_view
+from prediction_store import INSERT_SQL, create_schema, fetch_history_page
+
+FEATURES = (50, 4.7, 46.0, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24.0)
+# (timestamp, пол, класс, вероятность); одинаковые timestamp - курсор различает их по id
+RECORDS = [
+    ('2026-01-01 09:00:00', 'МУЖСКОЙ', 'N', 0.95),
+    ('2026-01-01 09:00:00', 'ЖЕНСКИЙ', 'Y', 0.80),
+    ('2026-01-01 23:59:59', 'ЖЕНСКИЙ', 'P', 0.55),
+    ('2026-01-02 00:00:00', 'МУЖСКОЙ', 'Y', 0.99),
+    ('2026-01-02 12:00:00', 'МУЖСКОЙ', 'N', 0.60),
+    ('2026-01-02 12:00:00', 'ЖЕНСКИЙ', 'N', 0.70),
+    ('2026-01-03 08:00:00', 'ЖЕНСКИЙ', 'Y', 0.90),
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    create_schema(conn)
+    conn.executemany(INSERT_SQL, [(ts, gender, *FEATURES, label, p, None) for ts, gender, label, p in RECORDS])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def all_pages(conn, filters=None, limit=2):
+    ids, cursor = [], None
+    while True:
+        rows, cursor = fetch_history_page(conn, filters, cursor, limit)
+        if not rows:
+            return ids
+        ids.extend(row[0] for row in rows)
+
+
+def test_pages_walk_newest_first_without_gaps(conn):
+    assert all_pages(conn) == [7, 6, 5, 4, 3, 2, 1]
+    # Строки, добавленные между страницами, не сдвигают следующую страницу
+    rows, cursor = fetch_history_page(conn, limit=3)
+    conn.execute(INSERT_SQL, ('2026-01-04 10:00:00', 'МУЖСКОЙ', *FEATURES, 'N', 0.5, None))
+    rows, _ = fetch_history_page(conn, after=cursor, limit=3)
+    assert [row[0] for row in rows] == [4, 3, 2]
+
+
+@pytest.mark.parametrize('filters, expected', [
+    ({'gender': 'ЖЕНСКИЙ'}, [7, 6, 3, 2]),
+    ({'prediction': 'Y'}, [7, 4, 2]),
+    ({'date_from': '2026-01-02', 'date_to': '2026-01-02'}, [6, 5, 4]),
+    ({'date_to': '2026-01-01'}, [3, 2, 1]),
+    ({'prob_min': 0.7, 'prob_max': 0.95}, [7, 6, 2, 1]),
+    ({'gender': 'МУЖСКОЙ', 'prediction': 'N', 'date_from': '2026-01-02'}, [5]),
+])
+def test_filters_are_applied_in_sql(conn, filters, expected):
+    assert all_pages(conn, filters) == expected
+
+
+@pytest.mark.parametrize('filters', [{}, {'prediction': 'Y'}, {'date_from': '2026-01-02'}])
+def test_page_query_uses_index_instead_of_sorting(conn, filters):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    fetch_history_page(conn, filters, after=('2026-01-03 00:00:00', 9))
+    conn.set_trace_callback(None)
+    plan = ' '.join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + statements[-1]))
+    assert 'INDEX idx_predictions_' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+class Entry:
+    def __init__(self, value=''):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+def window(**values):
+    view = history_view.HistoryWindow.__new__(history_view.HistoryWindow)
+    view.gender_filter = Entry(values.get('gender', "ВСЕ"))
+    view.class_filter = Entry(values.get('prediction', "ВСЕ"))
+    for name in ('date_from', 'date_to', 'prob_min', 'prob_max'):
+        setattr(view, name, Entry(values.get(name, '')))
+    return view
+
+
+def test_read_filters_converts_form_values():
+    filters = window(gender="ЖЕНСКИЙ", prediction="ВЫСОКИЙ", date_from=' 2026-01-02 ', prob_min='70').read_filters()
+    assert filters == {'gender': "ЖЕНСКИЙ", 'prediction': 'Y', 'date_from': '2026-01-02', 'prob_min': 0.7}
+    assert window().read_filters() == {'gender': None, 'prediction': None}
+
+
+@pytest.mark.parametrize('values', [{'date_to': '02.01.2026'}, {'prob_min': 'abc'}, {'prob_max': '150'}])
+def test_read_filters_rejects_bad_values(values):
+    with pytest.raises(ValueError):
+        window(**values).read_filters()
+
+
+def test_format_row_names_class_and_percent(conn):
+    rows, _ = fetch_history_page(conn, limit=1)
+    assert history_view.format_row(rows[0])[-2:] == ("Высокий", "90.0%")
@@ -0,0 +1,98 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import model_bundle
+import scoring
+
+
+@pytest.fixture(scope='module')
+def artifacts():
+    return scoring.load_artifacts()
+
+
+def versions(path):
+    return sorted(name for name in os.listdir(path) if name.startswith('v'))
+
+
+def test_publish_swaps_pointer_and_keeps_previous_version(tmp_path, artifacts):
+    path = str(tmp_path / 'bundle')
+    model_bundle.build_bundle(*artifacts, path, training_data=None)
+    first = model_bundle.version_dir(path)
+    model_bundle.build_bundle(*artifacts, path, training_data=None)
+    second = model_bundle.version_dir(path)
+    assert second != first
+    # Читатель, успевший прочитать старый указатель, дочитывает свою версию целиком
+    engine, _, _, _ = model_bundle.load_bundle(first)
+    assert engine.n_estimators == artifacts[0].n_estimators
+    assert versions(path) == sorted(os.path.basename(p) for p in (first, second))
+
+    model_bundle.build_bundle(*artifacts, path, training_data=None)
+    assert os.path.basename(first) not in versions(path)
+    assert len(versions(path)) == 2
+
+
+def test_manifest_records_sklearn_version(tmp_path, artifacts):
+    import sklearn
+
+    manifest = model_bundle.build_bundle(*artifacts, str(tmp_path / 'bundle'), training_data=None)
+    assert manifest['sklearn_version'] == sklearn.__version__
+
+
+def test_flat_layout_still_loads(tmp_path, artifacts):
+    path = str(tmp_path / 'bundle')
+    model_bundle.build_bundle(*artifacts, path, training_data=None)
+    version = model_bundle.version_dir(path)
+    for name in os.listdir(version):
+        shutil.move(os.path.join(version, name), path)
+    os.rmdir(version)
+    os.remove(os.path.join(path, model_bundle.CURRENT_FILE))
+
+    engine, scaler, labels, _ = model_bundle.load_bundle(path)
+    X = np.asarray(scaler.mean_, dtype=np.float64).reshape(1, -1)
+    assert engine.predict(X)[0] in range(len(labels.classes_))
+    # Следующая сборка переводит бандл на версии и убирает файлы старого вида
+    model_bundle.build_bundle(*artifacts, path, training_data=None)
+    assert not os.path.exists(os.path.join(path, model_bundle.MANIFEST_FILE))
+    assert model_bundle.load_bundle(path)[3]['n_estimators'] == artifacts[0].n_estimators
+
+
+def copy_sources(target):
+    for name in (scoring.MODEL_FILE, scoring.SCALER_FILE, scoring.LABEL_ENCODER_FILE):
+        shutil.copy2(os.path.join(scoring.ARTIFACT_DIR, name), target / name)
+    return str(target)
+
+
+def test_is_stale_hashes_only_changed_sources(tmp_path, artifacts, monkeypatch):
+    model_dir = copy_sources(tmp_path)
+    manifest = model_bundle.build_bundle(*artifacts, str(tmp_path / 'bundle'), training_data=None,
+                                         source_dir=model_dir)
+    hashed = []
+    file_sha256 = model_bundle.file_sha256
+    monkeypatch.setattr(model_bundle, 'file_sha256', lambda path: hashed.append(path) or file_sha256(path))
+    assert not model_bundle.is_stale(manifest, model_dir)
+    assert hashed == []
+
+    # Тот же файл с новым mtime (копия) - хэш совпадает, бандл не устарел
+    label_encoder = os.path.join(model_dir, scoring.LABEL_ENCODER_FILE)
+    os.utime(label_encoder, ns=(0, 0))
+    assert not model_bundle.is_stale(manifest, model_dir)
+    assert hashed == [label_encoder]
+
+    with open(label_encoder, 'ab') as f:
+        f.write(b'\0')
+    assert model_bundle.is_stale(manifest, model_dir)
+
+
+def test_missing_bundle_is_built_on_load(tmp_path):
+    model_dir = copy_sources(tmp_path)
+    bundle = os.path.join(model_dir, os.path.basename(model_bundle.BUNDLE_DIR))
+    engine, _, _ = model_bundle.load_scoring_artifacts(model_dir)
+    manifest = model_bundle.read_manifest(bundle)
+    assert not model_bundle.is_stale(manifest, model_dir)
+    version = model_bundle.version_dir(bundle)
+    loaded, _, _ = model_bundle.load_scoring_artifacts(model_dir)
+    assert model_bundle.version_dir(bundle) == version
+    assert loaded.n_estimators == engine.n_estimators
@@ -0,0 +1,52 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import model_bundle
+import model_refresh
+import scoring
+from prediction_store import create_schema
+
+ARTIFACTS = [scoring.MODEL_FILE, scoring.SCALER_FILE, scoring.LABEL_ENCODER_FILE]
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    for name in ARTIFACTS:
+        shutil.copy(os.path.join(scoring.ARTIFACT_DIR, name), tmp_path / name)
+    model_bundle.build_bundle(*scoring.load_artifacts(str(tmp_path)),
+                              str(tmp_path / os.path.basename(model_bundle.BUNDLE_DIR)),
+                              training_data=None, source_dir=str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def unlabelled_db(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.close()
+    return path
+
+
+def snapshot(model_dir):
+    return {name: model_bundle.file_sha256(os.path.join(model_dir, name)) for name in ARTIFACTS}
+
+
+def test_unlabelled_db_is_skipped(model_dir, unlabelled_db):
+    before = snapshot(model_dir)
+    report = model_refresh.refresh(str(model_dir), model_bundle.TRAINING_DATA, unlabelled_db)
+    assert report['status'] == 'skipped'
+    assert snapshot(model_dir) == before
+
+
+def test_unlabelled_db_never_promotes(model_dir, unlabelled_db):
+    before = snapshot(model_dir)
+    manifest = model_bundle.read_manifest(str(model_dir / os.path.basename(model_bundle.BUNDLE_DIR)))
+    report = model_refresh.refresh(str(model_dir), model_bundle.TRAINING_DATA, unlabelled_db, force=True)
+    assert report['status'] == 'rejected'
+    assert report['n_compared'] == 0
+    assert snapshot(model_dir) == before
+    assert model_bundle.read_manifest(str(model_dir / os.path.basename(model_bundle.BUNDLE_DIR))) == manifest
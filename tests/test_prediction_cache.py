@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import scoring
+from prediction_cache import PredictionCache
+
+ROWS = np.array([
+    [1, 50, 4.7, 46, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24],
+    [0, 60, 5.0, 70, 9.5, 5.0, 2.0, 1.0, 3.0, 1.0, 31],
+    [1, 45, 3.1, 52, 6.1, 4.0, 1.1, 2.0, 2.2, 0.9, 27.5],
+], dtype=np.float64)
+
+
+class CountingModel:
+    """Обертка леса, считающая строки, дошедшие до predict_proba"""
+
+    def __init__(self, model, on_predict=None):
+        self.model = model
+        self.classes_ = model.classes_
+        self.rows = 0
+        self.on_predict = on_predict
+
+    def predict_proba(self, X):
+        self.rows += len(X)
+        if self.on_predict is not None:
+            self.on_predict()
+        return self.model.predict_proba(X)
+
+
+class ConstantModel:
+    """Модель, всегда отдающая один класс - заметно отличается от настоящей"""
+
+    def __init__(self, classes, code):
+        self.classes_ = classes
+        self.code = code
+
+    def predict_proba(self, X):
+        proba = np.zeros((len(X), len(self.classes_)))
+        proba[:, self.code] = 1.0
+        return proba
+
+
+@pytest.fixture(scope='module')
+def artifacts():
+    return scoring.load_artifacts()
+
+
+def test_repeated_and_near_equal_rows_hit_the_cache(artifacts):
+    model, scaler, le = artifacts
+    counting = CountingModel(model)
+    cache = PredictionCache(maxsize=16)
+    expected = scoring.score_batch(model, scaler, le, ROWS)
+
+    # Повтор внутри блока скорится один раз
+    labels, probabilities = scoring.score_batch(counting, scaler, le, np.vstack([ROWS, ROWS[:1]]), cache)
+    assert counting.rows == len(ROWS)
+    assert labels.tolist() == expected[0].tolist() + expected[0][:1].tolist()
+
+    labels, probabilities = scoring.score_batch(counting, scaler, le, ROWS + 1e-7, cache)
+    assert counting.rows == len(ROWS)
+    assert labels.tolist() == expected[0].tolist()
+    np.testing.assert_array_equal(probabilities, expected[1])
+    assert cache.stats()['hits'] == len(ROWS)
+
+
+def test_model_change_invalidates_cached_results(artifacts):
+    model, scaler, le = artifacts
+    cache = PredictionCache(maxsize=16)
+    real = scoring.score_batch(model, scaler, le, ROWS, cache)[0].tolist()
+    code = next(i for i, label in enumerate(le.classes_) if label.strip() != real[0])
+    other = ConstantModel(model.classes_, code)
+
+    # Без invalidate кэш отдает прогнозы прежней модели
+    assert scoring.score_batch(other, scaler, le, ROWS, cache)[0].tolist() == real
+    cache.invalidate()
+    assert scoring.score_batch(other, scaler, le, ROWS, cache)[0].tolist() == [le.classes_[code].strip()] * len(ROWS)
+
+
+def test_result_of_old_model_is_not_cached_after_invalidate(artifacts):
+    model, scaler, le = artifacts
+    cache = PredictionCache(maxsize=16)
+    # Модель перезагрузили, пока блок считался старой моделью
+    scoring.score_batch(CountingModel(model, on_predict=cache.invalidate), scaler, le, ROWS, cache)
+    assert len(cache) == 0
+
+
+def test_lru_eviction_and_ttl():
+    now = [0.0]
+    cache = PredictionCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.put(cache.key([1]), 'a')
+    cache.put(cache.key([2]), 'b')
+    assert cache.get(cache.key([1])) == 'a'
+    cache.put(cache.key([3]), 'c')
+    assert cache.get(cache.key([2])) is None
+    assert cache.stats()['evictions'] == 1
+    now[0] = 10.0
+    assert cache.get(cache.key([1])) is None
+    assert cache.stats()['expirations'] == 1
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+import prediction_store
+from prediction_store import SCHEMA, connect, create_schema, fetch_daily_summary
+
+ROW = ('2026-01-02 10:00:00', 'МУЖСКОЙ', 50, 4.7, 46.0, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24.0, 'N', 0.95, None)
+
+
+def test_summary_rebuilt_once_for_database_without_it(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.executemany(prediction_store.INSERT_SQL, [ROW] * 3)
+    conn.commit()
+    create_schema(conn)
+    assert not conn.in_transaction
+    conn.close()
+
+    conn = connect(path)
+    conn.executemany(prediction_store.INSERT_SQL, [ROW])
+    conn.commit()
+    assert sum(row[2] for row in fetch_daily_summary(conn)) == 4
+    conn.close()
+
+
+def test_writer_reports_failed_connect(tmp_path):
+    writer = prediction_store.PredictionWriter(str(tmp_path / 'missing' / 'predictions.db'))
+    writer._thread.join(timeout=5)
+    assert isinstance(writer.error.__cause__, sqlite3.OperationalError)
+    with pytest.raises(prediction_store.WriterError):
+        writer.flush()
+    with pytest.raises(prediction_store.WriterError):
+        writer.submit([ROW])
+
+
+def test_writer_failed_commit_reports_lost_rows(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    writer = prediction_store.PredictionWriter(path, flush_interval=60)
+    writer.submit([ROW])
+    assert writer.flush(timeout=5) is True
+    # Строка с лишней колонкой валит executemany - вместе с ней пропадает вся пачка
+    writer.submit([ROW, ROW + (None,), ROW])
+    with pytest.raises(prediction_store.WriterError) as failure:
+        writer.flush()
+    assert failure.value.lost == 3
+    assert isinstance(failure.value.__cause__, sqlite3.ProgrammingError)
+    # Упавший писатель отказывает всем последующим вызовам, а не виснет
+    with pytest.raises(prediction_store.WriterError):
+        writer.submit([ROW])
+    with pytest.raises(prediction_store.WriterError):
+        writer.flush()
+    with pytest.raises(prediction_store.WriterError):
+        writer.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 1
+    conn.close()
+
+
+def test_writer_flush_commits(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    writer = prediction_store.PredictionWriter(path, flush_interval=60)
+    writer.submit([ROW, ROW])
+    assert writer.flush(timeout=5) is True
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] == 2
+    conn.close()
+    writer.close()
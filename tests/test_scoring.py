@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import pytest
+
+import model_bundle
+import scoring
+from forest_engine import CompiledForest
+from scoring_service import ScoringService
+
+ROWS = np.array([
+    [1, 50, 4.7, 46, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24],
+    [0, 60, 5.0, 70, 9.5, 5.0, 2.0, 1.0, 3.0, 1.0, 31],
+], dtype=np.float64)
+
+
+@pytest.fixture(scope='module')
+def artifacts():
+    return scoring.load_artifacts()
+
+
+def test_explain_batch_returns_top_contributions_to_predicted_class(artifacts):
+    model, scaler, _ = artifacts
+    explanations = scoring.explain_batch(model, scaler, ROWS, top=4)
+    engine = CompiledForest.from_sklearn(model)
+    bias, contrib = engine.contributions(scoring.standardize(scaler, ROWS))
+    best = model.predict_proba(scoring.standardize(scaler, ROWS)).argmax(axis=1)
+    for row, explanation in enumerate(explanations):
+        assert len(explanation) == 4
+        values = [value for _, value in explanation]
+        assert values == sorted(values, key=abs, reverse=True)
+        for name, value in explanation:
+            assert value == contrib[row, scoring.FEATURES.index(name), best[row]]
+        # Отброшенные признаки по модулю не больше последнего показанного
+        rest = np.delete(contrib[row, :, best[row]], [scoring.FEATURES.index(n) for n, _ in explanation])
+        assert np.abs(rest).max() <= abs(values[-1])
+
+
+def test_bundle_and_pickles_explain_the_same(artifacts):
+    model, scaler, _ = artifacts
+    engine, bundle_scaler, _ = model_bundle.load_scoring_artifacts()
+    for from_pickles, from_bundle in zip(scoring.explain_batch(model, scaler, ROWS),
+                                         scoring.explain_batch(engine, bundle_scaler, ROWS)):
+        assert [name for name, _ in from_pickles] == [name for name, _ in from_bundle]
+        np.testing.assert_allclose([v for _, v in from_pickles], [v for _, v in from_bundle], atol=1e-9)
+
+
+def test_explanation_is_stored_as_json(artifacts):
+    model, scaler, le = artifacts
+    labels, probabilities = scoring.score_batch(model, scaler, le, ROWS)
+    explanations = scoring.explain_batch(model, scaler, ROWS)
+    rows = scoring.prediction_rows(ROWS, labels, probabilities, explanations=[explanations[0], None])
+    stored = json.loads(rows[0][-1])
+    assert list(stored) == [name for name, _ in explanations[0]]
+    assert list(stored.values()) == [round(value, 4) for _, value in explanations[0]]
+    assert rows[1][-1] is None
+    assert scoring.explanation_json(None) is None
+
+
+def test_service_returns_factors_only_with_explain():
+    for explain in (False, True):
+        service = ScoringService(db_path=None, explain=explain)
+        service.artifacts = model_bundle.load_scoring_artifacts()
+        _, _, explanations = service.score(ROWS)
+        assert (explanations is not None) == explain
+        if explain:
+            assert [len(explanation) for explanation in explanations] == [scoring.EXPLAIN_TOP] * len(ROWS)
+        service.batcher.executor.shutdown()
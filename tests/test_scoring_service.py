@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import model_bundle
+import scoring
+from scoring_service import ScoringService
+
+PATIENT = {'Gender': 'M', 'AGE': 50, 'Urea': 4.7, 'Cr': 46, 'HbA1c': 4.9, 'Chol': 4.2,
+           'TG': 0.9, 'HDL': 2.4, 'LDL': 1.4, 'VLDL': 0.5, 'BMI': 24}
+ROWS = [
+    [1, 50, 4.7, 46, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24],
+    [0, 60, 5.0, 70, 9.5, 5.0, 2.0, 1.0, 3.0, 1.0, 31],
+    [1, 45, 3.1, 52, 6.1, 4.0, 1.1, 2.0, 2.2, 0.9, 27.5],
+]
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    for name in (scoring.MODEL_FILE, scoring.SCALER_FILE, scoring.LABEL_ENCODER_FILE):
+        shutil.copy(os.path.join(scoring.ARTIFACT_DIR, name), tmp_path / name)
+    return str(tmp_path)
+
+
+async def request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = b'' if payload is None else (payload if isinstance(payload, bytes) else json.dumps(payload).encode())
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                 + body)
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def serve(model_dir, scenario, **options):
+    """Сервис и сервер на свободном порту в одном цикле событий; scenario(service, port)"""
+    async def main():
+        service = ScoringService(model_dir, db_path=None, **options)
+        await service.start()
+        server = await asyncio.start_server(service.handle_connection, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            for _ in range(500):
+                if (await request(port, 'GET', '/ready'))[0] == 200:
+                    break
+                await asyncio.sleep(0.01)
+            return await scenario(service, port)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+
+    return asyncio.run(main())
+
+
+def expected(rows):
+    model, scaler, le = model_bundle.load_scoring_artifacts()
+    labels, probabilities = scoring.score_batch(model, scaler, le, np.asarray(rows, dtype=np.float64))
+    return [{'class': label, 'probability': round(p, 6)} for label, p in zip(labels.tolist(), probabilities.tolist())]
+
+
+def test_request_forms(model_dir):
+    async def scenario(service, port):
+        return [await request(port, 'POST', '/predict', payload)
+                for payload in (PATIENT, ROWS[0], {'patients': [PATIENT, ROWS[1]]})]
+
+    single, listed, patients = serve(model_dir, scenario)
+    assert single == listed == (200, {'predictions': expected(ROWS[:1])})
+    assert patients == (200, {'predictions': expected(ROWS[:2])})
+
+
+@pytest.mark.parametrize('payload', [
+    b'{not json',
+    {'patients': []},
+    {'patients': {'AGE': 50}},
+    {key: value for key, value in PATIENT.items() if key != 'HbA1c'},
+    ROWS[0][:-1],
+    dict(PATIENT, Gender='X'),
+    dict(PATIENT, AGE='NaN'),
+    'пациент',
+], ids=['json', 'empty', 'not-list', 'missing', 'short', 'gender', 'nan', 'string'])
+def test_bad_input_is_400(model_dir, payload):
+    async def scenario(service, port):
+        return await request(port, 'POST', '/predict', payload)
+
+    status, body = serve(model_dir, scenario)
+    assert status == 400
+    assert body['error']
+
+
+def test_concurrent_requests_are_coalesced(model_dir):
+    async def scenario(service, port):
+        responses = await asyncio.gather(*(request(port, 'POST', '/predict', row) for row in ROWS * 4))
+        return responses, service.batcher.stats()
+
+    responses, stats = serve(model_dir, scenario, max_batch=len(ROWS) * 4, max_wait=0.5, cache_size=0)
+    # Каждый запрос получает свой срез общего блока
+    assert [body['predictions'] for _, body in responses] == [[p] for p in expected(ROWS * 4)]
+    assert stats['rows'] == len(ROWS) * 4
+    assert stats['batches'] == 1
@@ -0,0 +1,80 @@
+import csv
+import os
+import sqlite3
+
+import model_bundle
+import scoring
+from prediction_store import INSERT_SQL, create_schema
+from similar_cases import SimilarCases
+
+
+def first_csv_case():
+    with open(model_bundle.TRAINING_DATA, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        record = next(reader)
+    row = [scoring.encode_gender(record['Gender'])] + [float(record[name]) for name in scoring.FEATURES[1:]]
+    return int(record['ID']), row
+
+
+def test_csv_cases_carry_dataset_id_and_tree_is_persisted(tmp_path):
+    db_path = str(tmp_path / 'predictions.db')
+    conn = sqlite3.connect(db_path)
+    create_schema(conn)
+    conn.close()
+    _, scaler, _ = scoring.load_artifacts()
+    case_id, row = first_csv_case()
+
+    index = SimilarCases(scaler, db_path, cache_dir=str(tmp_path)).open()
+    nearest = index.query([row], k=1)[0][0]
+    index.close()
+    assert nearest['source'] == 'csv'
+    assert nearest['id'] == case_id
+    assert nearest['distance'] < 1e-5
+    assert os.path.exists(os.path.join(index.directory, 'tree.pkl'))
+
+    reopened = SimilarCases(scaler, db_path, cache_dir=str(tmp_path))
+    reopened._rebuild = None  # повторное открытие должно взять сохраненное дерево
+    reopened.open()
+    assert reopened.tree_rows == reopened.rows
+    assert reopened.query([row], k=1)[0][0]['id'] == case_id
+    reopened.close()
+
+
+def history_db(path, rows):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    conn.executemany(INSERT_SQL, rows)
+    conn.commit()
+    conn.close()
+
+
+def test_history_is_scoped_to_database_and_reset_when_recreated(tmp_path):
+    _, scaler, _ = scoring.load_artifacts()
+    far = ('2026-01-02 10:00:00', 'МУЖСКОЙ', 90, 60.0, 900.0, 15.0, 10.0, 9.0, 8.0, 9.0, 30.0, 60.0, 'Y', 0.9, None)
+    near = far[:2] + (91,) + far[3:12] + ('N',) + far[13:]
+    query = [[scoring.encode_gender(far[1]), *far[2:12]]]
+    first = str(tmp_path / 'first.db')
+    history_db(first, [far, far])
+
+    index = SimilarCases(scaler, first, cache_dir=str(tmp_path)).open()
+    assert index.last_id == 2
+    assert index.query(query, k=1)[0][0]['source'] == 'history'
+    index.close()
+
+    # Другая база - другой каталог, чужая история в него не попадает
+    other = SimilarCases(scaler, str(tmp_path / 'other.db'), cache_dir=str(tmp_path)).open()
+    assert other.directory != index.directory
+    assert other.last_id == 0
+    assert other.query(query, k=1)[0][0]['source'] == 'csv'
+    other.close()
+
+    # Пересозданная база: id снова с 1, старые строки истории выбрасываются
+    history_db(first, [near])
+    reopened = SimilarCases(scaler, first, cache_dir=str(tmp_path)).open()
+    assert reopened.last_id == 1
+    assert reopened.rows == index.rows - 1
+    nearest = reopened.query(query, k=1)[0][0]
+    assert (nearest['source'], nearest['id'], nearest['label']) == ('history', 1, 'N')
+    reopened.close()
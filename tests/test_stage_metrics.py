@@ -0,0 +1,73 @@
+import json
+import threading
+
+import scoring
+from prediction_store import PredictionWriter
+from stage_metrics import BUCKETS_MS, StageMetrics, stage
+
+ROW = ('2026-01-02 10:00:00', 'МУЖСКОЙ', 50, 4.7, 46.0, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24.0, 'N', 0.95, None)
+
+
+def test_summary_uses_rolling_window_but_counts_all():
+    metrics = StageMetrics(window=100)
+    for ms in range(1, 201):
+        metrics.record('x', ms / 1000)
+    summary = metrics.summary()['x']
+    # В окне только последние 100 значений: 101..200 мс
+    assert summary['count'] == 200
+    assert summary['max'] == 200.0
+    assert (summary['p50'], summary['p95'], summary['p99']) == (151.0, 195.0, 199.0)
+
+
+def test_histogram_and_sparkline():
+    metrics = StageMetrics()
+    for seconds in (0.00001, 0.001, 0.001, 100.0):
+        metrics.record('x', seconds)
+    counts = metrics.histogram('x')
+    assert len(counts) == len(BUCKETS_MS) + 1
+    assert sum(counts) == 4
+    assert counts[0] == 1 and counts[-1] == 1 and max(counts) == 2
+    line = metrics.sparkline('x')
+    assert line[0] == '▄' and line[-1] == '▄' and '█' in line
+    assert metrics.sparkline('missing') == ""
+
+
+def test_log_has_one_json_line_per_sample(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics = StageMetrics(log_path=str(path))
+    with metrics.stage('a'):
+        pass
+    metrics.record('b', 0.0025)
+    metrics.close()
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [line['stage'] for line in lines] == ['a', 'b']
+    assert lines[1]['ms'] == 2.5
+
+
+def test_recording_from_threads_loses_nothing():
+    metrics = StageMetrics(window=10)
+
+    def work():
+        for _ in range(1000):
+            metrics.record('x', 0.001)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.summary()['x']['count'] == 8000
+
+
+def test_instrumented_paths_record_their_stages(tmp_path):
+    with stage(None, 'ignored'):
+        pass
+    metrics = StageMetrics()
+    model, scaler, le = scoring.load_artifacts()
+    scoring.score_batch(model, scaler, le, [[1, *ROW[2:12]]], metrics=metrics)
+    assert {'score.transform', 'score.forest', 'score.decode'} <= set(metrics.stages())
+
+    writer = PredictionWriter(str(tmp_path / 'predictions.db'), metrics=metrics)
+    writer.submit([ROW])
+    writer.close()
+    assert metrics.summary()['db.commit']['count'] == 1
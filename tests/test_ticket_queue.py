@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+import scoring
+import ticket
+from prediction_store import PredictionWriter
+from stage_metrics import StageMetrics
+
+ROW = [[1, 50, 4.7, 46, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24]]
+
+
+class Widget:
+    """Заглушка виджета: запоминает последний config и видимость"""
+
+    def __init__(self):
+        self.options = {}
+        self.visible = False
+
+    def config(self, **options):
+        self.options.update(options)
+
+    def pack(self, *args, **kwargs):
+        self.visible = True
+
+    def pack_forget(self):
+        self.visible = False
+
+
+class Root:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def update_idletasks(self):
+        pass
+
+
+@pytest.fixture
+def app():
+    """Приложение без окна: только то, что трогают очередь анализов и рабочий поток"""
+    app = ticket.CyberDiabetesApp.__new__(ticket.CyberDiabetesApp)
+    app.root = Root()
+    app.metrics = StageMetrics()
+    app.pending_predictions = deque()
+    app.discarded_predictions = set()
+    app.model_ready = True
+    app.neon_pink = app.neon_yellow = '#fff'
+    for name in ('connection_status', 'cancel_btn', 'predict_btn', 'result_card', 'info_link', 'doctor_link'):
+        setattr(app, name, Widget())
+    app.shown, app.errors = [], []
+    app.show_result = lambda *result: app.shown.append(result[0])
+    app.show_glitch_error = app.errors.append
+    return app
+
+
+def done(value):
+    future = Future()
+    future.set_result((value, 0.9, None, None, []))
+    future.submitted = 0.0
+    return future
+
+
+def test_results_are_shown_in_submission_order(app):
+    first, second = Future(), done('Y')
+    first.set_running_or_notify_cancel()
+    first.submitted = 0.0
+    app.pending_predictions.extend([first, second])
+
+    # Второй готов раньше первого - ждет его, а опрос перезапускается
+    app.poll_predictions()
+    assert app.shown == []
+    assert app.root.scheduled == [app.poll_predictions]
+    first.set_result(('N', 0.8, None, None, []))
+    app.poll_predictions()
+    assert app.shown == ['N', 'Y']
+    assert not app.pending_predictions
+    assert not app.cancel_btn.visible
+
+
+def test_cancel_drops_queued_and_ignores_running(app):
+    running, queued = Future(), Future()
+    running.set_running_or_notify_cancel()
+    running.submitted = queued.submitted = 0.0
+    app.pending_predictions.extend([running, queued])
+    app.cancel_predictions()
+    assert queued.cancelled()
+    assert running in app.discarded_predictions
+    assert not app.cancel_btn.visible
+
+    running.set_result(('Y', 0.9, None, None, []))
+    app.poll_predictions()
+    assert app.shown == []
+    assert not app.pending_predictions and not app.discarded_predictions
+
+
+def test_failed_analysis_reports_error_and_continues(app):
+    failed = Future()
+    failed.set_exception(RuntimeError("сбой"))
+    failed.submitted = 0.0
+    app.pending_predictions.extend([failed, done('P')])
+    app.poll_predictions()
+    assert app.errors == ["СИСТЕМНЫЙ СБОЙ: сбой"]
+    assert app.shown == ['P']
+
+
+def test_full_queue_blocks_new_analyses(app):
+    release = threading.Event()
+    app.executor = ThreadPoolExecutor(max_workers=1)
+    app.read_input = lambda: ROW
+    app.score_and_save = lambda *args: release.wait(5)
+    try:
+        for _ in range(ticket.MAX_PENDING_PREDICTIONS + 2):
+            app.predict_diabetes()
+        assert len(app.pending_predictions) == ticket.MAX_PENDING_PREDICTIONS
+        assert app.predict_btn.options['state'] == ticket.tk.DISABLED
+        # Опрос ставится один раз - при первой заявке
+        assert app.root.scheduled == [app.poll_predictions]
+    finally:
+        release.set()
+        app.executor.shutdown(wait=True)
+
+
+def test_score_and_save_runs_without_widgets(app, tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    app.model, app.scaler, app.le = scoring.load_artifacts()
+    app.prediction_cache = None
+    app.similar = app.drift = None
+    app.writer = PredictionWriter(path)
+    result, probability, explanation, similar, drifted = app.score_and_save(ROW, 0.0)
+    app.writer.close()
+    labels, probabilities = scoring.score_batch(app.model, app.scaler, app.le, ROW)
+    assert (result, probability) == (labels[0], probabilities[0])
+    assert explanation and similar is None and drifted == []
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT prediction, probability FROM predictions").fetchall() == [(result, probability)]
+    conn.close()
+    assert {'predict.queue', 'predict.score', 'save.submit'} <= set(app.metrics.stages())
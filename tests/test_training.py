@@ -0,0 +1,112 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import model_bundle
+import scoring
+import training
+
+HEADER = "ID,No_Pation,Gender,AGE,Urea,Cr,HbA1c,Chol,TG,HDL,LDL,VLDL,BMI,CLASS"
+LINES = [
+    "7,101,F,50,4.7,46,4.9,4.2,0.9,2.4,1.4,0.5,24,N",
+    "8,102,M,60,5,70,9.5,5,2,1,3,1,31,Y ",
+    "x,103,f,40,,50,6,4,1,2,2,1,27,N ",
+]
+
+
+def write_csv(path, lines, newline='\r'):
+    path.write_text(newline.join([HEADER] + lines) + newline, encoding='utf-8')
+    return str(path)
+
+
+def test_parse_dataset_cleans_like_the_form(tmp_path):
+    X, y, ids = training.parse_dataset(write_csv(tmp_path / 'data.csv', LINES), ids=True)
+    # Строчная 'f' - тот же женский пол, метки без пробелов, нечисловой ID - номер строки
+    assert X[:, 0].tolist() == [0.0, 1.0, 0.0]
+    assert y.tolist() == ['N', 'Y', 'N']
+    assert ids.tolist() == [7, 8, 3]
+    # Пропуск заполняется средним по колонке
+    assert X[2, 2] == pytest.approx((4.7 + 5) / 2)
+    assert not np.isnan(X).any()
+
+
+def test_unknown_gender_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        training.parse_dataset(write_csv(tmp_path / 'data.csv', LINES + ["9,104,X,40,4,50,6,4,1,2,2,1,27,N"]))
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    return training.load_dataset(cache_dir=None)
+
+
+def test_training_is_reproducible_for_a_seed(dataset):
+    X, y, weights, _ = dataset
+    grid = {'n_estimators': [20]}
+    first = training.train(X, y, grid, n_jobs=2, seed=7, sample_weight=weights)
+    second = training.train(X, y, grid, n_jobs=1, seed=7, sample_weight=weights)
+    np.testing.assert_array_equal(first[0].predict_proba(X), second[0].predict_proba(X))
+    assert first[3]['test_accuracy'] == second[3]['test_accuracy']
+    assert first[3]['classes'] == ['N', 'P', 'Y']
+
+
+def test_grid_search_reports_cross_validation(dataset):
+    X, y, weights, _ = dataset
+    _, _, _, report = training.train(X, y, {'n_estimators': [10], 'max_depth': [2, None]}, cv=3, n_jobs=1,
+                                     sample_weight=weights)
+    assert report['cv']['candidates'] == 2
+    assert report['cv']['folds'] == 3
+    assert report['params']['max_depth'] in (2, None)
+
+
+def test_main_writes_loadable_artifacts(tmp_path):
+    output = tmp_path / 'model'
+    assert training.main(['--quick', '--n-jobs', '1', '--no-cache', '--output-dir', str(output)]) == 0
+    for name in (scoring.MODEL_FILE, scoring.SCALER_FILE, scoring.LABEL_ENCODER_FILE, training.REPORT_FILE):
+        assert os.path.exists(output / name)
+    bundle = str(output / os.path.basename(model_bundle.BUNDLE_DIR))
+    assert not model_bundle.is_stale(model_bundle.read_manifest(bundle), str(output))
+    with open(output / training.REPORT_FILE, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['n_rows'] == 1000
+    engine, _, labels = model_bundle.load_scoring_artifacts(str(output))
+    assert set(labels.classes_) == {'N', 'P', 'Y'}
+
+
+def test_duplicates_collapse_into_weights_in_first_seen_order(tmp_path):
+    # Повтор строки 7 и та же строка с другим классом (отдельная уникальная строка)
+    lines = LINES[:2] + [LINES[0].replace('7,101', '9,104'), LINES[0].replace(',N', ',P')]
+    path = write_csv(tmp_path / 'data.csv', lines)
+    X, y, weights, _ = training.load_dataset(path, cache_dir=None)
+    assert y.tolist() == ['N', 'Y', 'P']
+    assert weights.tolist() == [2.0, 1.0, 1.0]
+    assert training.dataset_ids(path).tolist() == [7, 8, 7]
+    assert X.dtype == np.float32 and X.flags.f_contiguous
+
+
+def test_shipped_dataset_weights_add_up():
+    X, y, weights, _ = training.load_dataset(cache_dir=None)
+    assert len(X) == 826
+    assert weights.sum() == 1000
+    assert len(training.dataset_ids()) == len(X)
+
+
+def test_cache_matches_parsing_and_follows_csv_content(tmp_path):
+    path = tmp_path / 'data.csv'
+    cache_dir = str(tmp_path / 'cache')
+    write_csv(path, LINES)
+    parsed = training.load_dataset(str(path), cache_dir=None)
+    cached = training.load_dataset(str(path), cache_dir=cache_dir)
+    reloaded = training.load_dataset(str(path), cache_dir=cache_dir)
+    assert isinstance(reloaded[0], np.memmap)
+    for expected, first, second in zip(parsed[:3], cached[:3], reloaded[:3]):
+        np.testing.assert_array_equal(first, expected)
+        np.testing.assert_array_equal(second, expected)
+    assert len(os.listdir(cache_dir)) == 1
+
+    # Другой CSV по тому же пути - другой хэш, другой каталог кэша
+    write_csv(path, LINES[:2])
+    assert len(training.load_dataset(str(path), cache_dir=cache_dir)[0]) == 2
+    assert len(os.listdir(cache_dir)) == 2
@@ -0,0 +1,102 @@
+import sqlite3
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import model_bundle
+import scoring
+import worklist_view
+from prediction_store import PredictionWriter
+from stage_metrics import StageMetrics
+from worklist_view import WorklistRow, WorklistWindow, parse_worklist
+
+FEATURES = [1.0, 50.0, 4.7, 46.0, 4.9, 4.2, 0.9, 2.4, 1.4, 0.5, 24.0]
+
+
+def test_header_maps_columns_by_name_and_shows_patient_id():
+    text = ("No_Pation,BMI,Gender,AGE,Urea,Cr,HbA1c,Chol,TG,HDL,LDL,VLDL,CLASS\n"
+            "17975,24,M,50,4.7,46,4.9,4.2,0.9,2.4,1.4,0.5,N\n")
+    [row] = parse_worklist(text)
+    assert (row.line, row.patient, row.values, row.error) == (2, "17975", FEATURES, None)
+
+
+def test_shipped_csv_parses_without_errors():
+    with open(model_bundle.TRAINING_DATA, newline='', encoding='utf-8-sig') as f:
+        rows = parse_worklist(f.read())
+    assert len(rows) == 1000
+    assert all(row.error is None for row in rows)
+    assert rows[0].patient == "502"
+
+
+@pytest.mark.parametrize('text, patient', [
+    ("M,50,4.7,46,4.9,4.2,0.9,2.4,1.4,0.5,24", ""),
+    ("P-1,M,50,4.7,46,4.9,4.2,0.9,2.4,1.4,0.5,24", "P-1"),
+    ("P-1\tМУЖСКОЙ\t50\t4,7\t46\t4,9\t4,2\t0,9\t2,4\t1,4\t0,5\t24", "P-1"),
+    ("P-1;m;50;4,7;46;4,9;4,2;0,9;2,4;1,4;0,5;24", "P-1"),
+], ids=['comma', 'with-id', 'tab-decimal-comma', 'semicolon-decimal-comma'])
+def test_headerless_rows(text, patient):
+    [row] = parse_worklist(text + "\n\n")
+    assert (row.patient, row.values, row.error) == (patient, FEATURES, None)
+
+
+def test_invalid_rows_keep_their_error_and_line():
+    text = "\n".join([
+        "M,50,4.7,46,4.9,4.2,0.9,2.4,1.4,0.5,24",
+        "M,50,4.7",
+        "X,50,4.7,46,4.9,4.2,0.9,2.4,1.4,0.5,24",
+        "M,50,-4.7,46,abc,4.2,0.9,2.4,1.4,0.5,inf",
+    ])
+    rows = parse_worklist(text)
+    assert [row.line for row in rows] == [1, 2, 3, 4]
+    assert rows[0].error is None
+    assert all(row.values is None for row in rows[1:])
+    assert "ожидается 11" in rows[1].error
+    assert "пол" in rows[2].error
+    assert rows[3].error == "неверные значения: Urea, HbA1c, BMI"
+    # Запятая - разделитель колонок, поэтому дробная запятая здесь не принимается
+    assert parse_worklist("M,50,4,7,46,4.9,4.2,0.9,2.4,1.4,0.5,24")[0].error
+
+
+def test_header_without_required_columns_is_rejected():
+    with pytest.raises(ValueError):
+        parse_worklist("ID,Gender,AGE\n1,M,50\n")
+    assert parse_worklist(" \n\n") == []
+
+
+def test_sort_key_orders_by_values_with_empty_last():
+    view = WorklistWindow.__new__(WorklistWindow)
+    done = WorklistRow(1, "b", FEATURES)
+    done.label, done.probability, done.factor = 'Y', 0.9, "HbA1c +30%"
+    waiting = WorklistRow(2, "a", [0.0, 70.0, *FEATURES[2:]])
+    failed = WorklistRow(3, "c", error="ошибка")
+    rows = [done, waiting, failed]
+    order = lambda column: [row.line for row in sorted(rows, key=lambda row: view.sort_key(column, row))]
+    assert order("Возраст") == [1, 2, 3]
+    assert order("ID") == [2, 1, 3]
+    assert order("Прогноз") == [1, 2, 3]
+    assert order("Статус") == [1, 2, 3]
+
+
+def test_score_rows_scores_in_chunks_and_commits_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(worklist_view, 'WORKLIST_CHUNK', 2)
+    path = str(tmp_path / 'predictions.db')
+    model, scaler, le = scoring.load_artifacts()
+    app = SimpleNamespace(model=model, scaler=scaler, le=le, prediction_cache=None, drift=None,
+                          metrics=StageMetrics(), writer=PredictionWriter(path, flush_interval=60))
+    view = WorklistWindow.__new__(WorklistWindow)
+    view.app, view.scored = app, 0
+    rows = [WorklistRow(i, "", [float(i % 2), 40.0 + i, *FEATURES[2:]]) for i in range(5)]
+
+    labels, probabilities, explanations = view.score_rows(rows)
+    assert view.scored == 5
+    X = np.array([row.values for row in rows])
+    expected = scoring.score_batch(model, scaler, le, X)
+    assert labels == expected[0].tolist() and probabilities == expected[1].tolist()
+    assert len(explanations) == 5
+    # Все строки одной транзакцией и уже записаны к возврату
+    assert app.writer.commits == 1
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM predictions WHERE explanation IS NOT NULL").fetchone()[0] == 5
+    conn.close()
+    app.writer.close()
@@ -0,0 +1,126 @@
+"""Окно аналитики по сводной таблице prediction_daily (без прохода по predictions)."""
+import tkinter as tk
+from datetime import date, timedelta
+from tkinter import ttk
+
+from prediction_store import HIGH_PROBABILITY, WriterError, fetch_class_summary, fetch_daily_summary
+from stage_metrics import stage
+
+CLASS_NAMES = {'N': "НИЗКИЙ", 'P': "УМЕРЕННЫЙ", 'Y': "ВЫСОКИЙ"}
+SUMMARY_COLUMNS = ["Риск", "Прогнозов", "Доля", "Ср. HbA1c", "Ср. ИМТ", f"P ≥ {HIGH_PROBABILITY:.0%}"]
+PERIODS = {"7 ДНЕЙ": 7, "30 ДНЕЙ": 30, "90 ДНЕЙ": 90, "ВСЕ ВРЕМЯ": None}
+
+CHART_WIDTH = 860
+CHART_HEIGHT = 220
+
+
+class AnalyticsWindow:
+    """Распределение риска по дням, средние HbA1c/ИМТ по классам и доля уверенных прогнозов"""
+
+    def __init__(self, app):
+        self.app = app
+        self.colors = {'N': app.neon_green, 'P': app.neon_yellow, 'Y': app.neon_pink}
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("АНАЛИТИКА ПРОГНОЗОВ")
+        self.window.geometry("900x600")
+        self.window.configure(bg=app.bg_color)
+
+        bar = tk.Frame(self.window, bg=app.bg_color)
+        bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        tk.Label(bar, text="ПЕРИОД:", font=app.label_font,
+                 bg=app.bg_color, fg=app.text_color).pack(side="left", padx=(8, 2))
+        self.period = ttk.Combobox(bar, values=list(PERIODS), state="readonly", width=10)
+        self.period.current(1)
+        self.period.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        self.period.pack(side="left")
+        tk.Button(bar, text="ОБНОВИТЬ", command=self.refresh,
+                  font=app.label_font, bg=app.card_bg, fg=app.neon_yellow, bd=0, padx=10,
+                  activebackground="#202030", activeforeground=app.neon_pink).pack(side="left", padx=10)
+
+        self.chart = tk.Canvas(self.window, width=CHART_WIDTH, height=CHART_HEIGHT,
+                               bg=app.card_bg, highlightthickness=1, highlightbackground=app.border_color)
+        self.chart.pack(padx=10, pady=10)
+
+        self.tree = ttk.Treeview(self.window, columns=SUMMARY_COLUMNS, show="headings", height=4)
+        for col in SUMMARY_COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=130, anchor="center")
+        self.tree.pack(fill=tk.X, padx=10)
+
+        self.status = tk.Label(self.window, text="", font=app.label_font,
+                               bg=app.bg_color, fg=app.neon_green)
+        self.status.pack(pady=5)
+
+        tk.Button(self.window, text="ЗАКРЫТЬ", command=self.window.destroy,
+                  font=app.button_font, bg=app.card_bg, fg=app.neon_blue, bd=0, padx=20, pady=10,
+                  activebackground="#202030", activeforeground=app.neon_pink).pack(pady=10)
+
+        self.refresh()
+
+    def date_range(self):
+        days = PERIODS[self.period.get()]
+        if days is None:
+            return None, None
+        today = date.today()
+        return (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+    def refresh(self):
+        try:
+            self.app.writer.flush(timeout=1.0)
+        except WriterError as e:
+            self.app.show_glitch_error(f"ОШИБКА ЗАПИСИ: {e}")
+        date_from, date_to = self.date_range()
+        with stage(getattr(self.app, 'metrics', None), 'analytics.query'):
+            daily = fetch_daily_summary(self.app.conn, date_from, date_to)
+            classes = fetch_class_summary(self.app.conn, date_from, date_to)
+        self.draw_chart(daily)
+        self.fill_summary(classes)
+
+    def fill_summary(self, classes):
+        self.tree.delete(*self.tree.get_children())
+        total = sum(row['count'] for row in classes.values())
+        for prediction in ('N', 'P', 'Y'):
+            row = classes.get(prediction)
+            if row is None:
+                continue
+            self.tree.insert("", "end", values=(
+                CLASS_NAMES[prediction], row['count'], f"{row['count'] / total:.1%}",
+                f"{row['mean_hba1c']:.2f}", f"{row['mean_bmi']:.1f}", f"{row['high_probability_share']:.1%}",
+            ))
+        high_y = classes.get('Y', {}).get('high_probability_share')
+        suffix = f", ВЫСОКИЙ РИСК С P ≥ {HIGH_PROBABILITY:.0%}: {high_y:.1%}" if high_y is not None else ""
+        self.status.config(text=f">>> ПРОГНОЗОВ ЗА ПЕРИОД: {total}{suffix} <<<")
+
+    def draw_chart(self, daily):
+        """Столбики по дням, разбитые на N/P/Y"""
+        self.chart.delete("all")
+        days = {}
+        for day, prediction, n, _ in daily:
+            days.setdefault(day, {})[prediction] = n
+        if not days:
+            self.chart.create_text(CHART_WIDTH // 2, CHART_HEIGHT // 2, text="НЕТ ДАННЫХ",
+                                   fill=self.app.border_color, font=self.app.button_font)
+            return
+
+        ordered = sorted(days)
+        peak = max(sum(counts.values()) for counts in days.values())
+        left, bottom, top = 10, CHART_HEIGHT - 20, 10
+        step = (CHART_WIDTH - 2 * left) / len(ordered)
+        width = max(1.0, step * 0.8)
+        for i, day in enumerate(ordered):
+            x = left + i * step
+            y = bottom
+            for prediction in ('N', 'P', 'Y'):
+                n = days[day].get(prediction, 0)
+                if not n:
+                    continue
+                height = n / peak * (bottom - top)
+                self.chart.create_rectangle(x, y - height, x + width, y, fill=self.colors[prediction], width=0)
+                y -= height
+        self.chart.create_text(left, CHART_HEIGHT - 5, text=ordered[0], anchor="sw",
+                               fill=self.app.text_color, font=self.app.label_font)
+        self.chart.create_text(CHART_WIDTH - left, CHART_HEIGHT - 5, text=ordered[-1], anchor="se",
+                               fill=self.app.text_color, font=self.app.label_font)
+        self.chart.create_text(CHART_WIDTH - left, top, text=f"МАКС. {peak}/ДЕНЬ", anchor="ne",
+                               fill=self.app.text_color, font=self.app.label_font)
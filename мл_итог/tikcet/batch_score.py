@@ -0,0 +1,197 @@
+"""Пакетный скоринг CSV без графического интерфейса.
+
+Читает файл в формате "Dataset of Diabetes .csv" (или stdin) блоками фиксированного
+размера, скорит каждый блок одним вызовом scaler.transform + predict_proba и
+потоково пишет результаты в CSV и/или таблицу predictions.
+
+    python мл_итог/tikcet/batch_score.py "мл_итог/Dataset of Diabetes .csv" -o out.csv --db diabetes_predictions.db
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+
+import numpy as np
+
+import scoring
+import model_bundle
+from forest_engine import CompiledForest
+from prediction_cache import PredictionCache
+from prediction_store import PredictionWriter
+
+PASSTHROUGH = ['ID', 'No_Pation']
+
+
+def open_input(path):
+    if path == '-':
+        # Как и для файла: csv сам разбирает концы строк (обучающий CSV разделен одними CR)
+        return io.TextIOWrapper(sys.stdin.buffer, newline='', encoding='utf-8-sig')
+    return open(path, newline='', encoding='utf-8-sig')
+
+
+def open_output(path):
+    if path == '-':
+        return sys.stdout
+    return open(path, 'w', newline='', encoding='utf-8')
+
+
+def column_index(header):
+    """Позиции признаков и сквозных колонок в заголовке (без учета регистра)"""
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+    missing = [f for f in scoring.FEATURES if f.lower() not in positions]
+    if missing:
+        raise ValueError(f"в CSV нет колонок: {', '.join(missing)}")
+    features = [positions[f.lower()] for f in scoring.FEATURES]
+    passthrough = [(name, positions[name.lower()]) for name in PASSTHROUGH if name.lower() in positions]
+    return features, passthrough
+
+
+def read_chunks(reader, feature_idx, chunk_size):
+    """Разбор CSV блоками: (матрица признаков, исходные строки, число пропущенных)"""
+    values, raw, skipped = [], [], 0
+    for record in reader:
+        if not record:
+            continue
+        try:
+            row = [float(scoring.encode_gender(record[feature_idx[0]]))]
+            row.extend(float(record[i]) for i in feature_idx[1:])
+        except (ValueError, IndexError):
+            skipped += 1
+            continue
+        values.append(row)
+        raw.append(record)
+        if len(values) == chunk_size:
+            yield np.array(values, dtype=np.float64), raw, skipped
+            values, raw, skipped = [], [], 0
+    if values or skipped:
+        yield np.array(values, dtype=np.float64).reshape(-1, len(scoring.FEATURES)), raw, skipped
+
+
+def run(args):
+    if args.bundle:
+        # В бандле лес уже скомпилирован и со вплавленным масштабатором
+        model, scaler, le, _ = model_bundle.load_bundle(args.bundle)
+    else:
+        model, scaler, le = scoring.load_artifacts(args.model_dir)
+        if args.fused_model:
+            model = CompiledForest.load(args.fused_model)
+        elif args.engine == 'fused':
+            model = CompiledForest.from_sklearn(model).fuse_scaler(scaler)
+        elif args.engine == 'compiled':
+            model = CompiledForest.from_sklearn(model)
+
+    # Ранний выход идет мимо кэша: повторы в блоке все равно дешевле полного обхода леса
+    early = args.early_exit is not None
+    confidence = args.early_exit or None
+    cache = PredictionCache(args.cache_size, ttl=args.cache_ttl) if args.cache_size and not early else None
+
+    source = open_input(args.input)
+    reader = csv.reader(source)
+    header = next(reader, None)
+    try:
+        if header is None:
+            raise ValueError("входной CSV пуст, нет строки заголовка")
+        feature_idx, passthrough = column_index(header)
+    except ValueError as e:
+        source.close()
+        print(f"ошибка: {e}", file=sys.stderr)
+        return 1
+
+    sink = writer = None
+    if args.output:
+        sink = open_output(args.output)
+        writer = csv.writer(sink)
+        writer.writerow([name for name, _ in passthrough] + scoring.FEATURES + ['prediction', 'probability'])
+
+    drift = None
+    if args.drift:
+        # Дрейф файла относительно обучающей выборки: те же строки, что идут в скоринг.
+        # Эталон читает обучающий CSV, поэтому монитор строится только по запросу
+        from drift_monitor import DriftMonitor
+
+        drift = DriftMonitor(scaler)
+    db_writer = PredictionWriter(args.db, batch_size=args.chunk_size) if args.db else None
+
+    scored = skipped = trees_used = 0
+    started = time.perf_counter()
+    try:
+        for X, raw, bad in read_chunks(reader, feature_idx, args.chunk_size):
+            skipped += bad
+            if not len(X):
+                continue
+            if drift is not None:
+                drift.update(X)
+            if early:
+                labels, probabilities, used = scoring.score_batch_early(model, scaler, le, X, confidence)
+                trees_used += int(used.sum())
+            else:
+                labels, probabilities = scoring.score_batch(model, scaler, le, X, cache)
+            if writer is not None:
+                for record, features, label, probability in zip(raw, X.tolist(), labels, probabilities):
+                    writer.writerow([record[i] for _, i in passthrough] + features + [label, f"{probability:.4f}"])
+            if db_writer is not None:
+                db_writer.submit(scoring.prediction_rows(X, labels, probabilities))
+            scored += len(X)
+    finally:
+        source.close()
+        if sink is not None and sink is not sys.stdout:
+            sink.close()
+        if db_writer is not None:
+            db_writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"обработано: {scored}, пропущено: {skipped}, {elapsed:.2f} с ({rate:.0f} строк/с)", file=sys.stderr)
+    if drift is not None:
+        from drift_monitor import format_report
+
+        print(format_report(drift.report()), file=sys.stderr)
+        drifted = drift.drifted()
+        if drifted:
+            print(f"ВНИМАНИЕ: дрейф относительно обучающей выборки: {', '.join(drifted)}", file=sys.stderr)
+    if early and scored:
+        print(f"ранний выход: в среднем {trees_used / scored:.1f} из {model.n_estimators} деревьев",
+              file=sys.stderr)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"кэш: попаданий {stats['hits']}, промахов {stats['misses']}, вытеснено {stats['evictions']}",
+              file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный скоринг риска диабета из CSV")
+    parser.add_argument('input', help="CSV-файл с колонками как в Dataset of Diabetes .csv или '-' для stdin")
+    parser.add_argument('-o', '--output', help="куда писать CSV с прогнозами ('-' для stdout)")
+    parser.add_argument('--db', help="путь к SQLite-базе для записи в таблицу predictions")
+    parser.add_argument('--chunk-size', type=int, default=4096, help="строк в одном блоке скоринга")
+    parser.add_argument('--engine', choices=['fused', 'compiled', 'sklearn'], default='fused',
+                        help="движок леса: плоские массивы со вплавленным scaler, без него или исходный sklearn")
+    parser.add_argument('--fused-model', help="готовый .npz леса со вплавленным scaler (forest_engine.py --export-fused)")
+    parser.add_argument('--cache-size', type=int, default=4096,
+                        help="размер LRU-кэша прогнозов для повторяющихся строк (0 - без кэша)")
+    parser.add_argument('--cache-ttl', type=float, help="время жизни записи кэша, секунды")
+    parser.add_argument('--early-exit', type=float, nargs='?', const=0.0, metavar='CONFIDENCE',
+                        help="ранний выход по деревьям: без значения - класс как у полного леса, "
+                             "со значением - остановка при доле голосов лидера не меньше CONFIDENCE")
+    parser.add_argument('--drift', action='store_true',
+                        help="сравнить признаки файла с обучающей выборкой и предупредить о дрейфе (drift_monitor.py)")
+    parser.add_argument('--bundle', help="каталог бандла модели (model_bundle.py build) вместо .pkl")
+    parser.add_argument('--model-dir', default=scoring.ARTIFACT_DIR, help="каталог с .pkl артефактами")
+    args = parser.parse_args(argv)
+    if not args.output and not args.db:
+        parser.error("нужно указать --output и/или --db")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size должен быть положительным")
+    if args.early_exit is not None and not 0.0 <= args.early_exit <= 1.0:
+        parser.error("--early-exit: порог уверенности должен быть от 0 до 1")
+    if args.early_exit is not None and args.engine == 'sklearn' and not args.bundle:
+        parser.error("--early-exit работает только со скомпилированным лесом (--engine fused/compiled)")
+    if args.cache_size < 0:
+        parser.error("--cache-size не может быть отрицательным")
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
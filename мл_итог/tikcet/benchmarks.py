@@ -0,0 +1,407 @@
+"""Замеры горячих путей приложения без окна.
+
+    python мл_итог/tikcet/benchmarks.py -o bench.json                 # полный прогон
+    python мл_итог/tikcet/benchmarks.py --quick -o bench.json         # урезанные размеры
+    python мл_итог/tikcet/benchmarks.py --quick --compare base.json   # сравнение с прошлым прогоном
+
+Меряется:
+    scoring.*     один анализ, как в predict_diabetes: разбор строк формы, transform,
+                  predict/predict_proba, inverse_transform (p50/p99) - исходный путь sklearn
+                  и текущий (бандл, score_batch); вклады признаков одного анализа (explain_batch)
+    batch.*       пропускная способность score_batch на блоках разного размера
+    insert.*      запись прогнозов: коммит на строку (как было) и PredictionWriter
+    history.*     первая, глубокая и отфильтрованная страница истории с форматированием
+                  строк для Treeview на таблицах разного размера; запросы панели аналитики
+                  по сводной таблице и тот же агрегат полным проходом
+    similar.*     индекс похожих случаев: построение, открытие, поиск k ближайших и дозапись
+    dataset.*     разбор обучающего CSV и загрузка колоночного кэша через mmap
+    cold_start.*  запуск нового процесса до готовой модели (бандл и .pkl)
+
+Данные синтетические: признаки выбираются из нормальных распределений по классам
+"Dataset of Diabetes .csv" с обрезкой по наблюдаемым границам. Результат - JSON
+{"meta": ..., "results": {имя: {"value", "unit", "better"}}}, который можно сравнивать между коммитами.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import scoring
+import model_bundle
+from history_view import format_row
+from prediction_store import (HIGH_PROBABILITY, HISTORY_PAGE_SIZE, PredictionWriter, connect, create_schema,
+                              fetch_class_summary, fetch_daily_summary, fetch_history_page,
+                              insert_predictions)
+from training import load_dataset, parse_dataset
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FULL_SIZES = {'batch': [1, 16, 256, 4096], 'history': [1000, 100000, 1000000]}
+QUICK_SIZES = {'batch': [1, 16, 256, 4096], 'history': [1000, 10000]}
+
+FULL_SCAN_ANALYTICS = f"""
+SELECT substr(timestamp, 1, 10), prediction, COUNT(*), AVG(hba1c), AVG(bmi), AVG(probability >= {HIGH_PROBABILITY})
+FROM predictions GROUP BY substr(timestamp, 1, 10), prediction
+"""
+
+# Порог, после которого изменение при --compare считается регрессией
+REGRESSION = 0.10
+
+
+class SyntheticPatients:
+    """Генератор строк признаков по распределениям обучающего набора"""
+
+    def __init__(self, path=model_bundle.TRAINING_DATA, seed=0):
+        X, y, weights, _ = load_dataset(path)
+        # Повторы возвращаются, чтобы распределения совпадали с исходным CSV
+        repeats = weights.astype(np.int64)
+        X, y = np.repeat(X, repeats, axis=0).astype(np.float64), np.repeat(y, repeats)
+        # Кэш хранит float32: 0.3 там 0.30000001, и граница clip отсекала бы округленное 0.3
+        X = X.round(6)
+        self.rng = np.random.default_rng(seed)
+        self.classes, counts = np.unique(y, return_counts=True)
+        self.class_share = counts / counts.sum()
+        self.low, self.high = X.min(axis=0), X.max(axis=0)
+        self.stats = {}
+        for label in self.classes:
+            part = X[y == label]
+            self.stats[label] = (part.mean(axis=0), part.std(axis=0), part[:, 0].mean())
+
+    def sample(self, n):
+        labels = self.rng.choice(self.classes, size=n, p=self.class_share)
+        X = np.empty((n, len(scoring.FEATURES)), dtype=np.float64)
+        for label in self.classes:
+            mask = labels == label
+            mean, std, male_share = self.stats[label]
+            X[mask] = self.rng.normal(mean, std, size=(mask.sum(), len(mean)))
+            X[mask, 0] = self.rng.random(mask.sum()) < male_share
+        X = np.clip(X, self.low, self.high)
+        X[:, 1] = np.round(X[:, 1])
+        X[:, 2:] = np.round(X[:, 2:], 1)
+        return X
+
+    def form_strings(self, n):
+        """Строки как из полей формы: пол подписью, остальное текстом"""
+        return [[scoring.gender_label(row[0]), *(str(v) for v in row[1:])] for row in self.sample(n).tolist()]
+
+    def history_rows(self, n, start=datetime(2024, 1, 1)):
+        """Строки таблицы predictions с временем, равномерно растянутым на год"""
+        X = self.sample(n)
+        labels = self.rng.choice(['N', 'P', 'Y'], size=n, p=[0.1, 0.05, 0.85])
+        probabilities = self.rng.uniform(0.4, 1.0, size=n)
+        seconds = np.sort(self.rng.integers(0, 365 * 86400, size=n))
+        for features, label, probability, offset in zip(X.tolist(), labels, probabilities, seconds.tolist()):
+            timestamp = (start + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+            yield (timestamp, scoring.gender_label(features[0]), int(features[1]), *features[2:],
+                   str(label), float(probability), None)
+
+
+def samples(fn, min_calls=5, max_calls=5000, min_seconds=1.0):
+    """Время отдельных вызовов fn(), пока не набрано min_seconds и min_calls"""
+    fn()
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_calls and (len(times) < min_calls or time.perf_counter() - started < min_seconds):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return np.array(times)
+
+
+def latency(results, name, times):
+    ms = times * 1000
+    results[f"{name}.p50"] = metric(np.percentile(ms, 50), 'ms')
+    results[f"{name}.p99"] = metric(np.percentile(ms, 99), 'ms')
+
+
+def metric(value, unit, better='lower'):
+    return {'value': round(float(value), 6), 'unit': unit, 'better': better}
+
+
+def bench_scoring(results, patients):
+    forms = patients.form_strings(500)
+    state = {'i': 0}
+
+    def next_form():
+        state['i'] = (state['i'] + 1) % len(forms)
+        form = forms[state['i']]
+        return [[scoring.encode_gender(form[0]), *(float(v) for v in form[1:])]]
+
+    model, scaler, le = scoring.load_artifacts()
+
+    def sklearn_path():
+        X = scoring.standardize(scaler, next_form())
+        prediction = model.predict(X)
+        probability = model.predict_proba(X).max()
+        return le.inverse_transform(prediction)[0].strip(), probability
+
+    latency(results, 'scoring.sklearn', samples(sklearn_path, max_calls=300))
+
+    engine, bundle_scaler, labels = model_bundle.load_scoring_artifacts()
+    latency(results, 'scoring.bundle', samples(
+        lambda: scoring.score_batch(engine, bundle_scaler, labels, next_form())))
+    latency(results, 'scoring.explain', samples(
+        lambda: scoring.explain_batch(engine, bundle_scaler, next_form())))
+    # Ранний выход на одиночном запросе: проверка после каждого дерева (predict_early, _early_rows)
+    for mode, confidence in (('exact', None), ('conf95', 0.95)):
+        latency(results, f"scoring.early_{mode}", samples(
+            lambda: scoring.score_batch_early(engine, bundle_scaler, labels, next_form(), confidence)))
+    return (model, scaler, le), (engine, bundle_scaler, labels)
+
+
+def bench_batch(results, patients, sizes, sklearn_artifacts, bundle_artifacts):
+    for engine_name, (model, scaler, le) in (('sklearn', sklearn_artifacts), ('bundle', bundle_artifacts)):
+        for size in sizes:
+            X = patients.sample(size)
+            times = samples(lambda: scoring.score_batch(model, scaler, le, X), min_calls=3, min_seconds=0.5)
+            results[f"batch.{engine_name}.{size}"] = metric(size / np.median(times), 'rows/s', 'higher')
+
+    # Ранний выход по деревьям: точный режим (классы как у полного леса) и порог уверенности 0.95
+    model, scaler, le = bundle_artifacts
+    for mode, confidence in (('exact', None), ('conf95', 0.95)):
+        for size in sizes:
+            X = patients.sample(size)
+            times = samples(lambda: scoring.score_batch_early(model, scaler, le, X, confidence),
+                            min_calls=3, min_seconds=0.5)
+            results[f"batch.early_{mode}.{size}"] = metric(size / np.median(times), 'rows/s', 'higher')
+        _, _, used = scoring.score_batch_early(model, scaler, le, X, confidence)
+        results[f"batch.early_{mode}.trees"] = metric(used.mean(), 'trees', 'lower')
+
+
+def bench_insert(results, patients, workdir):
+    rows = list(patients.history_rows(300))
+    path = os.path.join(workdir, 'insert_commit.db')
+    conn = sqlite3.connect(path)
+    create_schema(conn)
+    started = time.perf_counter()
+    for row in rows:
+        insert_predictions(conn, [row])
+    results['insert.commit_per_row'] = metric(len(rows) / (time.perf_counter() - started), 'rows/s', 'higher')
+    conn.close()
+
+    rows = list(patients.history_rows(20000))
+    writer = PredictionWriter(os.path.join(workdir, 'insert_writer.db'))
+    started = time.perf_counter()
+    for row in rows:
+        writer.submit([row])
+    writer.close()
+    results['insert.writer'] = metric(len(rows) / (time.perf_counter() - started), 'rows/s', 'higher')
+
+
+def history_db(patients, size, workdir):
+    """Соединение с синтетической таблицей истории из size строк (создается один раз на прогон)"""
+    path = os.path.join(workdir, f"history_{size}.db")
+    exists = os.path.exists(path)
+    conn = connect(path)
+    if not exists:
+        rows = patients.history_rows(size)
+        while True:
+            chunk = [row for _, row in zip(range(50000), rows)]
+            if not chunk:
+                break
+            insert_predictions(conn, chunk)
+    return path, conn
+
+
+def bench_history(results, patients, sizes, workdir):
+    for size in sizes:
+        _, conn = history_db(patients, size, workdir)
+
+        def page(filters=None, after=None):
+            records, cursor = fetch_history_page(conn, filters, after)
+            return [format_row(record) for record in records], cursor
+
+        latency(results, f"history.{size}.first_page", samples(page, max_calls=200, min_seconds=0.3))
+
+        # Курсор примерно из середины таблицы: стоимость страницы не должна зависеть от глубины
+        middle = conn.execute("SELECT timestamp, id FROM predictions ORDER BY timestamp DESC, id DESC "
+                              "LIMIT 1 OFFSET ?", (size // 2,)).fetchone()
+        latency(results, f"history.{size}.deep_page",
+                samples(lambda: page(after=middle), max_calls=200, min_seconds=0.3))
+        latency(results, f"history.{size}.filtered_page", samples(
+            lambda: page({'prediction': 'P', 'prob_min': 0.9, 'date_from': '2024-06-01'}),
+            max_calls=200, min_seconds=0.3))
+
+        # Панель аналитики: сводка по триггерам против агрегата полным проходом
+        latency(results, f"history.{size}.analytics", samples(
+            lambda: (fetch_class_summary(conn), fetch_daily_summary(conn)), max_calls=200, min_seconds=0.3))
+        latency(results, f"history.{size}.analytics_full_scan", samples(
+            lambda: conn.execute(FULL_SCAN_ANALYTICS).fetchall(), max_calls=50, min_seconds=0.3))
+        conn.close()
+
+
+def bench_similar(results, patients, sizes, workdir):
+    from similar_cases import SimilarCases
+
+    _, scaler, _ = model_bundle.load_scoring_artifacts()
+    for size in sizes:
+        path, conn = history_db(patients, size, workdir)
+        cache_dir = os.path.join(workdir, f"similar-cache-{size}")
+        started = time.perf_counter()
+        SimilarCases(scaler, path, cache_dir=cache_dir).open().close()
+        results[f"similar.{size}.build"] = metric((time.perf_counter() - started) * 1000, 'ms')
+        started = time.perf_counter()
+        index = SimilarCases(scaler, path, cache_dir=cache_dir).open()
+        results[f"similar.{size}.open"] = metric((time.perf_counter() - started) * 1000, 'ms')
+
+        queries = patients.sample(200)
+        state = {'i': 0}
+
+        def query():
+            state['i'] = (state['i'] + 1) % len(queries)
+            return index.query(queries[state['i']])
+
+        latency(results, f"similar.{size}.query", samples(query, max_calls=2000, min_seconds=0.5))
+        # Дозапись 1000 новых прогнозов: они попадают в хвост, который ищется перебором
+        insert_predictions(conn, list(patients.history_rows(1000)))
+        started = time.perf_counter()
+        index.sync()
+        results[f"similar.{size}.sync_1000"] = metric((time.perf_counter() - started) * 1000, 'ms')
+        latency(results, f"similar.{size}.query_with_tail", samples(query, max_calls=2000, min_seconds=0.5))
+        index.close()
+        conn.close()
+
+
+def bench_drift(results, patients, sizes, workdir):
+    from drift_monitor import DriftMonitor, open_history
+
+    _, scaler, _ = model_bundle.load_scoring_artifacts()
+    for size in sizes:
+        path, conn = history_db(patients, size, workdir)
+        conn.close()
+        started = time.perf_counter()
+        open_history(scaler, path, cache_dir=os.path.join(workdir, f"drift-cache-{size}"))
+        results[f"drift.{size}.catch_up"] = metric(size / (time.perf_counter() - started), 'rows/s', 'higher')
+
+    monitor = DriftMonitor(scaler)
+    rows = patients.sample(500)
+    state = {'i': 0}
+
+    def update():
+        state['i'] = (state['i'] + 1) % len(rows)
+        monitor.update(rows[state['i']])
+
+    latency(results, "drift.update", samples(update, max_calls=5000, min_seconds=0.5))
+    latency(results, "drift.report", samples(monitor.report, max_calls=2000, min_seconds=0.5))
+
+
+def bench_dataset(results, workdir):
+    cache_dir = os.path.join(workdir, 'dataset-cache')
+    results['dataset.parse_csv'] = metric(
+        np.median(samples(lambda: parse_dataset(model_bundle.TRAINING_DATA))) * 1000, 'ms')
+    load_dataset(model_bundle.TRAINING_DATA, cache_dir)
+    results['dataset.load_cache'] = metric(
+        np.median(samples(lambda: load_dataset(model_bundle.TRAINING_DATA, cache_dir))) * 1000, 'ms')
+
+
+def bench_cold_start(results):
+    scripts = {
+        'bundle': "import model_bundle; model_bundle.load_scoring_artifacts()",
+        'pickle': "import scoring; scoring.load_artifacts()",
+        'import_gui': "import ticket",
+    }
+    for name, script in scripts.items():
+        times = []
+        for _ in range(3):
+            started = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], cwd=APP_DIR, check=True)
+            times.append(time.perf_counter() - started)
+        results[f"cold_start.{name}"] = metric(min(times) * 1000, 'ms')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Таблица изменений относительно прошлого прогона; число регрессий"""
+    regressions = 0
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None or not before['value']:
+            continue
+        ratio = current['value'] / before['value']
+        worse = ratio > 1 + REGRESSION if current['better'] == 'lower' else ratio < 1 - REGRESSION
+        regressions += worse
+        mark = "  РЕГРЕССИЯ" if worse else ""
+        print(f"{name:<40} {before['value']:>14.3f} -> {current['value']:>14.3f} {current['unit']:<7} "
+              f"x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры горячих путей КИБЕР-ДИАГНОСТ 3000")
+    parser.add_argument('-o', '--output', help="куда записать JSON с результатами")
+    parser.add_argument('--compare', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--quick', action='store_true', help="урезанные размеры таблиц истории")
+    parser.add_argument('--only', nargs='+',
+                        choices=['scoring', 'batch', 'insert', 'history', 'similar', 'drift', 'dataset', 'cold_start'],
+                        help="запустить только эти группы")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    groups = set(args.only or ['scoring', 'batch', 'insert', 'history', 'similar', 'drift', 'dataset', 'cold_start'])
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    patients = SyntheticPatients(seed=args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="diabetes-bench-") as workdir:
+        if groups & {'scoring', 'batch'}:
+            sklearn_artifacts, bundle_artifacts = bench_scoring(results, patients)
+            if 'batch' in groups:
+                bench_batch(results, patients, sizes['batch'], sklearn_artifacts, bundle_artifacts)
+            if 'scoring' not in groups:
+                results = {k: v for k, v in results.items() if not k.startswith('scoring.')}
+        if 'insert' in groups:
+            bench_insert(results, patients, workdir)
+        if 'history' in groups:
+            bench_history(results, patients, sizes['history'], workdir)
+        if 'similar' in groups:
+            bench_similar(results, patients, sizes['history'], workdir)
+        if 'drift' in groups:
+            bench_drift(results, patients, sizes['history'], workdir)
+        if 'dataset' in groups:
+            bench_dataset(results, workdir)
+        if 'cold_start' in groups:
+            bench_cold_start(results)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'quick': args.quick,
+            'page_size': HISTORY_PAGE_SIZE,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        return 1 if compare(results, baseline) else 0
+
+    for name, result in results.items():
+        print(f"{name:<40} {result['value']:>14.3f} {result['unit']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
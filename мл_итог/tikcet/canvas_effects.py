@@ -0,0 +1,74 @@
+"""Фон и "глитчи" холста без выделения новых объектов на каждом кадре."""
+import random
+import tkinter as tk
+
+GLITCH_CHARS = "01!@#$%&*"
+
+
+def render_grid(master, width=900, height=900, spacing=20, line_color="#102030",
+                star_color="#00f0ff", bg="#0a0a12", stars=30):
+    """Сетка и звезды одной картинкой вместо ~120 отдельных элементов холста.
+
+    Рисуется заливками прямоугольников tk.PhotoImage.put, поэтому не требует PIL
+    и укладывается в пару сотен вызовов Tcl при запуске.
+    """
+    image = tk.PhotoImage(master=master, width=width, height=height)
+    image.put(bg, to=(0, 0, width, height))
+    for x in range(0, width, spacing):
+        image.put(line_color, to=(x, 0, x + 1, height))
+    for y in range(0, height, spacing):
+        image.put(line_color, to=(0, y, width, y + 1))
+    for _ in range(stars):
+        x = random.randint(0, width - 4)
+        y = random.randint(0, height - 4)
+        size = random.randint(1, 3)
+        # Как create_oval с контуром по умолчанию: черная рамка, внутри цвет звезды
+        image.put("#000000", to=(x, y, x + size + 1, y + size + 1))
+        if size > 1:
+            image.put(star_color, to=(x + 1, y + 1, x + size, y + size))
+    return image
+
+
+class GlitchPool:
+    """Фиксированный набор надписей-"глитчей", которые перемещаются и скрываются.
+
+    Надписи - окна холста (а не текстовые элементы), чтобы, как и раньше, рисоваться
+    поверх формы; создаются один раз, дальше меняются только текст, цвет и координаты.
+    """
+
+    def __init__(self, canvas, size=4, bg="#0a0a12"):
+        self.canvas = canvas
+        self.free = []
+        self.hide_timers = {}
+        for _ in range(size):
+            label = tk.Label(canvas, text="", bg=bg)
+            item = canvas.create_window(0, 0, window=label, state="hidden")
+            self.free.append((item, label))
+
+    def show(self, x, y, colors, duration_ms):
+        """Показ случайной надписи; False, если все надписи пула заняты"""
+        if not self.free:
+            return False
+        item, label = self.free.pop()
+        text = "".join(random.choice(GLITCH_CHARS) for _ in range(random.randint(5, 15)))
+        label.config(text=text, font=("Courier New", random.randint(8, 12)), fg=random.choice(colors))
+        self.canvas.coords(item, x, y)
+        self.canvas.itemconfigure(item, state="normal")
+        self.hide_timers[item] = (label, self.canvas.after(duration_ms, self.hide, item))
+        return True
+
+    def hide(self, item):
+        label, timer = self.hide_timers.pop(item, (None, None))
+        if label is None:
+            return
+        self.canvas.after_cancel(timer)
+        self.canvas.itemconfigure(item, state="hidden")
+        self.free.append((item, label))
+
+    def hide_all(self):
+        for item in list(self.hide_timers):
+            self.hide(item)
+
+    @property
+    def active(self):
+        return len(self.hide_timers)
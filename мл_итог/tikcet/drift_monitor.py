@@ -0,0 +1,253 @@
+"""Мониторинг дрейфа входных данных относительно обучающего распределения.
+
+По каждому из 11 признаков монитор держит моменты Уэлфорда (число строк, среднее, сумма
+квадратов отклонений) и гистограмму с фиксированными корзинами в единицах scaler
+(z = (x - mean) / scale, границы от -3 до 3 через 0.5 плюс два хвоста). Память постоянна,
+блоки строк сливаются формулами Чана, поэтому обновление из скоринга стоит O(строк блока).
+
+Эталон - среднее и масштаб из scaler и гистограмма обучающего CSV в тех же корзинах.
+Признак отмечается дрейфом, когда PSI гистограмм или сдвиг среднего в стандартных
+отклонениях обучающей выборки превышают пороги.
+
+История (таблица predictions) догоняется блоками по id: пол перекодируется в SQL, блок
+сразу становится матрицей float64. Состояние с последним учтенным id хранится в
+.cache/drift-<хэш scaler, CSV и пути базы>.json, поэтому повторный запуск читает только новые строки.
+
+    python мл_итог/tikcet/drift_monitor.py              # догнать историю и показать отчет
+    python мл_итог/tikcet/drift_monitor.py --json       # то же в JSON
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import scoring
+import model_bundle
+from prediction_store import DB_COLUMNS, DB_PATH
+
+CACHE_DIR = os.path.join(scoring.ARTIFACT_DIR, '.cache')
+# Внутренние границы корзин в единицах scaler; корзин на две больше - хвосты слева и справа
+EDGES = np.linspace(-3.0, 3.0, 13)
+CATCH_UP_CHUNK = 50000
+# Пороги: PSI 0.1-0.25 - заметный сдвиг, от 0.25 - дрейф; сдвиг среднего - в долях sd обучения
+PSI_WARN = 0.1
+PSI_DRIFT = 0.25
+SHIFT_DRIFT = 0.5
+# Меньше строк - статистика слишком шумная, статус 'few'
+MIN_ROWS = 200
+# Доля пустой корзины для PSI, чтобы логарифм оставался конечным
+PSI_FLOOR = 1e-4
+
+# Пол перекодируется прямо в запросе так же, как scoring.encode_gender
+HISTORY_SQL = (f"SELECT id, gender = '{scoring.gender_label(1)}', {', '.join(DB_COLUMNS[1:])} "
+               f"FROM predictions WHERE id > ? ORDER BY id")
+
+
+def reference_histogram(scaler, data_path=model_bundle.TRAINING_DATA):
+    """Доли обучающего CSV по корзинам (с весами повторов); без CSV - нормальное распределение"""
+    mean = np.asarray(scaler.mean_, dtype=np.float64)
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+    if data_path and os.path.exists(data_path):
+        from training import load_dataset
+
+        X, _, weights, _ = load_dataset(data_path)
+        counts = _bin_counts((np.asarray(X, dtype=np.float64) - mean) / scale, weights)
+        return counts / counts.sum(axis=1, keepdims=True)
+    from math import erf, sqrt
+
+    cdf = np.array([0.0] + [0.5 * (1 + erf(edge / sqrt(2))) for edge in EDGES] + [1.0])
+    return np.tile(np.diff(cdf), (len(mean), 1))
+
+
+def _bin_counts(Z, weights=None):
+    """Гистограммы всех признаков одним bincount: корзина признака j сдвинута на j * корзин"""
+    n_bins = len(EDGES) + 1
+    bins = np.searchsorted(EDGES, Z, side='right') + np.arange(Z.shape[1]) * n_bins
+    weights = None if weights is None else np.repeat(np.asarray(weights, dtype=np.float64), Z.shape[1])
+    counts = np.bincount(bins.ravel(), weights=weights, minlength=Z.shape[1] * n_bins)
+    return counts.reshape(Z.shape[1], n_bins).astype(np.float64)
+
+
+class DriftMonitor:
+    """Потоковые моменты и гистограммы признаков против эталона из scaler и обучающего CSV.
+
+    last_id - последний учтенный id таблицы predictions (catch_up); строки, поданные через
+    update, в нем не отражаются.
+    """
+
+    def __init__(self, scaler, reference=None):
+        self.train_mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.train_scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.reference = reference_histogram(scaler) if reference is None else reference
+        n_features = len(self.train_mean)
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.hist = np.zeros((n_features, len(EDGES) + 1))
+        self.last_id = 0
+
+    def update(self, X):
+        """Учесть блок сырых признаков (строки x 11); строки с пропусками пропускаются"""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(self.train_mean))
+        X = X[~np.isnan(X).any(axis=1)]
+        n = len(X)
+        if not n:
+            return
+        mean = X.mean(axis=0)
+        m2 = ((X - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+        self.hist += _bin_counts((X - self.train_mean) / self.train_scale)
+
+    def catch_up(self, conn, chunk_size=CATCH_UP_CHUNK):
+        """Дочитать predictions с id больше last_id блоками; возвращает число строк"""
+        cursor = conn.execute(HISTORY_SQL, (self.last_id,))
+        added = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.float64)
+            self.update(block[:, 1:])
+            self.last_id = int(block[-1, 0])
+            added += len(rows)
+        return added
+
+    def report(self):
+        """Статистика по признакам: сдвиг среднего, отношение sd, PSI и статус ok/warn/drift/few"""
+        std = np.sqrt(self.m2 / self.count) if self.count else np.full(len(self.mean), np.nan)
+        shift = (self.mean - self.train_mean) / self.train_scale
+        observed = np.maximum(self.hist / max(self.count, 1), PSI_FLOOR)
+        expected = np.maximum(self.reference, PSI_FLOOR)
+        psi = ((observed - expected) * np.log(observed / expected)).sum(axis=1)
+        features = []
+        for i, name in enumerate(scoring.FEATURES):
+            if self.count < MIN_ROWS:
+                status = 'few'
+            elif psi[i] >= PSI_DRIFT or abs(shift[i]) >= SHIFT_DRIFT:
+                status = 'drift'
+            elif psi[i] >= PSI_WARN:
+                status = 'warn'
+            else:
+                status = 'ok'
+            features.append({
+                'feature': name,
+                'status': status,
+                'mean': round(float(self.mean[i]), 4) if self.count else None,
+                'train_mean': round(float(self.train_mean[i]), 4),
+                'shift_sd': round(float(shift[i]), 4) if self.count else None,
+                'std_ratio': round(float(std[i] / self.train_scale[i]), 4) if self.count else None,
+                'psi': round(float(psi[i]), 4) if self.count else None,
+            })
+        return {'rows': self.count, 'last_id': self.last_id, 'features': features}
+
+    def drifted(self):
+        """Признаки со статусом drift"""
+        return [item['feature'] for item in self.report()['features'] if item['status'] == 'drift']
+
+    def matches(self, scaler):
+        return (np.array_equal(np.asarray(scaler.mean_, dtype=np.float64), self.train_mean)
+                and np.array_equal(np.asarray(scaler.scale_, dtype=np.float64), self.train_scale))
+
+    def state(self):
+        return {'count': self.count, 'last_id': self.last_id, 'mean': self.mean.tolist(),
+                'm2': self.m2.tolist(), 'hist': self.hist.tolist(),
+                'train_mean': self.train_mean.tolist(), 'train_scale': self.train_scale.tolist()}
+
+    def restore(self, state):
+        """Состояние из state(); чужое (другой scaler) игнорируется, возвращает, принято ли"""
+        if (state.get('train_mean') != self.train_mean.tolist()
+                or state.get('train_scale') != self.train_scale.tolist()):
+            return False
+        self.count, self.last_id = state['count'], state['last_id']
+        self.mean = np.array(state['mean'])
+        self.m2 = np.array(state['m2'])
+        self.hist = np.array(state['hist'])
+        return True
+
+
+def state_path(scaler, db_path=DB_PATH, data_path=model_bundle.TRAINING_DATA, cache_dir=CACHE_DIR):
+    from similar_cases import space_digest
+
+    digest = hashlib.sha256(space_digest(scaler, model_bundle.file_sha256(data_path)).encode('ascii'))
+    digest.update(os.path.realpath(db_path).encode('utf-8'))
+    return os.path.join(cache_dir, f"drift-{digest.hexdigest()[:16]}.json")
+
+
+def open_history(scaler, db_path=DB_PATH, data_path=model_bundle.TRAINING_DATA, cache_dir=CACHE_DIR):
+    """Монитор по всей истории predictions: сохраненное состояние плюс догонка новых строк.
+
+    Состояние записывается сразу после догонки. Строки, которые вызывающий код затем подает
+    через update и одновременно пишет в predictions, при следующем открытии будут прочитаны
+    из таблицы, а не из состояния, поэтому не посчитаются дважды.
+    """
+    reference = reference_histogram(scaler, data_path)
+    monitor = DriftMonitor(scaler, reference)
+    path = state_path(scaler, db_path, data_path, cache_dir)
+    try:
+        with open(path, encoding='utf-8') as f:
+            monitor.restore(json.load(f))
+    except (FileNotFoundError, ValueError):
+        pass
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if monitor.last_id and (conn.execute("SELECT MAX(id) FROM predictions").fetchone()[0] or 0) < monitor.last_id:
+            # База пересоздана: id начались заново, сохраненное состояние к ней не относится
+            monitor = DriftMonitor(scaler, reference)
+        added = monitor.catch_up(conn)
+    except sqlite3.OperationalError:
+        # Таблицы еще нет - истории нет
+        added = 0
+    finally:
+        conn.close()
+    if added:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(monitor.state(), f)
+        os.replace(f"{path}.tmp", path)
+    return monitor
+
+
+def format_report(report):
+    lines = [f"{'признак':<8} {'статус':<6} {'среднее':>10} {'обучение':>10} {'сдвиг sd':>9} "
+             f"{'sd/sd':>6} {'PSI':>7}"]
+    for item in report['features']:
+        if item['mean'] is None:
+            lines.append(f"{item['feature']:<8} {item['status']:<6}")
+            continue
+        lines.append(f"{item['feature']:<8} {item['status']:<6} {item['mean']:>10.3f} {item['train_mean']:>10.3f} "
+                     f"{item['shift_sd']:>+9.2f} {item['std_ratio']:>6.2f} {item['psi']:>7.3f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Дрейф входных данных относительно обучающей выборки")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--model-dir', default=scoring.ARTIFACT_DIR)
+    parser.add_argument('--data', default=model_bundle.TRAINING_DATA, help="обучающий CSV (эталонные гистограммы)")
+    parser.add_argument('--json', action='store_true', help="отчет в JSON")
+    args = parser.parse_args(argv)
+
+    _, scaler, _ = model_bundle.load_scoring_artifacts(args.model_dir)
+    started = time.perf_counter()
+    monitor = open_history(scaler, args.db, args.data)
+    elapsed = time.perf_counter() - started
+    report = monitor.report()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+    print(f"строк: {report['rows']}, последний id: {report['last_id']}, {elapsed:.2f} с", file=sys.stderr)
+    return 1 if monitor.drifted() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
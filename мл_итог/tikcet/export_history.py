@@ -0,0 +1,243 @@
+"""Потоковая выгрузка таблицы predictions в CSV и в сжатый .npz по колонкам.
+
+    python мл_итог/tikcet/export_history.py --csv history.csv --npz history.npz
+    python мл_итог/tikcet/export_history.py --npz 2024.npz --from 2024-01-01 --to 2024-12-31
+    python мл_итог/tikcet/export_history.py --csv history.csv --resume      # продолжить прерванную
+    python мл_итог/tikcet/export_history.py --csv new.csv --after-id 125000 # только новые строки
+
+Строки читаются одним курсором по id блоками fetchmany(--chunk-size), поэтому память не зависит
+от размера таблицы. Колонки .npz копятся во временных файлах рядом с результатом и в конце
+упаковываются в zip (формат np.savez_compressed) тоже блоками. После каждого блока состояние
+(последний id, число строк, размеры файлов) сохраняется, и --resume продолжает с него.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+from prediction_store import DB_PATH, HISTORY_COLUMNS, history_filters
+from scoring import FEATURES
+
+EXPORT_COLUMNS = HISTORY_COLUMNS + ['explanation']
+# Вклады из scoring.explanation_json: не длиннее всех признаков со значением вида -0.1234
+EXPLANATION_WIDTH = len(json.dumps({name: -0.1234 for name in FEATURES}))
+
+# Строки хранятся фиксированной ширины: timestamp 'ГГГГ-ММ-ДД ЧЧ:ММ:СС', пол 'МУЖСКОЙ'/'ЖЕНСКИЙ',
+# explanation без вкладов (NULL) - пустая строка. Возраст - float64: в базе бывает дробным
+COLUMN_DTYPES = {
+    'id': np.dtype(np.int64),
+    'timestamp': np.dtype('U19'),
+    'gender': np.dtype('U7'),
+    'prediction': np.dtype('U8'),
+    'explanation': np.dtype(f'U{EXPLANATION_WIDTH}'),
+}
+DEFAULT_DTYPE = np.dtype(np.float64)
+COPY_BLOCK = 1 << 20
+
+
+def column_dtype(name):
+    return COLUMN_DTYPES.get(name, DEFAULT_DTYPE)
+
+
+class ExportState:
+    """Прогресс выгрузки в <первый выход>.export-state.json; пишется атомарно после блока"""
+
+    def __init__(self, path, params):
+        self.path = path
+        self.params = params
+        self.last_id = params['after_id']
+        self.rows = 0
+        self.csv_bytes = 0
+        self.part_bytes = {}
+
+    @classmethod
+    def load(cls, path, params):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data['params'] != params:
+            raise ValueError("параметры выгрузки отличаются от прерванной; начните без --resume")
+        state = cls(path, params)
+        state.last_id = data['last_id']
+        state.rows = data['rows']
+        state.csv_bytes = data['csv_bytes']
+        state.part_bytes = data['part_bytes']
+        return state
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'params': self.params, 'last_id': self.last_id, 'rows': self.rows,
+                       'csv_bytes': self.csv_bytes, 'part_bytes': self.part_bytes}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ColumnParts:
+    """Колонки .npz как сырые файлы в каталоге <npz>.parts до финальной упаковки"""
+
+    def __init__(self, npz_path, state):
+        self.npz_path = npz_path
+        self.directory = f"{npz_path}.parts"
+        os.makedirs(self.directory, exist_ok=True)
+        self.files = {}
+        for name in EXPORT_COLUMNS:
+            path = os.path.join(self.directory, f"{name}.bin")
+            f = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+            if os.fstat(f.fileno()).st_size < state.part_bytes.get(name, 0):
+                f.close()
+                raise ValueError(f"часть {path} короче сохраненного состояния; начните без --resume")
+            # Данные после последнего сохраненного блока не подтверждены - отрезаем
+            f.truncate(state.part_bytes.get(name, 0))
+            f.seek(0, os.SEEK_END)
+            self.files[name] = f
+
+    def append(self, columns):
+        for name, values in zip(EXPORT_COLUMNS, columns):
+            if name == 'explanation':
+                values = ['' if value is None else value for value in values]
+                if max(map(len, values)) > EXPLANATION_WIDTH:
+                    raise ValueError(f"explanation длиннее {EXPLANATION_WIDTH} символов")
+            np.asarray(values, dtype=column_dtype(name)).tofile(self.files[name])
+
+    def sync(self, state):
+        for name, f in self.files.items():
+            f.flush()
+            state.part_bytes[name] = f.tell()
+
+    def pack(self, rows):
+        """Сборка .npz из временных файлов блоками и удаление каталога частей"""
+        tmp = f"{self.npz_path}.tmp"
+        with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            for name, f in self.files.items():
+                header = {'descr': np.lib.format.dtype_to_descr(column_dtype(name)),
+                          'fortran_order': False, 'shape': (rows,)}
+                with archive.open(f"{name}.npy", 'w', force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(member, header)
+                    f.seek(0)
+                    shutil.copyfileobj(f, member, COPY_BLOCK)
+        os.replace(tmp, self.npz_path)
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def export(conn, csv_path=None, npz_path=None, date_from=None, date_to=None, after_id=0,
+           chunk_size=10000, resume=False, progress=None):
+    """Выгрузка строк с id > after_id в заданном диапазоне дат; возвращает (строк, последний id)"""
+    if not csv_path and not npz_path:
+        raise ValueError("нужен хотя бы один выход: CSV или .npz")
+    params = {'csv': csv_path, 'npz': npz_path, 'date_from': date_from, 'date_to': date_to,
+              'after_id': after_id}
+    state_path = f"{csv_path or npz_path}.export-state.json"
+    if resume and os.path.exists(state_path):
+        state = ExportState.load(state_path, params)
+    else:
+        state = ExportState(state_path, params)
+        if npz_path:
+            shutil.rmtree(f"{npz_path}.parts", ignore_errors=True)
+
+    clauses, args = history_filters({'date_from': date_from, 'date_to': date_to})
+    clauses.append("id > ?")
+    args.append(state.last_id)
+    present = {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}
+    # База до появления explanation открыта только на чтение - колонку не добавить, выгружаем NULL
+    columns = [name if name in present else f"NULL AS {name}" for name in EXPORT_COLUMNS]
+    sql = (f"SELECT {', '.join(columns)} FROM predictions "
+           f"WHERE {' AND '.join(clauses)} ORDER BY id")
+
+    sink = writer = parts = None
+    try:
+        if csv_path:
+            sink = open(csv_path, 'r+' if state.csv_bytes else 'w', newline='', encoding='utf-8')
+            sink.truncate(state.csv_bytes)
+            sink.seek(state.csv_bytes)
+            writer = csv.writer(sink)
+            if not state.csv_bytes:
+                writer.writerow(EXPORT_COLUMNS)
+        if npz_path:
+            parts = ColumnParts(npz_path, state)
+
+        cursor = conn.execute(sql, args)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if writer is not None:
+                writer.writerows(rows)
+                sink.flush()
+                state.csv_bytes = sink.tell()
+            if parts is not None:
+                parts.append(zip(*rows))
+                parts.sync(state)
+            state.rows += len(rows)
+            state.last_id = rows[-1][0]
+            state.save()
+            if progress is not None:
+                progress(state.rows, state.last_id)
+
+        if parts is not None:
+            parts.pack(state.rows)
+            parts = None
+    finally:
+        if sink is not None:
+            sink.close()
+        if parts is not None:
+            parts.close()
+    state.remove()
+    return state.rows, state.last_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка истории прогнозов в CSV и .npz")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite-база с таблицей predictions")
+    parser.add_argument('--csv', help="файл CSV")
+    parser.add_argument('--npz', help="сжатый .npz с массивом на каждую колонку")
+    parser.add_argument('--from', dest='date_from', help="с даты ГГГГ-ММ-ДД включительно")
+    parser.add_argument('--to', dest='date_to', help="по дату ГГГГ-ММ-ДД включительно")
+    parser.add_argument('--after-id', type=int, default=0, help="только строки с id больше этого")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="строк в одном fetchmany")
+    parser.add_argument('--resume', action='store_true', help="продолжить прерванную выгрузку")
+    args = parser.parse_args(argv)
+    if not args.csv and not args.npz:
+        parser.error("нужно указать --csv и/или --npz")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size должен быть положительным")
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    started = time.perf_counter()
+    last_report = [started]
+
+    def progress(rows, last_id):
+        now = time.perf_counter()
+        if now - last_report[0] >= 1.0:
+            last_report[0] = now
+            print(f"выгружено: {rows} (id {last_id})", file=sys.stderr)
+
+    try:
+        rows, last_id = export(conn, args.csv, args.npz, args.date_from, args.date_to,
+                               args.after_id, args.chunk_size, args.resume, progress)
+    except ValueError as e:
+        print(f"ошибка: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"выгружено строк: {rows}, последний id: {last_id}, {elapsed:.2f} с", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+"""Скомпилированный Random Forest: все деревья в плоских массивах NumPy.
+
+Узлы всех деревьев лежат подряд в массивах feature/threshold/value, потомки узла i
+хранятся парой children[2*i] (правый) и children[2*i + 1] (левый). Листья замкнуты
+сами на себя (threshold = +inf, оба потомка = свой индекс), поэтому обход всех деревьев
+для всех строк идет без ветвлений за max_depth шагов, а класс и вероятности
+получаются за один проход.
+
+predict_early - ранний выход: деревья идут в порядке tree_order (самые "уверенные" на
+проверочных данных - первыми), и строка останавливается, как только оставшиеся деревья
+уже не могут сменить лидирующий класс. Класс при этом совпадает с predict.
+
+Масштабатор можно "вплавить" в пороги (fuse_scaler): разбиения монотонны по каждому
+признаку, поэтому z <= t эквивалентно x <= t * scale + mean, и сырые значения анализов
+идут в лес без scaler.transform.
+
+    python мл_итог/tikcet/forest_engine.py                 # сверка с sklearn и замер задержки
+    python мл_итог/tikcet/forest_engine.py --export-fused  # сохранить лес со вплавленным scaler
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# До этого числа строк обходим все пары (строка, дерево) разом - выгодно для одиночных
+# запросов; большие пакеты идем по деревьям, чтобы рабочие массивы помещались в кэш
+SMALL_BATCH = 64
+
+# Ранний выход: деревьев в блоке между проверками и минимум деревьев в режиме порога уверенности
+EARLY_BLOCK = 8
+EARLY_MIN_TREES = 10
+# До этого числа строк ранний выход проверяется после каждого дерева, а не блока
+EARLY_ROW_BATCH = 4
+# Почти равные суммы голосов: порядок сложения мог повлиять на argmax, такие строки пересчитываются
+TIE_EPSILON = 1e-9
+
+FUSED_FILE = 'diabetes_model_fused.npz'
+
+
+def _raw_thresholds(threshold, mean, scale):
+    """Наибольшее сырое x, для которого float32((x - mean) / scale) <= threshold.
+
+    Простое threshold * scale + mean ошибается на границе: sklearn сравнивает округленные
+    до float32 значения, и порог часто совпадает с самим значением из обучающей выборки.
+    Поэтому точную границу ищем бисекцией по float64 для всех узлов разом.
+    """
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    lo = threshold * scale + mean
+    hi = lo.copy()
+    width = np.abs(lo) * 1e-6 + 1e-12
+    while True:
+        low_bad = ~goes_left(lo)
+        high_bad = goes_left(hi)
+        if not (low_bad.any() or high_bad.any()):
+            break
+        lo = np.where(low_bad, lo - width, lo)
+        hi = np.where(high_bad, hi + width, hi)
+        width *= 2
+    while True:
+        mid = lo + (hi - lo) / 2
+        done = (mid == lo) | (mid == hi)
+        if done.all():
+            return lo
+        left = goes_left(mid)
+        lo = np.where(left & ~done, mid, lo)
+        hi = np.where(~left & ~done, mid, hi)
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, children, value, roots, depths, classes, n_features, fused=False,
+                 tree_order=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depths = depths
+        self.classes_ = classes
+        self.n_features = int(n_features)
+        self.max_depth = int(depths.max())
+        # fused: пороги в исходных единицах анализов, scaler.transform не нужен
+        self.fused = bool(fused)
+        # Порядок деревьев для predict_early (order_trees); по умолчанию - как в лесу
+        self.tree_order = (np.arange(len(roots), dtype=np.intp) if tree_order is None
+                           else np.asarray(tree_order, dtype=np.intp))
+        # Узлы списками Python для _early_rows; строятся при первом одиночном раннем выходе
+        self._node_lists = None
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Экспорт обученного RandomForestClassifier в плоские массивы"""
+        features, thresholds, children, values, roots, depths = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            nodes = np.arange(offset, offset + n, dtype=np.intp)
+            is_leaf = tree.children_left == -1
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+            threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+            pairs = np.empty((n, 2), dtype=np.intp)
+            pairs[:, 0] = np.where(is_leaf, nodes, tree.children_right + offset)
+            pairs[:, 1] = np.where(is_leaf, nodes, tree.children_left + offset)
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(pairs.ravel())
+            values.append(value / normalizer)
+            roots.append(offset)
+            depths.append(tree.max_depth)
+            offset += n
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(children), np.concatenate(values),
+            np.array(roots, dtype=np.intp), np.array(depths, dtype=np.intp),
+            np.asarray(model.classes_), model.n_features_in_,
+        )
+
+    def fuse_scaler(self, scaler):
+        """Новый лес, принимающий сырые признаки: пороги пересчитаны через mean/scale"""
+        if self.fused:
+            raise ValueError("масштабатор уже вплавлен в пороги")
+        mean = np.zeros(self.n_features) if scaler.mean_ is None else np.asarray(scaler.mean_, dtype=np.float64)
+        scale = np.ones(self.n_features) if scaler.scale_ is None else np.asarray(scaler.scale_, dtype=np.float64)
+        threshold = self.threshold.copy()
+        split = np.isfinite(threshold)
+        threshold[split] = _raw_thresholds(
+            threshold[split], mean.take(self.feature[split]), scale.take(self.feature[split]))
+        return CompiledForest(
+            self.feature, threshold, self.children, self.value, self.roots, self.depths,
+            self.classes_, self.n_features, fused=True, tree_order=self.tree_order,
+        )
+
+    def save(self, path):
+        np.savez(
+            path, feature=self.feature, threshold=self.threshold, children=self.children,
+            value=self.value, roots=self.roots, depths=self.depths, classes=self.classes_,
+            n_features=self.n_features, fused=self.fused, tree_order=self.tree_order,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['feature'], data['threshold'], data['children'], data['value'],
+                data['roots'], data['depths'], data['classes'], data['n_features'], bool(data['fused']),
+                data['tree_order'] if 'tree_order' in data else None,
+            )
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def _prepare(self, X):
+        # Как и sklearn, сравниваем значения float32 с порогами float64; во вплавленном лесу
+        # сырые значения сравниваются с пересчитанными порогами без округления
+        dtype = np.float64 if self.fused else np.float32
+        return np.ascontiguousarray(np.asarray(X, dtype=dtype).reshape(-1, self.n_features))
+
+    def _apply_flat(self, X, trees=None):
+        """Обход всех пар (строка, дерево) одним набором векторных операций; trees - подмножество деревьев"""
+        roots, depth = self.roots, self.max_depth
+        if trees is not None:
+            roots, depth = roots.take(trees), int(self.depths.take(trees).max())
+        n_rows, n_trees = X.shape[0], len(roots)
+        flat = X.ravel()
+        nodes = np.tile(roots, n_rows)
+        # Сдвиг начала строки в плоском X для каждой пары (строка, дерево)
+        offsets = np.repeat(np.arange(n_rows, dtype=np.intp) * X.shape[1], n_trees) if n_rows > 1 else 0
+        for _ in range(depth):
+            values = flat.take(self.feature.take(nodes) + offsets)
+            go_left = np.less_equal(values, self.threshold.take(nodes))
+            nodes = self.children.take(2 * nodes + go_left)
+        return nodes.reshape(n_rows, n_trees)
+
+    def _tree_leaves(self, X, trees=None):
+        """Листья по деревьям: для каждого дерева - вектор листьев всех строк"""
+        flat = X.ravel()
+        offsets = np.arange(X.shape[0], dtype=np.intp) * X.shape[1]
+        roots, depths = self.roots, self.depths
+        if trees is not None:
+            roots, depths = roots.take(trees), depths.take(trees)
+        for root, depth in zip(roots.tolist(), depths.tolist()):
+            nodes = np.full(X.shape[0], root, dtype=np.intp)
+            for _ in range(depth):
+                go_left = np.less_equal(flat.take(self.feature.take(nodes) + offsets), self.threshold.take(nodes))
+                nodes = self.children.take(2 * nodes + go_left)
+            yield nodes
+
+    def apply(self, X):
+        """Индексы листьев: матрица (строки x деревья)"""
+        X = self._prepare(X)
+        if len(X) <= SMALL_BATCH:
+            return self._apply_flat(X)
+        return np.column_stack(list(self._tree_leaves(X)))
+
+    def predict_proba(self, X):
+        X = self._prepare(X)
+        if len(X) <= SMALL_BATCH:
+            proba = self.value.take(self._apply_flat(X), axis=0).sum(axis=1)
+        else:
+            proba = np.zeros((len(X), self.value.shape[1]), dtype=np.float64)
+            for leaves in self._tree_leaves(X):
+                proba += self.value.take(leaves, axis=0)
+        proba /= self.n_estimators
+        return proba
+
+    def _votes(self, X, trees):
+        """Сумма долей классов по деревьям trees для каждой строки"""
+        if len(X) <= SMALL_BATCH:
+            return self.value.take(self._apply_flat(X, trees), axis=0).sum(axis=1)
+        total = np.zeros((len(X), self.value.shape[1]), dtype=np.float64)
+        for leaves in self._tree_leaves(X, trees):
+            total += self.value.take(leaves, axis=0)
+        return total
+
+    def order_trees(self, X):
+        """Порядок деревьев для раннего выхода по проверочным строкам X.
+
+        Первыми идут деревья, которые в среднем отдают больше всего голоса классу, выбранному
+        всем лесом: с ними разрыв между лидером и остальными набирается быстрее всего.
+        """
+        X = self._prepare(X)
+        best = self.predict_proba(X).argmax(axis=1)
+        agreement = np.array([self.value[leaves, best].mean() for leaves in self._tree_leaves(X)])
+        return np.argsort(-agreement, kind='stable').astype(np.intp)
+
+    def predict_early(self, X, confidence=None, block=EARLY_BLOCK, min_trees=EARLY_MIN_TREES):
+        """Классы с ранним выходом: (классы, доля голосов лидера, число использованных деревьев).
+
+        Деревья обходятся в порядке tree_order: первый блок, затем block деревьев, и каждый
+        следующий блок вдвое больше предыдущего. Без confidence (точный режим)
+        строка останавливается, когда отрыв лидера от второго класса больше числа оставшихся
+        деревьев (каждое дерево дает классу не больше 1), и класс совпадает с predict; раньше
+        половины леса это невозможно, поэтому первый блок - n_estimators // 2 + 1 деревьев.
+        С confidence строка останавливается еще и тогда, когда после min_trees деревьев доля
+        голосов лидера не меньше confidence - быстрее, но класс может отличаться от predict.
+        Доля голосов считается только по использованным деревьям. До EARLY_ROW_BATCH строк
+        (одиночный запрос) деревья после первого блока проходятся по одному для каждой строки
+        (_early_rows): векторный обход блока стоит там больше самих деревьев.
+        """
+        X = self._prepare(X)
+        n_trees, n_classes = len(self.roots), self.value.shape[1]
+        first = n_trees // 2 + 1 if confidence is None else min(max(min_trees, 1), n_trees)
+        if len(X) <= EARLY_ROW_BATCH:
+            total, used = self._early_rows(X, confidence, first)
+        else:
+            total, used = self._early_blocks(X, confidence, first, block)
+
+        best = total.argmax(axis=1)
+        # Прошедшие весь лес строки с почти ничьей - через predict_proba: там argmax считается
+        # по сумме в исходном порядке деревьев, и при равенстве выбирается тот же класс
+        if confidence is None and n_classes > 1:
+            top = np.partition(total, n_classes - 2, axis=1)
+            ties = np.flatnonzero((used == n_trees) & (top[:, -1] - top[:, -2] <= TIE_EPSILON))
+            if ties.size:
+                best[ties] = self.predict_proba(X[ties]).argmax(axis=1)
+        share = total[np.arange(len(X)), best] / np.maximum(used, 1)
+        return self.classes_.take(best), share, used
+
+    def _early_blocks(self, X, confidence, first, block):
+        """Ранний выход блоками деревьев для всех еще не остановившихся строк разом"""
+        n_trees, n_classes = len(self.roots), self.value.shape[1]
+        total = np.zeros((len(X), n_classes), dtype=np.float64)
+        used = np.zeros(len(X), dtype=np.intp)
+        active = np.arange(len(X))
+        step, done = first, 0
+        while active.size and done < n_trees:
+            trees = self.tree_order[done:done + step]
+            total[active] += self._votes(X[active], trees)
+            done += len(trees)
+            used[active] = done
+            # Каждая проверка - отдельный обход леса; для трудных строк блоки удваиваются
+            step = block if done == first else 2 * step
+            if n_classes < 2:
+                break
+            votes = total[active]
+            top = np.partition(votes, n_classes - 2, axis=1)
+            leader, second = top[:, -1], top[:, -2]
+            finished = leader - second > n_trees - done + TIE_EPSILON
+            if confidence is not None:
+                finished |= leader >= confidence * done
+            active = active[~finished]
+        return total, used
+
+    def _early_rows(self, X, confidence, first):
+        """Ранний выход для нескольких строк: проверка после каждого дерева, обход - на списках Python.
+
+        В точном режиме первый блок (половина леса) дешевле пройти одним векторным обходом,
+        с порогом уверенности деревья идут по одному с самого начала.
+        """
+        n_trees, n_classes = len(self.roots), self.value.shape[1]
+        if self._node_lists is None:
+            self._node_lists = (self.feature.tolist(), self.threshold.tolist(),
+                                self.children.tolist(), self.value.tolist())
+        feature, threshold, children, value = self._node_lists
+        roots = self.roots.take(self.tree_order).tolist()
+        start = first if confidence is None else 0
+        if start:
+            total = self._votes(X, self.tree_order[:start])
+        else:
+            total = np.zeros((len(X), n_classes), dtype=np.float64)
+        used = np.empty(len(X), dtype=np.intp)
+        for i, row in enumerate(X.tolist()):
+            votes = total[i].tolist()
+            done = start
+            while done < n_trees:
+                if done >= first:
+                    if n_classes < 2:
+                        break
+                    leader, second = sorted(votes)[-1:-3:-1]
+                    if (leader - second > n_trees - done + TIE_EPSILON
+                            or confidence is not None and leader >= confidence * done):
+                        break
+                node = roots[done]
+                while True:
+                    following = children[2 * node + (row[feature[node]] <= threshold[node])]
+                    if following == node:
+                        break
+                    node = following
+                for k, share in enumerate(value[node]):
+                    votes[k] += share
+                done += 1
+            total[i] = votes
+            used[i] = done
+        return total, used
+
+    def contributions(self, X):
+        """Вклады признаков по путям в деревьях: (bias, contrib).
+
+        На каждом разбиении изменение долей классов от узла к потомку приписывается признаку
+        узла; сумма по пути и среднее по деревьям дают contrib (строки x признаки x классы),
+        а bias - средние доли классов в корнях. bias + contrib.sum(axis=1) равно predict_proba.
+        Обход тот же, что в _apply_flat, блоками по SMALL_BATCH строк; вклады копятся bincount.
+        """
+        X = self._prepare(X)
+        n_classes = self.value.shape[1]
+        n_trees = len(self.roots)
+        contrib = np.empty((len(X), self.n_features, n_classes), dtype=np.float64)
+        for start in range(0, len(X), SMALL_BATCH):
+            chunk = X[start:start + SMALL_BATCH]
+            n_rows = len(chunk)
+            flat = chunk.ravel()
+            nodes = np.tile(self.roots, n_rows)
+            offsets = np.repeat(np.arange(n_rows, dtype=np.intp) * self.n_features, n_trees)
+            slots = n_rows * self.n_features
+            total = np.zeros((n_classes, slots), dtype=np.float64)
+            for _ in range(self.max_depth):
+                slot = self.feature.take(nodes) + offsets
+                go_left = np.less_equal(flat.take(slot), self.threshold.take(nodes))
+                following = self.children.take(2 * nodes + go_left)
+                # В листе потомок - сам узел, изменение нулевое
+                delta = self.value.take(following, axis=0) - self.value.take(nodes, axis=0)
+                for k in range(n_classes):
+                    total[k] += np.bincount(slot, weights=delta[:, k], minlength=slots)
+                nodes = following
+            contrib[start:start + n_rows] = total.T.reshape(n_rows, self.n_features, n_classes)
+        contrib /= n_trees
+        bias = self.value.take(self.roots, axis=0).mean(axis=0)
+        return bias, contrib
+
+    def predict_with_proba(self, X):
+        """Класс и вероятности за один обход леса"""
+        proba = self.predict_proba(X)
+        return self.classes_.take(proba.argmax(axis=1)), proba
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+
+def check_parity(model, engine, X):
+    """Сверка с sklearn: классы должны совпадать точно, вероятности до ошибки округления"""
+    X = np.asarray(X, dtype=np.float64)
+    expected_proba = model.predict_proba(X)
+    labels, proba = engine.predict_with_proba(X)
+    if not np.array_equal(labels, model.predict(X)):
+        raise AssertionError("классы скомпилированного леса расходятся с sklearn")
+    if not np.allclose(proba, expected_proba, rtol=0.0, atol=1e-12):
+        diff = np.abs(proba - expected_proba).max()
+        raise AssertionError(f"вероятности расходятся с sklearn: max |diff| = {diff:.3g}")
+    return len(X)
+
+
+def check_fused_parity(engine, fused, scaler, X_raw):
+    """Сверка вплавленного леса с двухшаговым путем scaler.transform + лес: листья должны совпасть"""
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    expected = engine.apply((X_raw - scaler.mean_) / scaler.scale_)
+    mismatched = np.count_nonzero((fused.apply(X_raw) != expected).any(axis=1))
+    if mismatched:
+        raise AssertionError(f"вплавленный лес расходится с двухшаговым путем в {mismatched} строках")
+    return len(X_raw)
+
+
+def _latency(fn, row, repeat=2000):
+    fn(row)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(row)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main(argv=None):
+    import csv
+
+    import scoring
+
+    parser = argparse.ArgumentParser(description="Сверка скомпилированного леса с sklearn")
+    parser.add_argument('--model-dir', default=scoring.ARTIFACT_DIR, help="каталог с .pkl артефактами")
+    parser.add_argument('--export-fused', nargs='?', const='', metavar='PATH',
+                        help=f"сохранить лес со вплавленным scaler (по умолчанию {FUSED_FILE} в --model-dir)")
+    args = parser.parse_args(argv)
+
+    model, scaler, _ = scoring.load_artifacts(args.model_dir)
+    engine = CompiledForest.from_sklearn(model)
+    fused = engine.fuse_scaler(scaler)
+
+    path = os.path.join(args.model_dir, 'Dataset of Diabetes .csv')
+    with open(path, newline='') as f:
+        records = list(csv.DictReader(f))
+    X = np.array([[scoring.encode_gender(r['Gender'])] + [float(r[c]) for c in scoring.FEATURES[1:]]
+                  for r in records])
+    X_scaled = scoring.standardize(scaler, X)
+
+    rng = np.random.default_rng(42)
+    noisy = X_scaled + rng.normal(scale=0.5, size=X_scaled.shape)
+    checked = check_parity(model, engine, np.vstack([X_scaled, noisy]))
+    checked += sum(check_parity(model, engine, X_scaled[i:i + SMALL_BATCH])
+                   for i in range(0, len(X_scaled), SMALL_BATCH))
+    print(f"паритет с sklearn: {checked} строк, {engine.n_estimators} деревьев, {len(engine.feature)} узлов")
+
+    noisy_raw = X * rng.lognormal(sigma=0.2, size=X.shape)
+    noisy_raw[:, 0] = X[:, 0]
+    checked = check_fused_parity(engine, fused, scaler, np.vstack([X, noisy_raw]))
+    print(f"паритет вплавленного scaler с двухшаговым путем: {checked} строк")
+
+    bias, contrib = fused.contributions(X)
+    error = np.abs(bias + contrib.sum(axis=1) - fused.predict_proba(X)).max()
+    if error > 1e-9:
+        raise AssertionError(f"сумма вкладов расходится с predict_proba: max |diff| = {error:.3g}")
+    print(f"вклады признаков: сумма совпадает с predict_proba (max |diff| = {error:.1g})")
+
+    fused.tree_order = fused.order_trees(X)
+    checked = np.vstack([X, noisy_raw])
+    labels, _, used = fused.predict_early(checked)
+    if not np.array_equal(labels, fused.predict(checked)):
+        raise AssertionError("ранний выход расходится с полным лесом")
+    print(f"ранний выход: классы совпадают на {len(checked)} строках, "
+          f"в среднем {used.mean():.1f} из {fused.n_estimators} деревьев")
+
+    row = X[:1]
+    sklearn_us = _latency(lambda r: model.predict_proba(scoring.standardize(scaler, r)), row, repeat=50)
+    engine_us = _latency(lambda r: engine.predict_with_proba(scoring.standardize(scaler, r)), row, repeat=500)
+    fused_us = _latency(fused.predict_with_proba, row)
+    print(f"одна строка: sklearn {sklearn_us:.0f} мкс, compiled {engine_us:.0f} мкс, fused {fused_us:.0f} мкс")
+    explain_us = _latency(fused.contributions, row, repeat=500)
+    print(f"вклады признаков одной строки: {explain_us:.0f} мкс")
+
+    if args.export_fused is not None:
+        target = args.export_fused or os.path.join(args.model_dir, FUSED_FILE)
+        fused.save(target)
+        print(f"сохранено: {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
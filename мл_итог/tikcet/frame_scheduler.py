@@ -0,0 +1,176 @@
+"""Единый планировщик кадров для анимаций окна."""
+import time
+
+
+class Effect:
+    __slots__ = ('name', 'callback', 'interval', 'priority', 'optional', 'due')
+
+    def __init__(self, name, callback, interval, priority, optional):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.priority = priority
+        self.optional = optional
+        self.due = 0.0
+
+
+class FrameScheduler:
+    """Все анимации окна от одного тика root.after.
+
+    Эффект регистрируется со своим интервалом; на кадре вызываются те, чей срок наступил.
+    callback(steps) получает число прошедших интервалов, поэтому скорость анимации не зависит
+    от частоты кадров. Кадры, опоздавшие из-за занятого цикла событий, не догоняются, а
+    пропускаются. Если кадр выбрал бюджет, оставшиеся эффекты переносятся на следующий кадр.
+
+    Тик останавливается, когда окно свернуто или приложение потеряло фокус. В экономном
+    режиме частота кадров снижается, а необязательные эффекты не выполняются.
+    """
+
+    def __init__(self, root, fps=20, budget_ms=8.0, low_power_fps=5, pause_on_focus_loss=True,
+                 clock=time.perf_counter):
+        self.root = root
+        self.fps = fps
+        self.low_power_fps = low_power_fps
+        self.budget = budget_ms / 1000
+        self.pause_on_focus_loss = pause_on_focus_loss
+        self.clock = clock
+        self.low_power = False
+        self.effects = []
+        self.frames = 0
+        self.skipped = 0
+        self.deferred = 0
+        self.achieved_fps = 0.0
+        self.frame_ms = 0.0
+        self._pause_reasons = set()
+        self._after_id = None
+        self._running = False
+        self._next_frame = None
+        self._window_start = clock()
+        self._window_frames = 0
+        self._window_cost = 0.0
+
+    @property
+    def paused(self):
+        return bool(self._pause_reasons)
+
+    @property
+    def frame_interval(self):
+        return 1.0 / (self.low_power_fps if self.low_power else self.fps)
+
+    def add(self, name, callback, interval_ms, priority=0, optional=False):
+        """Регистрация эффекта; меньший priority выполняется раньше и не переносится первым"""
+        effect = Effect(name, callback, interval_ms / 1000, priority, optional)
+        effect.due = self.clock() + effect.interval
+        self.effects.append(effect)
+        self.effects.sort(key=lambda e: e.priority)
+        return effect
+
+    def bind_window(self):
+        self.root.bind("<Unmap>", self._on_unmap, add="+")
+        self.root.bind("<Map>", self._on_map, add="+")
+        if self.pause_on_focus_loss:
+            self.root.bind("<FocusOut>", self._on_focus_out, add="+")
+            self.root.bind("<FocusIn>", self._on_focus_in, add="+")
+
+    def start(self):
+        self._running = True
+        self._schedule(0)
+
+    def stop(self):
+        self._running = False
+        self._cancel()
+
+    def pause(self, reason):
+        self._pause_reasons.add(reason)
+        self._cancel()
+
+    def resume(self, reason):
+        if reason not in self._pause_reasons:
+            return
+        self._pause_reasons.discard(reason)
+        if not self._pause_reasons and self._running:
+            # После паузы анимации продолжают с места, а не отрабатывают пропущенное время
+            now = self.clock()
+            for effect in self.effects:
+                effect.due = now
+            self._next_frame = None
+            self._window_start, self._window_frames, self._window_cost = now, 0, 0.0
+            self._schedule(0)
+
+    def set_low_power(self, enabled):
+        self.low_power = enabled
+
+    def stats(self):
+        return {
+            'fps': self.achieved_fps,
+            'frame_ms': self.frame_ms,
+            'frames': self.frames,
+            'skipped': self.skipped,
+            'deferred': self.deferred,
+            'paused': self.paused,
+            'low_power': self.low_power,
+        }
+
+    def _cancel(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _schedule(self, delay):
+        self._cancel()
+        self._after_id = self.root.after(max(1, int(delay * 1000)), self._tick)
+
+    def _tick(self):
+        self._after_id = None
+        if not self._running or self.paused:
+            return
+        now = self.clock()
+        interval = self.frame_interval
+        if self._next_frame is not None and now - self._next_frame >= interval:
+            self.skipped += int((now - self._next_frame) // interval)
+        try:
+            for effect in self.effects:
+                if now < effect.due or (effect.optional and self.low_power):
+                    continue
+                if self.clock() - now > self.budget:
+                    self.deferred += 1
+                    continue
+                steps = int((now - effect.due) // effect.interval) + 1
+                effect.due += steps * effect.interval
+                effect.callback(steps)
+        finally:
+            finished = self.clock()
+            self.frames += 1
+            self._window_frames += 1
+            self._window_cost += finished - now
+            if finished - self._window_start >= 1.0:
+                self.achieved_fps = self._window_frames / (finished - self._window_start)
+                self.frame_ms = self._window_cost / self._window_frames * 1000
+                self._window_start, self._window_frames, self._window_cost = finished, 0, 0.0
+            self._next_frame = now + interval
+            if self._running and not self.paused:
+                self._schedule(self._next_frame - finished)
+
+    def _on_unmap(self, event):
+        if event.widget is self.root:
+            self.pause('unmap')
+
+    def _on_map(self, event):
+        if event.widget is self.root:
+            self.resume('unmap')
+
+    def _on_focus_out(self, event):
+        # FocusOut приходит и при переходе фокуса между полями; проверяем после обработки события
+        self.root.after_idle(self._check_focus)
+
+    def _on_focus_in(self, event):
+        self.resume('focus')
+
+    def _check_focus(self):
+        try:
+            focused = self.root.focus_displayof()
+        except (KeyError, RuntimeError):
+            # Выпадающий список Combobox не всегда известен tkinter - фокус у приложения
+            focused = True
+        if focused is None:
+            self.pause('focus')
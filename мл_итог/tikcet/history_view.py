@@ -0,0 +1,214 @@
+"""Окно истории прогнозов с постраничной подгрузкой по ключу и фильтрами в SQL."""
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk
+
+from prediction_store import HISTORY_PAGE_SIZE, WriterError, fetch_history_page
+from stage_metrics import stage
+
+COLUMNS = [
+    "id", "Дата", "Пол", "Возраст", "Мочевина", "Креатинин",
+    "HbA1c", "Холестерин", "Триглицериды", "ЛПВП", "ЛПНП",
+    "ЛПОНП", "ИМТ", "Прогноз", "Вероятность"
+]
+
+PREDICTION_NAMES = {'N': "Низкий", 'P': "Умеренный", 'Y': "Высокий"}
+PREDICTION_FILTERS = {"ВСЕ": None, "НИЗКИЙ": 'N', "УМЕРЕННЫЙ": 'P', "ВЫСОКИЙ": 'Y'}
+GENDER_FILTERS = {"ВСЕ": None, "ЖЕНСКИЙ": "ЖЕНСКИЙ", "МУЖСКОЙ": "МУЖСКОЙ"}
+
+# Доля прокрутки, после которой подгружается следующая страница
+PREFETCH_AT = 0.9
+
+
+def format_row(record):
+    """Значения строки Treeview из строки fetch_history_page"""
+    prediction = PREDICTION_NAMES.get(record[13], "Умеренный")
+    return (*record[:13], prediction, f"{float(record[14])*100:.1f}%")
+
+
+class HistoryWindow:
+    """История прогнозов: в Treeview только загруженные страницы, следующая - при прокрутке вниз"""
+
+    def __init__(self, app):
+        self.app = app
+        self.cursor = None
+        self.exhausted = False
+        self.loaded = 0
+        self.load_scheduled = False
+        self.filters = {}
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("ИСТОРИЯ ПРОГНОЗОВ")
+        self.window.geometry("1100x650")
+        self.window.configure(bg=app.bg_color)
+
+        style = ttk.Style(self.window)
+        style.theme_use('alt')
+        style.configure("Treeview",
+                        background=app.card_bg,
+                        foreground=app.text_color,
+                        fieldbackground=app.card_bg,
+                        borderwidth=0,
+                        font=app.label_font)
+        style.configure("Treeview.Heading",
+                        background=app.neon_blue,
+                        foreground=app.bg_color,
+                        font=app.button_font)
+        style.map('Treeview', background=[('selected', app.neon_pink)])
+
+        self.create_filter_bar()
+        self.create_tree()
+
+        self.status = tk.Label(self.window, text="", font=app.label_font,
+                               bg=app.bg_color, fg=app.neon_green)
+        self.status.pack()
+
+        close_btn = tk.Button(
+            self.window,
+            text="ЗАКРЫТЬ",
+            command=self.window.destroy,
+            font=app.button_font,
+            bg=app.card_bg,
+            fg=app.neon_blue,
+            bd=0,
+            padx=20,
+            pady=10,
+            activebackground="#202030",
+            activeforeground=app.neon_pink
+        )
+        close_btn.pack(pady=10)
+
+        self.reload()
+
+    def create_filter_bar(self):
+        app = self.app
+        bar = tk.Frame(self.window, bg=app.bg_color)
+        bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+
+        def label(text):
+            tk.Label(bar, text=text, font=app.label_font,
+                     bg=app.bg_color, fg=app.text_color).pack(side="left", padx=(8, 2))
+
+        label("ПОЛ:")
+        self.gender_filter = ttk.Combobox(bar, values=list(GENDER_FILTERS), state="readonly", width=9)
+        self.gender_filter.current(0)
+        self.gender_filter.pack(side="left")
+
+        label("ПРОГНОЗ:")
+        self.class_filter = ttk.Combobox(bar, values=list(PREDICTION_FILTERS), state="readonly", width=10)
+        self.class_filter.current(0)
+        self.class_filter.pack(side="left")
+
+        label("С:")
+        self.date_from = ttk.Entry(bar, width=11)
+        self.date_from.pack(side="left")
+        label("ПО:")
+        self.date_to = ttk.Entry(bar, width=11)
+        self.date_to.pack(side="left")
+
+        label("ВЕРОЯТНОСТЬ %:")
+        self.prob_min = ttk.Entry(bar, width=5)
+        self.prob_min.pack(side="left")
+        label("-")
+        self.prob_max = ttk.Entry(bar, width=5)
+        self.prob_max.pack(side="left")
+
+        tk.Button(bar, text="ПРИМЕНИТЬ", command=self.apply_filters,
+                  font=app.label_font, bg=app.card_bg, fg=app.neon_yellow, bd=0, padx=10,
+                  activebackground="#202030", activeforeground=app.neon_pink).pack(side="left", padx=10)
+
+    def create_tree(self):
+        tree_frame = tk.Frame(self.window, bg=self.app.bg_color)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        self.scroll_y = ttk.Scrollbar(tree_frame, orient="vertical")
+        scroll_x = ttk.Scrollbar(tree_frame, orient="horizontal")
+
+        self.tree = ttk.Treeview(
+            tree_frame,
+            columns=COLUMNS,
+            show="headings",
+            yscrollcommand=self.on_scroll,
+            xscrollcommand=scroll_x.set
+        )
+
+        for col in COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=80, anchor="center")
+
+        self.tree.column("id", width=50)
+        self.tree.column("Дата", width=130)
+        self.tree.column("Пол", width=70)
+        self.tree.column("Возраст", width=60)
+        self.tree.column("Прогноз", width=80)
+
+        self.scroll_y.config(command=self.tree.yview)
+        scroll_x.config(command=self.tree.xview)
+
+        self.scroll_y.pack(side="right", fill="y")
+        scroll_x.pack(side="bottom", fill="x")
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+    def read_filters(self):
+        """Фильтры из полей ввода; ValueError при неверной дате или вероятности"""
+        filters = {
+            'gender': GENDER_FILTERS[self.gender_filter.get()],
+            'prediction': PREDICTION_FILTERS[self.class_filter.get()],
+        }
+        for key, entry in (('date_from', self.date_from), ('date_to', self.date_to)):
+            value = entry.get().strip()
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+                filters[key] = value
+        for key, entry in (('prob_min', self.prob_min), ('prob_max', self.prob_max)):
+            value = entry.get().strip()
+            if value:
+                percent = float(value)
+                if not 0 <= percent <= 100:
+                    raise ValueError(f"вероятность вне 0-100: {value}")
+                filters[key] = percent / 100
+        return filters
+
+    def apply_filters(self):
+        try:
+            self.filters = self.read_filters()
+        except ValueError:
+            self.status.config(text=">>> НЕВЕРНЫЙ ФИЛЬТР: ДАТА ГГГГ-ММ-ДД, ВЕРОЯТНОСТЬ 0-100 <<<",
+                               fg=self.app.neon_pink)
+            return
+        self.reload()
+
+    def reload(self):
+        try:
+            self.app.writer.flush(timeout=1.0)
+        except WriterError as e:
+            # История из базы все равно покажется, но о потерянных прогнозах надо сказать
+            self.app.show_glitch_error(f"ОШИБКА ЗАПИСИ: {e}")
+        self.tree.delete(*self.tree.get_children())
+        self.cursor = None
+        self.exhausted = False
+        self.loaded = 0
+        self.load_page()
+
+    def load_page(self):
+        self.load_scheduled = False
+        if self.exhausted or not self.window.winfo_exists():
+            return
+        metrics = getattr(self.app, 'metrics', None)
+        with stage(metrics, 'history.query'):
+            rows, self.cursor = fetch_history_page(self.app.conn, self.filters, self.cursor)
+        with stage(metrics, 'history.render'):
+            for record in rows:
+                self.tree.insert("", "end", values=format_row(record))
+        self.loaded += len(rows)
+        if len(rows) < HISTORY_PAGE_SIZE:
+            self.exhausted = True
+        suffix = "" if self.exhausted else " (ПРОКРУТИТЕ ДЛЯ ЗАГРУЗКИ)"
+        self.status.config(text=f">>> ЗАГРУЖЕНО ЗАПИСЕЙ: {self.loaded}{suffix} <<<", fg=self.app.neon_green)
+
+    def on_scroll(self, first, last):
+        self.scroll_y.set(first, last)
+        if not self.exhausted and not self.load_scheduled and float(last) >= PREFETCH_AT:
+            # Подгрузка после текущего события, чтобы не вставлять строки внутри отрисовки
+            self.load_scheduled = True
+            self.window.after_idle(self.load_page)
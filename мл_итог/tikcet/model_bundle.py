@@ -0,0 +1,317 @@
+"""Единый версионированный бандл модели вместо трех отдельных .pkl.
+
+Бандл - каталог версий и указатель на текущую:
+
+    diabetes_bundle/
+        CURRENT             имя каталога текущей версии
+        v<дата-время>-<pid>/
+            manifest.json   версия формата, порядок признаков, метки классов, кодировка пола,
+                            хэши обучающих данных и исходных .pkl (и их размеры и mtime),
+                            версии sklearn/numpy
+            feature.npy, threshold.npy, threshold_fused.npy, children.npy, value.npy,
+            roots.npy, depths.npy, scaler_mean.npy, scaler_scale.npy,
+            tree_order.npy  порядок деревьев для раннего выхода (необязателен, есть не у старых бандлов)
+
+Новая версия пишется в свой каталог целиком, затем CURRENT подменяется одним os.replace:
+читатель видит либо старую, либо новую версию, но не манифест одной с массивами другой.
+Предыдущая версия остается на диске для читателей, успевших прочитать старый указатель.
+Бандлы старого вида (manifest.json прямо в каталоге) тоже читаются.
+
+Бандл - производный артефакт и в репозиторий не входит: его собирает build, обучение и
+дообучение, а если его нет или он отстал от .pkl - первая загрузка load_scoring_artifacts.
+
+Массивы открываются через np.load(mmap_mode='r'), поэтому несколько процессов скоринга
+на одном хосте делят одну копию леса в page cache, а загрузка не требует sklearn и joblib.
+
+    python мл_итог/tikcet/model_bundle.py build   # собрать бандл из .pkl
+    python мл_итог/tikcet/model_bundle.py info    # показать манифест и проверить бандл
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+
+import numpy as np
+
+import scoring
+from forest_engine import CompiledForest
+
+FORMAT_VERSION = 1
+BUNDLE_DIR = os.path.join(scoring.ARTIFACT_DIR, 'diabetes_bundle')
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+TRAINING_DATA = os.path.join(scoring.ARTIFACT_DIR, 'Dataset of Diabetes .csv')
+
+FOREST_ARRAYS = ['feature', 'threshold', 'threshold_fused', 'children', 'value', 'roots', 'depths']
+SCALER_ARRAYS = ['scaler_mean', 'scaler_scale']
+OPTIONAL_ARRAYS = ['tree_order']
+KNOWN_CLASSES = {'N', 'P', 'Y'}
+
+
+class BundleError(ValueError):
+    """Бандл отсутствует, поврежден или несовместим с этим кодом"""
+
+
+class BundleScaler:
+    """Замена StandardScaler для скоринга: только mean_/scale_ и transform"""
+
+    def __init__(self, mean, scale):
+        self.mean_ = mean
+        self.scale_ = scale
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class BundleLabels:
+    """Замена LabelEncoder для декодирования классов модели"""
+
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def inverse_transform(self, codes):
+        return self.classes_.take(np.asarray(codes, dtype=np.intp))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _class_labels(model, le):
+    """Метки классов модели через кодировщик с проверкой, что это именно CLASS, а не Gender"""
+    codes = np.asarray(model.classes_)
+    if not np.array_equal(codes, np.arange(len(le.classes_))):
+        raise BundleError(f"классы модели {codes.tolist()} не соответствуют кодировщику {list(le.classes_)}")
+    labels = [str(label) for label in le.classes_]
+    unknown = {label.strip() for label in labels} - KNOWN_CLASSES
+    if unknown:
+        raise BundleError(f"кодировщик содержит не классы риска: {sorted(unknown)}")
+    return labels
+
+
+def validation_tree_order(fused, training_data):
+    """Порядок деревьев по проверочной части обучающего CSV (деление по хэшу, как при дообучении).
+
+    Для дообученной модели эти строки действительно не видел ни один лес. Модель из мл.ipynb
+    обучена на своем случайном делении, которое здесь не восстановить, поэтому для нее порядок -
+    эвристика: часть этих строк деревья видели при обучении. На классы в точном режиме раннего
+    выхода порядок не влияет, только на число обойденных деревьев.
+    """
+    from model_refresh import validation_mask
+    from training import load_dataset
+
+    X, _, _, _ = load_dataset(training_data)
+    val = validation_mask([f"csv:{i}" for i in range(len(X))])
+    return fused.order_trees(np.asarray(X, dtype=np.float64)[val])
+
+
+def version_dir(path=BUNDLE_DIR):
+    """Каталог текущей версии бандла: по указателю CURRENT, для бандла старого вида - сам path"""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), encoding='utf-8') as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return path
+    if not name or os.path.basename(name) != name:
+        raise BundleError(f"испорчен указатель версии бандла: {name!r}")
+    return os.path.join(path, name)
+
+
+def build_bundle(model, scaler, le, path=BUNDLE_DIR, training_data=TRAINING_DATA, source_dir=None):
+    """Запись новой версии бандла и атомарная подмена указателя CURRENT"""
+    import sklearn
+
+    labels = _class_labels(model, le)
+    engine = CompiledForest.from_sklearn(model)
+    fused = engine.fuse_scaler(scaler)
+    arrays = {
+        'feature': engine.feature,
+        'threshold': engine.threshold,
+        'threshold_fused': fused.threshold,
+        'children': engine.children,
+        'value': engine.value,
+        'roots': engine.roots,
+        'depths': engine.depths,
+        'scaler_mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(scaler.scale_, dtype=np.float64),
+    }
+    if training_data and os.path.exists(training_data):
+        arrays['tree_order'] = validation_tree_order(fused, training_data)
+
+    sources, source_stats = {}, {}
+    if source_dir is not None:
+        for name in (scoring.MODEL_FILE, scoring.SCALER_FILE, scoring.LABEL_ENCODER_FILE):
+            source = os.path.join(source_dir, name)
+            stat = os.stat(source)
+            sources[name] = file_sha256(source)
+            source_stats[name] = [stat.st_size, stat.st_mtime_ns]
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'features': list(scoring.FEATURES),
+        'gender_encoding': {'F': 0, 'M': 1},
+        'class_codes': np.asarray(model.classes_).tolist(),
+        'class_labels': labels,
+        'n_estimators': engine.n_estimators,
+        'n_nodes': int(len(engine.feature)),
+        'training_data_sha256': file_sha256(training_data) if training_data and os.path.exists(training_data) else None,
+        'source_sha256': sources,
+        'source_stat': source_stats,
+        'sklearn_version': sklearn.__version__,
+        'numpy_version': np.__version__,
+        'arrays': {name: {'dtype': str(a.dtype), 'shape': list(a.shape)} for name, a in arrays.items()},
+    }
+
+    version = f"v{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}"
+    target = os.path.join(path, version)
+    os.makedirs(target)
+    for name, array in arrays.items():
+        np.save(os.path.join(target, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(target, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    try:
+        previous = os.path.basename(version_dir(path))
+    except BundleError:
+        previous = None
+    pointer = os.path.join(path, CURRENT_FILE)
+    with open(f"{pointer}.tmp-{os.getpid()}", 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(f"{pointer}.tmp-{os.getpid()}", pointer)
+    _remove_old_versions(path, keep={version, previous})
+    return manifest
+
+
+def _remove_old_versions(path, keep):
+    """Удалить версии старше предыдущей и файлы бандла старого вида; занятые файлы пропускаются"""
+    for entry in os.scandir(path):
+        if entry.is_dir() and entry.name.startswith('v') and entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.is_file() and (entry.name == MANIFEST_FILE or entry.name.endswith('.npy')):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def read_manifest(path=BUNDLE_DIR):
+    try:
+        with open(os.path.join(version_dir(path), MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise BundleError(f"бандл не найден: {path}") from None
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise BundleError(f"неподдерживаемая версия бандла: {manifest.get('format_version')}")
+    if manifest.get('features') != scoring.FEATURES:
+        raise BundleError(f"порядок признаков бандла не совпадает с кодом: {manifest.get('features')}")
+    return manifest
+
+
+def is_stale(manifest, source_dir=scoring.ARTIFACT_DIR):
+    """Бандл устарел, если .pkl рядом с ним отличаются от тех, из которых он собран.
+
+    Файл с теми же размером и mtime, что при сборке, не перехэшируется; хэш сравнивается
+    только при их расхождении (копия, checkout) и для манифестов без source_stat.
+    """
+    stats = manifest.get('source_stat', {})
+    for name, digest in manifest.get('source_sha256', {}).items():
+        source = os.path.join(source_dir, name)
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            continue
+        if stats.get(name) == [stat.st_size, stat.st_mtime_ns]:
+            continue
+        if file_sha256(source) != digest:
+            return True
+    return False
+
+
+def load_bundle(path=BUNDLE_DIR, mmap=True, fused=True):
+    """(лес, scaler, labels, manifest) из бандла без sklearn; массивы отображаются в память"""
+    # Манифест и массивы - из одного каталога версии, даже если CURRENT сейчас подменят
+    path = version_dir(path)
+    manifest = read_manifest(path)
+    mode = 'r' if mmap else None
+    arrays = {}
+    names = FOREST_ARRAYS + SCALER_ARRAYS + [name for name in OPTIONAL_ARRAYS if name in manifest['arrays']]
+    for name in names:
+        array = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+        expected = manifest['arrays'][name]
+        if list(array.shape) != expected['shape'] or str(array.dtype) != expected['dtype']:
+            raise BundleError(f"массив {name} не совпадает с манифестом")
+        # Обычный ndarray поверх того же отображения: у np.memmap заметные накладные расходы на вызов
+        arrays[name] = array.view(np.ndarray)
+
+    if arrays['value'].shape[1] != len(manifest['class_labels']):
+        raise BundleError("число классов в листьях не совпадает с метками манифеста")
+
+    engine = CompiledForest(
+        arrays['feature'], arrays['threshold_fused' if fused else 'threshold'], arrays['children'],
+        arrays['value'], arrays['roots'], arrays['depths'],
+        np.asarray(manifest['class_codes']), len(manifest['features']), fused=fused,
+        tree_order=arrays.get('tree_order'),
+    )
+    scaler = BundleScaler(arrays['scaler_mean'], arrays['scaler_scale'])
+    return engine, scaler, BundleLabels(manifest['class_labels']), manifest
+
+
+def load_scoring_artifacts(model_dir=scoring.ARTIFACT_DIR):
+    """(лес со вплавленным scaler, scaler, labels) для скоринга.
+
+    Берется бандл, если он есть и собран из текущих .pkl; иначе .pkl загружаются и
+    компилируются на лету, а бандл пересобирается для следующих загрузок.
+    """
+    path = os.path.join(model_dir, os.path.basename(BUNDLE_DIR))
+    try:
+        engine, scaler, labels, manifest = load_bundle(path)
+        if not is_stale(manifest, model_dir):
+            return engine, scaler, labels
+    except BundleError:
+        pass
+    model, scaler, le = scoring.load_artifacts(model_dir)
+    try:
+        build_bundle(model, scaler, le, path, os.path.join(model_dir, os.path.basename(TRAINING_DATA)),
+                     source_dir=model_dir)
+    except (BundleError, OSError):
+        # Каталог только для чтения или модель не годится для бандла - обходимся без него
+        pass
+    return CompiledForest.from_sklearn(model).fuse_scaler(scaler), scaler, le
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сборка и проверка бандла модели")
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('--bundle', default=BUNDLE_DIR, help="каталог бандла")
+    parser.add_argument('--model-dir', default=scoring.ARTIFACT_DIR, help="каталог с исходными .pkl")
+    parser.add_argument('--training-data', default=TRAINING_DATA, help="CSV, на котором обучена модель")
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        model, scaler, le = scoring.load_artifacts(args.model_dir)
+        manifest = build_bundle(model, scaler, le, args.bundle, args.training_data, source_dir=args.model_dir)
+        print(f"бандл записан: {args.bundle} ({manifest['n_estimators']} деревьев, {manifest['n_nodes']} узлов)")
+        return 0
+
+    try:
+        engine, scaler, labels, manifest = load_bundle(args.bundle)
+    except BundleError as e:
+        print(f"ошибка: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps({k: v for k, v in manifest.items() if k != 'arrays'}, ensure_ascii=False, indent=2))
+    if is_stale(manifest, args.model_dir):
+        print("ВНИМАНИЕ: .pkl изменились после сборки бандла", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""Фоновое обновление модели: дообучение в отдельном процессе и подмена без остановки скоринга.
+
+Кандидат строится из обучающего CSV и прогнозов с подтвержденными исходами (таблица outcomes).
+Если классы совпадают с текущей моделью, лес дообучается через warm_start: к существующим
+деревьям добавляется --grow новых на объединенных данных с тем же масштабатором. Иначе, или
+когда лес дорос до max_estimators, модель обучается заново. Кандидат принимается, только если
+на отложенной части данных он не хуже текущей модели (f1_macro), и записывается в каталог
+модели (.pkl и бандл). Без размеченных исходов обновление пропускается, а кандидат, которого
+не на чем сравнить с текущей моделью, отклоняется.
+
+ModelRefresher.poll() вызывается периодически из окна или сервиса: запускает дообучение по
+расписанию и возвращает новые артефакты, когда бандл на диске сменился - в том числе если его
+обновил другой процесс.
+
+    python мл_итог/tikcet/model_refresh.py run            # одно обновление сейчас
+    python мл_итог/tikcet/model_refresh.py label 42 Y     # исход для прогноза с id 42
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import scoring
+import model_bundle
+from prediction_store import DB_PATH, connect, fetch_labelled, label_prediction, outcomes_signature
+
+STATE_FILE = 'refresh_state.json'
+GROW = 20
+MAX_ESTIMATORS = 300
+VALIDATION_SIZE = 0.2
+
+
+def read_state(model_dir):
+    try:
+        with open(os.path.join(model_dir, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(model_dir, state):
+    path = os.path.join(model_dir, STATE_FILE)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def training_data(data_path, db_path):
+    """Обучающий CSV плюс размеченные прогнозы.
+
+    Возвращает (X, y, weights, keys, подпись разметки); weights - число повторов строки CSV,
+    keys - постоянные ключи строк ('csv:<номер уникальной строки>', 'id:<id прогноза>'),
+    по ним строки делятся на обучение и проверку.
+    """
+    from training import load_dataset
+
+    X, y, weights, _ = load_dataset(data_path)
+    keys = [f"csv:{i}" for i in range(len(X))]
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        labelled = fetch_labelled(conn)
+        signature = outcomes_signature(conn)
+    finally:
+        conn.close()
+    if labelled:
+        extra = np.array([[scoring.encode_gender(row[1]), *row[2:-1]] for row in labelled], dtype=np.float32)
+        X = np.vstack([X, extra])
+        y = np.concatenate([y, [row[-1] for row in labelled]])
+        weights = np.concatenate([weights, np.ones(len(labelled), dtype=np.float32)])
+        keys.extend(f"id:{row[0]}" for row in labelled)
+    return X, y, weights, keys, signature
+
+
+def validation_mask(keys):
+    """Постоянное деление по хэшу ключа: строка не переходит из проверки в обучение при росте данных,
+    поэтому деревья, добавленные warm_start, и прежние деревья не видели проверочных строк"""
+    threshold = VALIDATION_SIZE * 2 ** 32
+    return np.array([zlib.crc32(key.encode('utf-8')) < threshold for key in keys])
+
+
+def refresh(model_dir=scoring.ARTIFACT_DIR, data_path=model_bundle.TRAINING_DATA, db_path=DB_PATH,
+            grow=GROW, max_estimators=MAX_ESTIMATORS, seed=42, tolerance=0.0, force=False):
+    """Одно обновление (выполняется в дочернем процессе); возвращает отчет для журнала"""
+    from sklearn.metrics import f1_score
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    state = read_state(model_dir)
+    X, y, weights, keys, signature = training_data(data_path, db_path)
+    if not force and (not signature[0] or state.get('outcomes') == signature):
+        return {'status': 'skipped', 'reason': "новых исходов нет"}
+
+    model_path = os.path.join(model_dir, scoring.MODEL_FILE)
+    # Модель, обученная не здесь (training.py, ноутбук), могла видеть проверочные строки CSV
+    own_model = state.get('model_sha256') == model_bundle.file_sha256(model_path)
+    model, scaler, le = scoring.load_artifacts(model_dir)
+    val = validation_mask(keys)
+    X_train, y_train, w_train = X[~val], y[~val], weights[~val]
+
+    current_labels = np.char.strip(np.asarray(le.classes_, dtype=str))
+    same_classes = (list(current_labels) == sorted(set(y))
+                    and np.array_equal(model.classes_, np.arange(len(current_labels))))
+    started = time.perf_counter()
+    if own_model and same_classes and model.n_estimators + grow <= max_estimators:
+        # Те же классы и масштабатор: к обученным деревьям добавляются grow новых
+        mode = 'warm_start'
+        candidate, candidate_scaler, candidate_le = model, scaler, le
+        candidate.set_params(warm_start=True, n_estimators=model.n_estimators + grow, n_jobs=-1)
+        codes = {label: i for i, label in enumerate(current_labels)}
+        candidate.fit(scoring.standardize(scaler, X_train), np.array([codes[label] for label in y_train]),
+                      sample_weight=w_train)
+        candidate.set_params(warm_start=False, n_jobs=None)
+    else:
+        from sklearn.ensemble import RandomForestClassifier
+        from training import NOTEBOOK_PARAMS
+
+        mode = 'refit'
+        candidate_le = LabelEncoder().fit(y)
+        candidate_scaler = StandardScaler().fit(X_train)
+        candidate = RandomForestClassifier(**NOTEBOOK_PARAMS, random_state=seed, n_jobs=-1)
+        candidate.fit(candidate_scaler.transform(X_train), candidate_le.transform(y_train),
+                      sample_weight=w_train)
+        candidate.set_params(n_jobs=None)
+    fit_seconds = time.perf_counter() - started
+
+    # Сравнение на строках, которых не видела ни одна из моделей: для своей модели - вся проверка,
+    # для чужой - только размеченные прогнозы из проверки
+    compare = val if own_model else val & np.array([key.startswith('id:') for key in keys])
+    report = {
+        'mode': mode,
+        'n_estimators': int(candidate.n_estimators),
+        'n_rows': int(len(X)),
+        'n_labelled': sum(key.startswith('id:') for key in keys),
+        'n_compared': int(compare.sum()),
+        'fit_seconds': round(fit_seconds, 3),
+    }
+    candidate_pred, _ = scoring.score_batch(candidate, candidate_scaler, candidate_le, X[val])
+    report['candidate_f1'] = float(f1_score(y[val], candidate_pred, average='macro'))
+    if compare.any():
+        # Текущая модель перечитывается: при warm_start объект model уже дообучен
+        current, current_scaler, current_le = scoring.load_artifacts(model_dir)
+        current_pred, _ = scoring.score_batch(current, current_scaler, current_le, X[compare])
+        candidate_pred, _ = scoring.score_batch(candidate, candidate_scaler, candidate_le, X[compare])
+        report['current_f1'] = float(f1_score(y[compare], current_pred, average='macro'))
+        report['compared_f1'] = float(f1_score(y[compare], candidate_pred, average='macro'))
+        accepted = report['compared_f1'] + tolerance >= report['current_f1']
+    else:
+        # Честно сравнить не на чем: чужая модель и ни одного размеченного прогноза в проверке.
+        # Непроверенный кандидат не подменяет рабочую модель
+        accepted = False
+        report['reason'] = "нет размеченных прогнозов в проверке"
+
+    if accepted:
+        from training import save_artifacts
+
+        save_artifacts(candidate, candidate_scaler, candidate_le, model_dir, data_path)
+        state['model_sha256'] = model_bundle.file_sha256(model_path)
+        report['status'] = 'promoted'
+    else:
+        report['status'] = 'rejected'
+    state.update({'outcomes': signature, 'last_refresh': time.strftime("%Y-%m-%d %H:%M:%S"), 'report': report})
+    write_state(model_dir, state)
+    return report
+
+
+class ModelRefresher:
+    """Планировщик обновлений и наблюдатель за бандлом, без собственных потоков.
+
+    poll() не блокирует: запускает дообучение в отдельном процессе, когда подошло время
+    (interval секунд, None - не дообучать, только следить за диском), забирает его отчет и
+    возвращает (model, scaler, le), если бандл в model_dir сменился с прошлой загрузки.
+    """
+
+    def __init__(self, model_dir=scoring.ARTIFACT_DIR, interval=None, db_path=DB_PATH,
+                 data_path=model_bundle.TRAINING_DATA, **refresh_options):
+        self.model_dir = model_dir
+        self.interval = interval
+        self.db_path = db_path
+        self.data_path = data_path
+        self.refresh_options = refresh_options
+        self.bundle_dir = os.path.join(model_dir, os.path.basename(model_bundle.BUNDLE_DIR))
+        self.last_report = None
+        self.swaps = 0
+        self._signature = self.bundle_signature()
+        self._next_run = time.monotonic() + interval if interval else None
+        self._job = None
+        self._pool = None
+
+    def bundle_signature(self):
+        # У каждой версии свой каталог, поэтому смена CURRENT меняет и файл манифеста
+        try:
+            stat = os.stat(os.path.join(model_bundle.version_dir(self.bundle_dir), model_bundle.MANIFEST_FILE))
+        except (FileNotFoundError, model_bundle.BundleError):
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def mark_loaded(self):
+        """Текущий бандл уже загружен вызывающим кодом - не возвращать его из poll()"""
+        self._signature = self.bundle_signature()
+
+    def poll(self):
+        if self._job is not None and self._job.done():
+            try:
+                self.last_report = self._job.result()
+            except Exception as e:
+                self.last_report = {'status': 'error', 'error': str(e)}
+            self._job = None
+            self._next_run = time.monotonic() + self.interval
+        if self._job is None and self._next_run is not None and time.monotonic() >= self._next_run:
+            if self._pool is None:
+                # spawn: дочерний процесс не наследует потоки и окно Tk родителя
+                self._pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+            self._job = self._pool.submit(refresh, self.model_dir, self.data_path, self.db_path,
+                                          **self.refresh_options)
+
+        signature = self.bundle_signature()
+        if signature is None or signature == self._signature:
+            return None
+        try:
+            artifacts = model_bundle.load_scoring_artifacts(self.model_dir)
+        except (model_bundle.BundleError, OSError):
+            # Бандл подменяется прямо сейчас - заберем на следующем опросе
+            return None
+        self._signature = signature
+        self.swaps += 1
+        return artifacts
+
+    @property
+    def running(self):
+        return self._job is not None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Дообучение модели и разметка исходов")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help="одно обновление модели")
+    run.add_argument('--model-dir', default=scoring.ARTIFACT_DIR)
+    run.add_argument('--data', default=model_bundle.TRAINING_DATA)
+    run.add_argument('--db', default=DB_PATH)
+    run.add_argument('--grow', type=int, default=GROW, help="сколько деревьев добавить при warm_start")
+    run.add_argument('--max-estimators', type=int, default=MAX_ESTIMATORS,
+                     help="после этого размера леса модель обучается заново")
+    run.add_argument('--tolerance', type=float, default=0.0, help="допустимое ухудшение f1_macro")
+    run.add_argument('--force', action='store_true', help="обновить, даже если новых исходов нет")
+    label = sub.add_parser('label', help="подтвержденный класс для прогноза")
+    label.add_argument('prediction_id', type=int)
+    label.add_argument('label', choices=['N', 'P', 'Y'])
+    label.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'label':
+        conn = connect(args.db)
+        try:
+            label_prediction(conn, args.prediction_id, args.label)
+        except ValueError as e:
+            print(f"ошибка: {e}", file=sys.stderr)
+            return 1
+        finally:
+            conn.close()
+        return 0
+
+    report = refresh(args.model_dir, args.data, args.db, args.grow, args.max_estimators,
+                     tolerance=args.tolerance, force=args.force)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report['status'] in ('promoted', 'skipped') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
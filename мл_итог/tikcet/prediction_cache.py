@@ -0,0 +1,81 @@
+"""Ограниченный LRU-кэш прогнозов по нормализованному вектору из 11 признаков."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """LRU-кэш (метка, вероятность) с TTL и счетчиками попаданий.
+
+    Ключ - кортеж признаков, округленных до decimals знаков, поэтому 4.7 и 4.70000001
+    попадают в одну запись. invalidate() сбрасывает кэш при перезагрузке модели;
+    записи, посчитанные старой моделью, отбрасываются по номеру поколения.
+    """
+
+    def __init__(self, maxsize=4096, ttl=None, decimals=4, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError("maxsize должен быть положительным")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.decimals = decimals
+        self.clock = clock
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, features):
+        return tuple(round(float(value), self.decimals) + 0.0 for value in features)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires is not None and expires <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, generation=None):
+        """Запись результата; generation - поколение, при котором начинался расчет"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            expires = self.clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Сброс всех записей, например после перезагрузки модели"""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
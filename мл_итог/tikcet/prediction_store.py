@@ -0,0 +1,441 @@
+"""База прогнозов: схема таблицы predictions, отложенная запись с групповыми коммитами и WAL.
+
+Модуль не тянет numpy/sklearn, поэтому окно может открыть базу до загрузки модели.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DB_PATH = os.path.join(PROJECT_DIR, 'diabetes_predictions.db')
+
+DB_COLUMNS = ['gender', 'age', 'urea', 'cr', 'hba1c', 'chol', 'tg', 'hdl', 'ldl', 'vldl', 'bmi']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    gender TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    urea REAL NOT NULL,
+    cr REAL NOT NULL,
+    hba1c REAL NOT NULL,
+    chol REAL NOT NULL,
+    tg REAL NOT NULL,
+    hdl REAL NOT NULL,
+    ldl REAL NOT NULL,
+    vldl REAL NOT NULL,
+    bmi REAL NOT NULL,
+    prediction TEXT NOT NULL,
+    probability REAL NOT NULL,
+    explanation TEXT
+)
+'''
+
+# Страницы истории выбираются по ключу (timestamp, id), фильтр по классу - по своему индексу
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS idx_predictions_class ON predictions (prediction, timestamp, id)",
+]
+
+# Сводка по дням и классам для аналитики; триггеры держат ее в актуальном состоянии при любой
+# записи в predictions (окно, сервис, пакетный скоринг), поэтому панели читают O(дней), а не O(строк)
+HIGH_PROBABILITY = 0.9
+
+SUMMARY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS prediction_daily (
+    day TEXT NOT NULL,
+    prediction TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    hba1c_sum REAL NOT NULL,
+    bmi_sum REAL NOT NULL,
+    high_probability INTEGER NOT NULL,
+    PRIMARY KEY (day, prediction)
+) WITHOUT ROWID
+'''
+
+SUMMARY_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS predictions_summary_insert AFTER INSERT ON predictions
+    BEGIN
+        INSERT INTO prediction_daily (day, prediction, n, hba1c_sum, bmi_sum, high_probability)
+        VALUES (substr(NEW.timestamp, 1, 10), NEW.prediction, 1, NEW.hba1c, NEW.bmi,
+                NEW.probability >= {HIGH_PROBABILITY})
+        ON CONFLICT (day, prediction) DO UPDATE SET
+            n = n + 1,
+            hba1c_sum = hba1c_sum + excluded.hba1c_sum,
+            bmi_sum = bmi_sum + excluded.bmi_sum,
+            high_probability = high_probability + excluded.high_probability;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS predictions_summary_delete AFTER DELETE ON predictions
+    BEGIN
+        UPDATE prediction_daily SET
+            n = n - 1,
+            hba1c_sum = hba1c_sum - OLD.hba1c,
+            bmi_sum = bmi_sum - OLD.bmi,
+            high_probability = high_probability - (OLD.probability >= {HIGH_PROBABILITY})
+        WHERE day = substr(OLD.timestamp, 1, 10) AND prediction = OLD.prediction;
+        DELETE FROM prediction_daily
+        WHERE day = substr(OLD.timestamp, 1, 10) AND prediction = OLD.prediction AND n <= 0;
+    END
+    ''',
+]
+
+SUMMARY_REBUILD_SQL = f'''
+INSERT INTO prediction_daily (day, prediction, n, hba1c_sum, bmi_sum, high_probability)
+SELECT substr(timestamp, 1, 10), prediction, COUNT(*), SUM(hba1c), SUM(bmi),
+       SUM(probability >= {HIGH_PROBABILITY})
+FROM predictions
+GROUP BY substr(timestamp, 1, 10), prediction
+'''
+
+# Подтвержденные исходы (настоящий класс) для прогнозов; на них дообучается модель
+OUTCOMES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outcomes (
+    prediction_id INTEGER PRIMARY KEY REFERENCES predictions (id),
+    label TEXT NOT NULL,
+    labelled_at TEXT NOT NULL
+)
+'''
+
+INSERT_SQL = '''
+INSERT INTO predictions (
+    timestamp, gender, age, urea, cr, hba1c, chol, tg, hdl, ldl, vldl, bmi, prediction, probability, explanation
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+_STOP = object()
+# Шаг ожидания в flush()/submit(): между шагами проверяем, жив ли поток писателя
+_WAIT_STEP = 0.1
+
+HISTORY_PAGE_SIZE = 200
+HISTORY_COLUMNS = ['id', 'timestamp'] + DB_COLUMNS + ['prediction', 'probability']
+
+
+def create_schema(conn):
+    """Таблицы, индексы и триггеры сводки одной транзакцией с блокировкой записи.
+
+    Между созданием триггеров и проверкой пустой сводки другой процесс не может вставить
+    строку: иначе она попала бы в сводку и триггером, и пересчетом, а пересчет бы не случился.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    conn.execute(SCHEMA)
+    # Базы, созданные до появления объяснений: колонка вкладов признаков (JSON) добавляется на месте
+    if 'explanation' not in {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}:
+        conn.execute("ALTER TABLE predictions ADD COLUMN explanation TEXT")
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.execute(SUMMARY_SCHEMA)
+    conn.execute(OUTCOMES_SCHEMA)
+    for statement in SUMMARY_TRIGGERS:
+        conn.execute(statement)
+    # База, созданная до появления сводки: один полный проход, дальше только триггеры
+    if (conn.execute("SELECT 1 FROM prediction_daily LIMIT 1").fetchone() is None
+            and conn.execute("SELECT 1 FROM predictions LIMIT 1").fetchone() is not None):
+        conn.execute(SUMMARY_REBUILD_SQL)
+    conn.commit()
+
+
+def rebuild_summary(conn):
+    """Пересчет prediction_daily полным проходом по predictions"""
+    conn.execute("DELETE FROM prediction_daily")
+    conn.execute(SUMMARY_REBUILD_SQL)
+    conn.commit()
+
+
+def insert_predictions(conn, rows):
+    """Запись пачки прогнозов одной транзакцией"""
+    conn.executemany(INSERT_SQL, rows)
+    conn.commit()
+
+
+def connect(db_path=DB_PATH, synchronous='NORMAL'):
+    """Соединение с базой прогнозов в режиме WAL.
+
+    В WAL читатели (история) не блокируют писателя, а synchronous=NORMAL делает fsync
+    только на контрольных точках, а не на каждом коммите.
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    create_schema(conn)
+    return conn
+
+
+def history_filters(filters):
+    """WHERE-условия и параметры для фильтров истории.
+
+    filters: gender ('МУЖСКОЙ'/'ЖЕНСКИЙ'), prediction ('N'/'P'/'Y'),
+    date_from/date_to ('ГГГГ-ММ-ДД', обе границы включительно), prob_min/prob_max (0..1).
+    """
+    clauses, params = [], []
+    if filters.get('gender'):
+        clauses.append("gender = ?")
+        params.append(filters['gender'])
+    if filters.get('prediction'):
+        clauses.append("prediction = ?")
+        params.append(filters['prediction'])
+    if filters.get('date_from'):
+        clauses.append("timestamp >= ?")
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        clauses.append("timestamp < date(?, '+1 day')")
+        params.append(filters['date_to'])
+    if filters.get('prob_min') is not None:
+        clauses.append("probability >= ?")
+        params.append(filters['prob_min'])
+    if filters.get('prob_max') is not None:
+        clauses.append("probability <= ?")
+        params.append(filters['prob_max'])
+    return clauses, params
+
+
+def fetch_history_page(conn, filters=None, after=None, limit=HISTORY_PAGE_SIZE):
+    """Страница истории от новых к старым, начиная строго после курсора (timestamp, id).
+
+    Выборка идет по индексу, поэтому стоимость страницы не зависит от размера таблицы.
+    Возвращает строки и курсор для следующей страницы.
+    """
+    clauses, params = history_filters(filters or {})
+    if after is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(after)
+    sql = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM predictions"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    rows = conn.execute(sql, params + [limit]).fetchall()
+    cursor = (rows[-1][1], rows[-1][0]) if rows else after
+    return rows, cursor
+
+
+def label_prediction(conn, prediction_id, label):
+    """Запись подтвержденного класса ('N'/'P'/'Y') для прогноза; повторная запись заменяет исход"""
+    label = str(label).strip().upper()
+    if label not in ('N', 'P', 'Y'):
+        raise ValueError(f"неизвестный класс: {label!r}")
+    if conn.execute("SELECT 1 FROM predictions WHERE id = ?", (prediction_id,)).fetchone() is None:
+        raise ValueError(f"нет прогноза с id {prediction_id}")
+    conn.execute(
+        "INSERT INTO outcomes (prediction_id, label, labelled_at) VALUES (?, ?, datetime('now', 'localtime')) "
+        "ON CONFLICT (prediction_id) DO UPDATE SET label = excluded.label, labelled_at = excluded.labelled_at",
+        (prediction_id, label))
+    conn.commit()
+
+
+def fetch_labelled(conn):
+    """Признаки прогнозов с подтвержденными исходами: [(id, DB_COLUMNS..., label)] по id"""
+    columns = ', '.join(f"p.{name}" for name in DB_COLUMNS)
+    return conn.execute(
+        f"SELECT p.id, {columns}, o.label FROM outcomes o JOIN predictions p ON p.id = o.prediction_id "
+        f"ORDER BY p.id").fetchall()
+
+
+def outcomes_signature(conn):
+    """(число исходов, последнее время разметки) - меняется при любой новой разметке"""
+    return list(conn.execute("SELECT COUNT(*), MAX(labelled_at) FROM outcomes").fetchone())
+
+
+def summary_filters(date_from=None, date_to=None):
+    clauses, params = [], []
+    if date_from:
+        clauses.append("day >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("day <= ?")
+        params.append(date_to)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def fetch_daily_summary(conn, date_from=None, date_to=None):
+    """[(день, класс, число прогнозов, из них с вероятностью >= HIGH_PROBABILITY)] по возрастанию дня"""
+    where, params = summary_filters(date_from, date_to)
+    return conn.execute(
+        f"SELECT day, prediction, n, high_probability FROM prediction_daily{where} ORDER BY day, prediction",
+        params).fetchall()
+
+
+def fetch_class_summary(conn, date_from=None, date_to=None):
+    """{класс: count, mean_hba1c, mean_bmi, high_probability_share} за период"""
+    where, params = summary_filters(date_from, date_to)
+    rows = conn.execute(
+        f"SELECT prediction, SUM(n), SUM(hba1c_sum), SUM(bmi_sum), SUM(high_probability) "
+        f"FROM prediction_daily{where} GROUP BY prediction ORDER BY prediction", params).fetchall()
+    return {
+        prediction: {
+            'count': n,
+            'mean_hba1c': hba1c / n,
+            'mean_bmi': bmi / n,
+            'high_probability_share': high / n,
+        }
+        for prediction, n, hba1c, bmi, high in rows if n
+    }
+
+
+class WriterError(RuntimeError):
+    """Поток писателя упал; lost - сколько принятых строк так и не попало в базу"""
+
+    def __init__(self, message, lost=0):
+        super().__init__(message)
+        self.lost = lost
+
+
+class PredictionWriter:
+    """Фоновый писатель таблицы predictions.
+
+    submit() кладет строки в ограниченную очередь и сразу возвращается (при переполнении
+    ждет - это обратное давление на скоринг). Поток писателя копит строки и пишет их
+    одной транзакцией, когда набралось batch_size строк или прошло flush_interval секунд.
+    close() дописывает все, что осталось в очереди. С metrics (StageMetrics) длительность
+    каждого коммита записывается как этап 'db.commit'.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=500, flush_interval=0.5,
+                 max_queue=10000, synchronous='NORMAL', metrics=None):
+        self.db_path = db_path
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.written = 0
+        self.commits = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows):
+        """Постановка строк (кортежей для INSERT_SQL) в очередь записи.
+
+        Если поток писателя упал, поднимает WriterError (причина в __cause__).
+        """
+        self._check()
+        if self._closed:
+            raise RuntimeError("писатель прогнозов уже закрыт")
+        rows = list(rows)
+        if rows:
+            self._put(rows)
+
+    def flush(self, timeout=None):
+        """Ожидание, пока все поставленные до вызова строки будут закоммичены.
+
+        False - не дождались за timeout. Если поток писателя упал (до вызова или во время
+        ожидания), поднимает WriterError - без timeout вызов не повиснет навсегда.
+        """
+        self._check()
+        if self._closed:
+            return True
+        done = threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._put(done, deadline):
+            return False
+        while not done.is_set():
+            step = _WAIT_STEP if deadline is None else min(_WAIT_STEP, deadline - time.monotonic())
+            if step <= 0:
+                return False
+            if not done.wait(step) and not self._thread.is_alive():
+                break
+        self._check()
+        return True
+
+    def close(self):
+        if self._closed:
+            self._check()
+            return
+        self._closed = True
+        self._put(_STOP)
+        self._thread.join()
+        self._check()
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'commits': self.commits,
+            'queued': self._queue.qsize(),
+        }
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def _put(self, item, deadline=None):
+        """put() в очередь, который не ждет места вечно, если поток писателя уже мертв"""
+        while True:
+            try:
+                self._queue.put(item, timeout=_WAIT_STEP)
+                return True
+            except queue.Full:
+                self._check()
+                if not self._thread.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+                    return False
+
+    def _commit(self, conn, pending):
+        if pending:
+            started = time.perf_counter()
+            try:
+                conn.executemany(INSERT_SQL, pending)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if self.metrics is not None:
+                self.metrics.record('db.commit', time.perf_counter() - started)
+            self.written += len(pending)
+            self.commits += 1
+
+    def _run(self):
+        conn = None
+        pending = []
+        deadline = None
+        try:
+            conn = connect(self.db_path, self.synchronous)
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if isinstance(item, list):
+                    pending.extend(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    if len(pending) < self.batch_size:
+                        continue
+
+                self._commit(conn, pending)
+                pending = []
+                deadline = None
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is _STOP:
+                    break
+        except Exception as e:
+            # Строки неудавшейся транзакции и все, что еще в очереди, в базу уже не попадут
+            lost = len(pending)
+            waiters = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, list):
+                    lost += len(item)
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+            error = WriterError(f"запись прогнозов остановлена: {e}; не записано строк: {lost}", lost)
+            error.__cause__ = e
+            self.error = error
+            self._closed = True
+            # Ошибку выставляем до пробуждения - ждущие flush() сразу ее увидят
+            for item in waiters:
+                item.set()
+        finally:
+            if conn is not None:
+                conn.close()
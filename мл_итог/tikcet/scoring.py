@@ -0,0 +1,174 @@
+"""Ядро скоринга без tkinter: признаки, артефакты модели и векторный скоринг."""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from stage_metrics import stage
+
+ARTIFACT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILE = 'diabetes_model.pkl'
+SCALER_FILE = 'scaler.pkl'
+LABEL_ENCODER_FILE = 'label_encoder.pkl'
+
+# Порядок признаков, на котором обучались scaler и модель в мл.ipynb
+FEATURES = ['Gender', 'AGE', 'Urea', 'Cr', 'HbA1c', 'Chol', 'TG', 'HDL', 'LDL', 'VLDL', 'BMI']
+
+# Сколько главных вкладов признаков показывать на карточке и хранить с прогнозом
+EXPLAIN_TOP = 3
+
+GENDER_CODES = {
+    'M': 1, 'МУЖСКОЙ': 1, '1': 1,
+    'F': 0, 'ЖЕНСКИЙ': 0, '0': 0,
+}
+
+
+def load_artifacts(model_dir=ARTIFACT_DIR):
+    """Загрузка модели, масштабатора и кодировщика меток"""
+    # joblib (и sklearn при распаковке) нужны только здесь; скоринг по бандлу обходится без них
+    import joblib
+
+    model = joblib.load(os.path.join(model_dir, MODEL_FILE))
+    scaler = joblib.load(os.path.join(model_dir, SCALER_FILE))
+    le = joblib.load(os.path.join(model_dir, LABEL_ENCODER_FILE))
+    return model, scaler, le
+
+
+def encode_gender(value):
+    """Кодирование пола так же, как в форме: мужской = 1, женский = 0"""
+    code = GENDER_CODES.get(str(value).strip().upper())
+    if code is None:
+        raise ValueError(f"неизвестный пол: {value!r}")
+    return code
+
+
+def gender_label(code):
+    return "МУЖСКОЙ" if code == 1 else "ЖЕНСКИЙ"
+
+
+def standardize(scaler, X):
+    """То же, что scaler.transform, для массива признаков в порядке FEATURES.
+
+    scaler из мл.ipynb обучен на DataFrame, и transform предупреждает на каждый ndarray;
+    формула та же, что в StandardScaler.transform, результат совпадает до бита.
+    """
+    return (np.asarray(X, dtype=np.float64) - scaler.mean_) / scaler.scale_
+
+
+def _score(model, scaler, le, X, metrics=None):
+    if not getattr(model, 'fused', False):
+        with stage(metrics, 'score.transform'):
+            X = standardize(scaler, X)
+    with stage(metrics, 'score.forest'):
+        proba = model.predict_proba(X)
+    with stage(metrics, 'score.decode'):
+        best = proba.argmax(axis=1)
+        labels = le.inverse_transform(model.classes_.take(best))
+        # В обучающем CSV встречаются метки с пробелом ('N ', 'Y ')
+        labels = np.char.strip(labels.astype(str))
+    return labels, proba[np.arange(len(best)), best]
+
+
+def score_batch(model, scaler, le, X, cache=None, metrics=None):
+    """Векторный скоринг: один transform и один predict_proba на весь блок строк.
+
+    model - RandomForestClassifier или CompiledForest (одинаковый интерфейс predict_proba/classes_);
+    у леса со вплавленным масштабатором (fused) scaler.transform пропускается.
+    С cache (PredictionCache) через лес идут только строки, которых нет в кэше.
+    metrics (StageMetrics) получает длительности этапов transform/forest/decode.
+    Возвращает метки классов ('N', 'P', 'Y') и вероятность предсказанного класса.
+    """
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+    if cache is None:
+        return _score(model, scaler, le, X, metrics)
+
+    generation = cache.generation
+    labels = [None] * len(X)
+    probabilities = np.empty(len(X), dtype=np.float64)
+    # Ключи, которых нет в кэше, -> строки блока с ними; повторы внутри блока скорим один раз
+    missing = {}
+    with stage(metrics, 'score.cache'):
+        for i, row in enumerate(X.tolist()):
+            key = cache.key(row)
+            if key in missing:
+                missing[key].append(i)
+                continue
+            hit = cache.get(key)
+            if hit is None:
+                missing[key] = [i]
+            else:
+                labels[i], probabilities[i] = hit
+    if missing:
+        first_rows = [rows[0] for rows in missing.values()]
+        scored_labels, scored_probabilities = _score(model, scaler, le, X[first_rows], metrics)
+        for (key, rows), label, probability in zip(
+                missing.items(), scored_labels.tolist(), scored_probabilities.tolist()):
+            cache.put(key, (label, probability), generation)
+            for i in rows:
+                labels[i], probabilities[i] = label, probability
+    return np.array(labels, dtype=str), probabilities
+
+
+def score_batch_early(model, scaler, le, X, confidence=None, metrics=None):
+    """Скоринг с ранним выходом (CompiledForest.predict_early): метки, доля голосов лидера
+    и число использованных деревьев для каждой строки.
+
+    Без confidence метки совпадают с score_batch; вероятность - доля голосов по использованным
+    деревьям, а не по всему лесу. RandomForestClassifier компилируется на лету.
+    """
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+    if not hasattr(model, 'predict_early'):
+        from forest_engine import CompiledForest
+        model = CompiledForest.from_sklearn(model)
+    if not getattr(model, 'fused', False):
+        with stage(metrics, 'score.transform'):
+            X = standardize(scaler, X)
+    with stage(metrics, 'score.forest'):
+        codes, share, used = model.predict_early(X, confidence)
+    with stage(metrics, 'score.decode'):
+        labels = np.char.strip(le.inverse_transform(codes).astype(str))
+    return labels, share, used
+
+
+def explain_batch(model, scaler, X, top=EXPLAIN_TOP, metrics=None):
+    """Главные вклады признаков в вероятность предсказанного класса для каждой строки.
+
+    Вклады - разложение по путям в деревьях (CompiledForest.contributions); возвращает
+    [[(признак, вклад), ...], ...] по убыванию модуля вклада. RandomForestClassifier
+    компилируется на лету, поэтому для частых вызовов нужен CompiledForest (бандл).
+    """
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+    with stage(metrics, 'score.explain'):
+        if not hasattr(model, 'contributions'):
+            from forest_engine import CompiledForest
+            model = CompiledForest.from_sklearn(model)
+        if not getattr(model, 'fused', False):
+            X = standardize(scaler, X)
+        bias, contrib = model.contributions(X)
+        best = (bias + contrib.sum(axis=1)).argmax(axis=1)
+        chosen = contrib[np.arange(len(X)), :, best]
+        order = np.argsort(-np.abs(chosen), axis=1, kind='stable')[:, :top]
+        return [[(FEATURES[i], float(row[i])) for i in indices]
+                for row, indices in zip(chosen.tolist(), order.tolist())]
+
+
+def explanation_json(explanation):
+    """Вклады для колонки predictions.explanation: {"HbA1c": 0.3121, ...} в порядке важности"""
+    if explanation is None:
+        return None
+    return json.dumps({name: round(value, 4) for name, value in explanation})
+
+
+def prediction_rows(X, labels, probabilities, timestamp=None, explanations=None):
+    """Строки для prediction_store.INSERT_SQL из матрицы признаков и результатов скоринга"""
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    if explanations is None:
+        explanations = [None] * len(labels)
+    rows = []
+    for features, label, probability, explanation in zip(np.asarray(X).tolist(), labels, probabilities,
+                                                         explanations):
+        rows.append((timestamp, gender_label(features[0]), *features[1:], str(label), float(probability),
+                     explanation_json(explanation)))
+    return rows
@@ -0,0 +1,470 @@
+"""Локальный HTTP/JSON-сервис скоринга на asyncio с микробатчингом.
+
+Параллельные запросы складываются в одну очередь; сборщик берет из нее строки, пока
+не наберется max_batch строк или не пройдет max_wait с первой строки, и скорит весь блок
+одним вызовом score_batch в рабочем потоке. Результаты пишутся в таблицу predictions
+через общий PredictionWriter. Обновленный бандл модели (model_refresh.py, --auto-refresh)
+подменяется в потоке скоринга между блоками.
+
+    python мл_итог/tikcet/scoring_service.py --port 8765
+
+    GET  /health    процесс жив (200)
+    GET  /ready     модель загружена (200) или еще нет (503)
+    GET  /stats     счетчики батчера, кэша и писателя
+    GET  /drift     дрейф входных признаков относительно обучающей выборки (drift_monitor.py)
+    POST /predict   {"patients": [{"Gender": "M", "AGE": 50, "Urea": 4.7, ...}, ...]}
+                    или один пациент объектом; признаки можно передать списком из 11 чисел
+"""
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import scoring
+from prediction_cache import PredictionCache
+from prediction_store import DB_PATH, PredictionWriter
+
+MAX_BODY = 1 << 20
+MAX_QUEUE = 10000
+REFRESH_POLL = 2.0
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class RequestError(ValueError):
+    """Ошибка в теле запроса, возвращается клиенту как 400"""
+
+
+def parse_patient(item):
+    """Строка признаков в порядке scoring.FEATURES из объекта или списка"""
+    if isinstance(item, dict):
+        positions = {str(name).lower(): value for name, value in item.items()}
+        missing = [f for f in scoring.FEATURES if f.lower() not in positions]
+        if missing:
+            raise RequestError(f"нет признаков: {', '.join(missing)}")
+        values = [positions[f.lower()] for f in scoring.FEATURES]
+    elif isinstance(item, list):
+        if len(item) != len(scoring.FEATURES):
+            raise RequestError(f"ожидается {len(scoring.FEATURES)} признаков, получено {len(item)}")
+        values = item
+    else:
+        raise RequestError("пациент должен быть объектом или списком признаков")
+    try:
+        row = [float(scoring.encode_gender(values[0]))]
+        row.extend(float(value) for value in values[1:])
+    except (TypeError, ValueError) as e:
+        raise RequestError(str(e)) from None
+    if not all(np.isfinite(row)):
+        raise RequestError("признаки должны быть конечными числами")
+    return row
+
+
+def parse_request(body):
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise RequestError("тело запроса не является JSON") from None
+    if isinstance(payload, dict) and 'patients' in payload:
+        patients = payload['patients']
+        if not isinstance(patients, list) or not patients:
+            raise RequestError("patients должен быть непустым списком")
+    else:
+        patients = [payload]
+    return np.array([parse_patient(item) for item in patients], dtype=np.float64)
+
+
+class MicroBatcher:
+    """Сборка строк из параллельных запросов в блоки для одного векторного вызова.
+
+    score(X) возвращает кортеж массивов по строкам блока (None - нет массива); каждый запрос
+    получает свои срезы. score выполняется в отдельном потоке, поэтому цикл событий принимает
+    запросы, пока считается предыдущий блок, - следующий блок копится за это время.
+    """
+
+    def __init__(self, score, max_batch=256, max_wait=0.002, max_queue=MAX_QUEUE):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batches = 0
+        self.rows = 0
+        self.largest = 0
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Дожидается обработки всего, что уже в очереди"""
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown(wait=True)
+
+    def submit(self, X):
+        """Future с (метки, вероятности) для строк X; QueueFull при переполнении очереди"""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((X, future))
+        return future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch:
+            if self.queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self.queue.get_nowait()
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            try:
+                X = np.concatenate([X for X, _ in batch])
+                results = await loop.run_in_executor(self.executor, self.score, X)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self.batches += 1
+                self.rows += len(X)
+                self.largest = max(self.largest, len(X))
+                start = 0
+                for part, future in batch:
+                    end = start + len(part)
+                    if not future.done():
+                        future.set_result(tuple(None if result is None else result[start:end]
+                                                for result in results))
+                    start = end
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch': self.rows / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest,
+            'queued': self.queue.qsize(),
+        }
+
+
+class ScoringService:
+    """Сервис скоринга: загрузка модели, микробатчер, HTTP-обработчики"""
+
+    def __init__(self, model_dir=scoring.ARTIFACT_DIR, db_path=DB_PATH,
+                 max_batch=256, max_wait=0.002, cache_size=4096, auto_refresh=None, explain=False):
+        self.model_dir = model_dir
+        # Вклады признаков (scoring.explain_batch) в ответе и в таблице predictions
+        self.explain = explain
+        self.db_path = db_path
+        # Минуты между фоновыми дообучениями; None - только подхватывать бандл, обновленный извне
+        self.auto_refresh = auto_refresh
+        self.refresher = None
+        self._refresh_task = None
+        # Монитор дрейфа: история predictions плюс все строки, прошедшие через score
+        self.drift = None
+        # (model, scaler, le) одним кортежем: блок скорится целиком одной версией модели
+        self.artifacts = None
+        self.load_error = None
+        self.started = time.monotonic()
+        self.requests = 0
+        self.cache = PredictionCache(cache_size) if cache_size else None
+        self.writer = PredictionWriter(db_path, batch_size=max(max_batch, 500)) if db_path else None
+        self.batcher = MicroBatcher(self.score, max_batch, max_wait)
+
+    @property
+    def ready(self):
+        return self.artifacts is not None
+
+    def load_model(self):
+        """Выполняется в потоке скоринга; бандл, если он актуален, иначе .pkl"""
+        import model_bundle
+
+        try:
+            self.artifacts = model_bundle.load_scoring_artifacts(self.model_dir)
+        except Exception as e:
+            # Сервис остается живым, /ready сообщает причину
+            self.load_error = e
+            return
+        if self.cache is not None:
+            self.cache.invalidate()
+        self.open_drift()
+
+    def open_drift(self):
+        """Выполняется в потоке скоринга; без монитора (нет CSV, ошибка базы) сервис работает как прежде"""
+        import drift_monitor
+
+        scaler = self.artifacts[1]
+        try:
+            if self.db_path:
+                self.drift = drift_monitor.open_history(scaler, self.db_path)
+            else:
+                self.drift = drift_monitor.DriftMonitor(scaler)
+        except Exception as e:
+            print(f"монитор дрейфа недоступен: {e}", file=sys.stderr)
+            self.drift = None
+
+    def refresh_model(self):
+        """Выполняется в потоке скоринга между блоками: подмена модели, если бандл обновился"""
+        if self.refresher is None:
+            import model_refresh
+
+            interval = self.auto_refresh * 60 if self.auto_refresh else None
+            self.refresher = model_refresh.ModelRefresher(self.model_dir, interval, self.db_path or DB_PATH)
+        artifacts = self.refresher.poll()
+        if artifacts is None:
+            return
+        self.artifacts = artifacts
+        self.load_error = None
+        if self.cache is not None:
+            self.cache.invalidate()
+        if self.drift is None or not self.drift.matches(artifacts[1]):
+            # Новый scaler - новый эталон; строки этого сервиса уже в predictions (или не пишутся)
+            self.open_drift()
+
+    async def watch_model(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(REFRESH_POLL)
+            try:
+                await loop.run_in_executor(self.batcher.executor, self.refresh_model)
+            except Exception as e:
+                print(f"ошибка обновления модели: {e}", file=sys.stderr)
+
+    def score(self, X):
+        model, scaler, le = self.artifacts
+        labels, probabilities = scoring.score_batch(model, scaler, le, X, self.cache)
+        explanations = scoring.explain_batch(model, scaler, X) if self.explain else None
+        if self.drift is not None:
+            self.drift.update(X)
+        if self.writer is not None:
+            self.writer.submit(scoring.prediction_rows(X, labels, probabilities, explanations=explanations))
+        return labels, probabilities, explanations
+
+    async def start(self):
+        self.batcher.start()
+        # Загрузка в том же потоке, что и скоринг, - первый блок гарантированно увидит модель
+        asyncio.get_running_loop().run_in_executor(self.batcher.executor, self.load_model)
+        self._refresh_task = asyncio.get_running_loop().create_task(self.watch_model())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        await self.batcher.stop()
+        if self.refresher is not None:
+            self.refresher.close()
+        if self.writer is not None:
+            self.writer.close()
+
+    async def predict(self, body):
+        if not self.ready:
+            return 503, {'error': "модель еще не загружена"}
+        try:
+            X = parse_request(body)
+        except RequestError as e:
+            return 400, {'error': str(e)}
+        try:
+            future = self.batcher.submit(X)
+        except asyncio.QueueFull:
+            return 503, {'error': "сервис перегружен"}
+        labels, probabilities, explanations = await future
+        predictions = [
+            {'class': label, 'probability': round(probability, 6)}
+            for label, probability in zip(labels.tolist(), probabilities.tolist())
+        ]
+        if explanations is not None:
+            for prediction, explanation in zip(predictions, explanations):
+                prediction['factors'] = {name: round(value, 6) for name, value in explanation}
+        return 200, {'predictions': predictions}
+
+    async def drift_report(self):
+        if self.drift is None:
+            return 503, {'error': "монитор дрейфа недоступен"}
+        # Состояние монитора меняет поток скоринга - отчет собирается там же, между блоками
+        loop = asyncio.get_running_loop()
+        return 200, await loop.run_in_executor(self.batcher.executor, self.drift.report)
+
+    def stats(self):
+        return {
+            'uptime': round(time.monotonic() - self.started, 3),
+            'ready': self.ready,
+            'requests': self.requests,
+            'batcher': self.batcher.stats(),
+            'cache': self.cache.stats() if self.cache is not None else None,
+            'writer': self.writer.stats() if self.writer is not None else None,
+            'model_swaps': self.refresher.swaps if self.refresher is not None else 0,
+            'last_refresh': self.refresher.last_report if self.refresher is not None else None,
+        }
+
+    async def dispatch(self, method, path, body):
+        routes = {
+            '/health': ('GET', lambda: (200, {'status': "ok"})),
+            '/ready': ('GET', self.readiness),
+            '/stats': ('GET', lambda: (200, self.stats())),
+        }
+        if path == '/predict':
+            if method != 'POST':
+                return 405, {'error': "ожидается POST"}
+            return await self.predict(body)
+        if path == '/drift':
+            if method != 'GET':
+                return 405, {'error': "ожидается GET"}
+            return await self.drift_report()
+        if path not in routes:
+            return 404, {'error': f"нет такого пути: {path}"}
+        expected, handler = routes[path]
+        if method != expected:
+            return 405, {'error': f"ожидается {expected}"}
+        return handler()
+
+    def readiness(self):
+        if self.ready:
+            return 200, {'status': "ready"}
+        if self.load_error is not None:
+            return 503, {'status': "error", 'error': str(self.load_error)}
+        return 503, {'status': "loading"}
+
+    async def handle_connection(self, reader, writer):
+        """HTTP/1.1 с keep-alive: клиент может слать запросы один за другим по одному соединению"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': "слишком большой запрос"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                self.requests += 1
+                try:
+                    status, payload = await self.dispatch(method, target.split('?', 1)[0], body)
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(args):
+    service = ScoringService(
+        model_dir=args.model_dir,
+        db_path=None if args.no_db else args.db,
+        max_batch=args.max_batch,
+        max_wait=args.max_wait_ms / 1000,
+        cache_size=args.cache_size,
+        auto_refresh=args.auto_refresh,
+        explain=args.explain,
+    )
+    await service.start()
+    server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C через KeyboardInterrupt
+            pass
+
+    print(f"сервис скоринга: http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+        stats = service.batcher.stats()
+        print(f"блоков: {stats['batches']}, строк: {stats['rows']}, средний блок: {stats['mean_batch']:.1f}",
+              file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-сервис скоринга риска диабета")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=256, help="максимум строк в одном блоке скоринга")
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help="сколько ждать добора блока после первой строки, мс")
+    parser.add_argument('--cache-size', type=int, default=4096, help="размер LRU-кэша прогнозов (0 - без кэша)")
+    parser.add_argument('--db', default=DB_PATH, help="SQLite-база для таблицы predictions")
+    parser.add_argument('--no-db', action='store_true', help="не записывать прогнозы в базу")
+    parser.add_argument('--model-dir', default=scoring.ARTIFACT_DIR, help="каталог с бандлом или .pkl")
+    parser.add_argument('--auto-refresh', type=float, metavar='MINUTES',
+                        help="дообучать модель в фоне каждые MINUTES минут и подменять без остановки")
+    parser.add_argument('--explain', action='store_true',
+                        help="возвращать и сохранять главные вклады признаков для каждого прогноза")
+    args = parser.parse_args(argv)
+    if args.max_batch < 1:
+        parser.error("--max-batch должен быть положительным")
+    if args.max_wait_ms < 0:
+        parser.error("--max-wait-ms не может быть отрицательным")
+    return args
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(serve(parse_args())))
+    except KeyboardInterrupt:
+        sys.exit(0)
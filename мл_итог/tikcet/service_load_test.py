@@ -0,0 +1,126 @@
+"""Нагрузочный клиент для scoring_service.py.
+
+Открывает --concurrency соединений keep-alive, каждое шлет запросы с одним пациентом
+подряд; строки берутся из обучающего CSV. Печатает пропускную способность, задержки
+и средний размер блока на сервере.
+
+    python мл_итог/tikcet/scoring_service.py --no-db &
+    python мл_итог/tikcet/service_load_test.py --requests 20000 --concurrency 64
+
+Для сравнения с поштучным скорингом сервис запускается с --max-batch 1.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+
+import numpy as np
+
+import scoring
+from model_bundle import TRAINING_DATA
+
+
+def load_patients(path, limit=None):
+    patients = []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        for record in reader:
+            positions = {name.strip().lower(): value for name, value in record.items()}
+            patient = {feature: positions[feature.lower()].strip() for feature in scoring.FEATURES}
+            try:
+                scoring.encode_gender(patient['Gender'])
+            except ValueError:
+                continue
+            patient = {name: value if name == 'Gender' else float(value) for name, value in patient.items()}
+            patients.append(patient)
+            if limit and len(patients) >= limit:
+                break
+    return patients
+
+
+async def request(reader, writer, host, method, path, body=b''):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def worker(host, port, bodies, counter, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while counter[0] > 0:
+            counter[0] -= 1
+            body = bodies[counter[0] % len(bodies)]
+            started = time.perf_counter()
+            status, _ = await request(reader, writer, host, 'POST', '/predict', body)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    patients = load_patients(args.data)
+    bodies = [json.dumps(p).encode('utf-8') for p in patients]
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    deadline = time.monotonic() + args.ready_timeout
+    while True:
+        status, payload = await request(reader, writer, args.host, 'GET', '/ready')
+        if status == 200:
+            break
+        if time.monotonic() > deadline:
+            print(f"сервис не готов: {payload}", file=sys.stderr)
+            return 1
+        await asyncio.sleep(0.1)
+    _, before = await request(reader, writer, args.host, 'GET', '/stats')
+
+    counter = [args.requests]
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        worker(args.host, args.port, bodies, counter, latencies, errors) for _ in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    _, after = await request(reader, writer, args.host, 'GET', '/stats')
+    writer.close()
+
+    batches = after['batcher']['batches'] - before['batcher']['batches']
+    rows = after['batcher']['rows'] - before['batcher']['rows']
+    latencies = np.array(latencies) * 1000
+    print(f"запросов: {len(latencies)}, ошибок: {len(errors)}, {elapsed:.2f} с "
+          f"({len(latencies) / elapsed:.0f} запросов/с)")
+    print(f"задержка, мс: p50 {np.percentile(latencies, 50):.2f}, p99 {np.percentile(latencies, 99):.2f}, "
+          f"max {latencies.max():.2f}")
+    print(f"блоков на сервере: {batches}, средний блок: {rows / batches if batches else 0:.1f} строк")
+    return 1 if errors else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест сервиса скоринга")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--data', default=TRAINING_DATA, help="CSV, из которого берутся пациенты")
+    parser.add_argument('--ready-timeout', type=float, default=30.0, help="сколько ждать /ready, секунды")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,280 @@
+"""Поиск похожих известных случаев: обучающий набор и история прогнозов в пространстве scaler.
+
+Точки (признаки после стандартизации scaler) хранятся на диске в каталоге
+.cache/similar-v2-<хэш scaler, CSV и пути базы> сырыми файлами float32 и только
+дописываются: сначала уникальные строки обучающего CSV, затем прогнозы из predictions
+по возрастанию id.
+Если база пересоздана (MAX(id) меньше последнего учтенного), индекс строится заново.
+При открытии файлы отображаются в память, а cKDTree читается из tree.pkl рядом с ними
+(построение - около 0.4 с на миллион строк - нужно только без сохраненного дерева).
+Новые прогнозы (sync) дописываются в файлы и попадают в небольшой хвост, который
+просматривается перебором; когда хвост вырастает, дерево перестраивается и сохраняется.
+
+Все методы вызываются из одного потока (в окне - поток скоринга): индекс держит свое
+соединение с базой.
+
+    python мл_итог/tikcet/similar_cases.py --k 5 M 50 4.7 46 4.9 4.2 0.9 2.4 1.4 0.5 24
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+import scoring
+import model_bundle
+from prediction_store import DB_COLUMNS, DB_PATH, connect
+
+CACHE_DIR = os.path.join(scoring.ARTIFACT_DIR, '.cache')
+K = 5
+SYNC_CHUNK = 50000
+# Хвост без дерева: перестройка, когда он больше max(MIN_TAIL, строк в дереве / TAIL_RATIO)
+MIN_TAIL = 2048
+TAIL_RATIO = 32
+LABEL_DTYPE = np.dtype('S1')
+
+
+def space_digest(scaler, data_digest):
+    """Ключ пространства: другой scaler (переобученная модель) или другой CSV - другой индекс"""
+    h = hashlib.sha256()
+    h.update(np.asarray(scaler.mean_, dtype=np.float64).tobytes())
+    h.update(np.asarray(scaler.scale_, dtype=np.float64).tobytes())
+    h.update(data_digest.encode('ascii'))
+    return h.hexdigest()
+
+
+class SimilarCases:
+    """Индекс ближайших соседей с дозаписью.
+
+    refs - ссылка на случай: -(ID из CSV + 1) для обучающего набора (training.dataset_ids),
+    id прогноза для истории. labels - класс из CSV или предсказанный класс.
+    """
+
+    def __init__(self, scaler, db_path=DB_PATH, data_path=model_bundle.TRAINING_DATA, cache_dir=CACHE_DIR):
+        self.mean = np.asarray(scaler.mean_, dtype=np.float64)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)
+        self.db_path = db_path
+        self.data_path = data_path
+        self.data_digest = model_bundle.file_sha256(data_path)
+        self.digest = space_digest(scaler, self.data_digest)
+        # История своя у каждой базы - каталог индекса тоже
+        directory_digest = hashlib.sha256(self.digest.encode('ascii'))
+        directory_digest.update(os.path.realpath(db_path).encode('utf-8'))
+        self.directory = os.path.join(cache_dir, f"similar-v2-{directory_digest.hexdigest()[:16]}")
+        self.rows = 0
+        self.last_id = 0
+        self.tree = None
+        self.tree_rows = 0
+        self._conn = None
+        self._files = {}
+
+    def matches(self, scaler):
+        return space_digest(scaler, self.data_digest) == self.digest
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open(self):
+        """Открытие сохраненного индекса или построение с нуля; затем догоняет predictions"""
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self._path('meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = {'rows': 0, 'last_id': 0}
+        self.rows, self.last_id = meta['rows'], meta['last_id']
+        self._conn = connect(self.db_path)
+        if self.last_id and (self._conn.execute("SELECT MAX(id) FROM predictions").fetchone()[0] or 0) < self.last_id:
+            # База пересоздана: id начались заново, сохраненные строки истории к ней не относятся
+            self.rows, self.last_id = 0, 0
+        for name in ('points', 'refs', 'labels'):
+            path = self._path(f"{name}.bin")
+            f = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+            # Дописанное после последнего сохранения meta.json не подтверждено - отрезаем
+            f.truncate(self.rows * self._row_bytes(name))
+            f.seek(0, os.SEEK_END)
+            self._files[name] = f
+        if self.rows == 0:
+            from training import dataset_ids, load_dataset
+
+            # Дерево от прежнего содержимого каталога к новым файлам не относится
+            if os.path.exists(self._path('tree.pkl')):
+                os.remove(self._path('tree.pkl'))
+            X, y, _, _ = load_dataset(self.data_path)
+            self._append(X, -(dataset_ids(self.data_path) + 1), np.asarray(y))
+        self._load_tree()
+        self.sync()
+        if self.tree is None or self._tail_too_long():
+            self._rebuild()
+        return self
+
+    def _row_bytes(self, name):
+        return {'points': 4 * len(self.mean), 'refs': 8, 'labels': 1}[name]
+
+    def _append(self, X, refs, labels):
+        points = ((np.asarray(X, dtype=np.float64) - self.mean) / self.scale).astype(np.float32)
+        points.tofile(self._files['points'])
+        np.asarray(refs, dtype=np.int64).tofile(self._files['refs'])
+        np.char.encode(np.asarray(labels, dtype=str), 'ascii').astype(LABEL_DTYPE).tofile(self._files['labels'])
+        self.rows += len(points)
+        for f in self._files.values():
+            f.flush()
+        self._save_meta()
+
+    def _save_meta(self):
+        tmp = self._path('meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'rows': self.rows, 'last_id': self.last_id, 'data_sha256': self.data_digest,
+                       'mean': self.mean.tolist(), 'scale': self.scale.tolist()}, f)
+        os.replace(tmp, self._path('meta.json'))
+
+    def _map(self, name, dtype, shape):
+        if self.rows == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._path(f"{name}.bin"), dtype=dtype, mode='r', shape=shape)
+
+    def _arrays(self):
+        return (self._map('points', np.float32, (self.rows, len(self.mean))),
+                self._map('refs', np.int64, (self.rows,)),
+                self._map('labels', LABEL_DTYPE, (self.rows,)))
+
+    def _rebuild(self):
+        from scipy.spatial import cKDTree
+
+        self.points, self.refs, self.labels = self._arrays()
+        self.tree = cKDTree(self.points, leafsize=32, balanced_tree=False, compact_nodes=False)
+        self.tree_rows = self.rows
+        tmp = self._path('tree.pkl.tmp')
+        with open(tmp, 'wb') as f:
+            pickle.dump({'rows': self.tree_rows, 'tree': self.tree}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path('tree.pkl'))
+
+    def _load_tree(self):
+        """Сохраненное дерево по первым tree_rows точкам; файлы только дописываются, поэтому
+        дерево годится, пока эти строки подтверждены meta.json. Иначе дерево останется None"""
+        try:
+            with open(self._path('tree.pkl'), 'rb') as f:
+                saved = pickle.load(f)
+        except FileNotFoundError:
+            return
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError, ValueError):
+            # Поврежденный файл или другая версия scipy - дерево будет построено заново
+            return
+        if not isinstance(saved, dict) or not 0 < saved.get('rows', 0) <= self.rows or saved['tree'].n != saved['rows']:
+            return
+        self.points, self.refs, self.labels = self._arrays()
+        self.tree, self.tree_rows = saved['tree'], saved['rows']
+
+    def sync(self):
+        """Дозапись прогнозов с id больше последнего учтенного; возвращает число новых строк"""
+        columns = ', '.join(DB_COLUMNS)
+        cursor = self._conn.execute(
+            f"SELECT id, {columns}, prediction FROM predictions WHERE id > ? ORDER BY id", (self.last_id,))
+        added = 0
+        while True:
+            rows = cursor.fetchmany(SYNC_CHUNK)
+            if not rows:
+                break
+            X = np.array([[scoring.encode_gender(row[1]), *row[2:-1]] for row in rows], dtype=np.float64)
+            self.last_id = rows[-1][0]
+            self._append(X, [row[0] for row in rows], [row[-1] for row in rows])
+            added += len(rows)
+        if added and self.tree is not None:
+            self.points, self.refs, self.labels = self._arrays()
+            if self._tail_too_long():
+                self._rebuild()
+        return added
+
+    def _tail_too_long(self):
+        return self.rows - self.tree_rows > max(MIN_TAIL, self.tree_rows // TAIL_RATIO)
+
+    def query(self, X, k=K):
+        """k ближайших случаев для каждой строки сырых признаков X.
+
+        Возвращает [[{'source': 'csv'|'history', 'id', 'label', 'confirmed', 'distance'}, ...], ...];
+        для истории label - подтвержденный исход из outcomes, если он есть, иначе прогноз.
+        """
+        Z = (np.asarray(X, dtype=np.float64).reshape(-1, len(self.mean)) - self.mean) / self.scale
+        k = min(k, self.rows)
+        if k == 0:
+            return [[] for _ in range(len(Z))]
+        k_tree = min(k, self.tree_rows)
+        distances, indices = self.tree.query(Z, k=k_tree)
+        distances, indices = distances.reshape(len(Z), k_tree), indices.reshape(len(Z), k_tree)
+        if self.rows > self.tree_rows:
+            # Хвост, еще не попавший в дерево, - перебором: |z - t|^2 = |z|^2 + |t|^2 - 2 z.t
+            tail = np.asarray(self.points[self.tree_rows:], dtype=np.float64)
+            squared = (Z ** 2).sum(axis=1)[:, None] + (tail ** 2).sum(axis=1)[None, :] - 2 * Z @ tail.T
+            tail_distances = np.sqrt(np.maximum(squared, 0.0))
+            distances = np.hstack([distances, tail_distances])
+            indices = np.hstack([indices, np.arange(self.tree_rows, self.rows)[None, :].repeat(len(Z), axis=0)])
+            order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+
+        refs = self.refs.take(indices)
+        history_ids = sorted({int(ref) for ref in refs.ravel() if ref > 0})
+        confirmed = {}
+        if history_ids:
+            marks = ', '.join('?' * len(history_ids))
+            confirmed = dict(self._conn.execute(
+                f"SELECT prediction_id, label FROM outcomes WHERE prediction_id IN ({marks})", history_ids))
+        result = []
+        for row_refs, row_indices, row_distances in zip(refs.tolist(), indices.tolist(), distances.tolist()):
+            cases = []
+            for ref, index, distance in zip(row_refs, row_indices, row_distances):
+                label = self.labels[index].decode('ascii')
+                cases.append({
+                    'source': 'csv' if ref < 0 else 'history',
+                    'id': -ref - 1 if ref < 0 else ref,
+                    'label': confirmed.get(ref, label),
+                    'confirmed': ref < 0 or ref in confirmed,
+                    'distance': distance,
+                })
+            result.append(cases)
+        return result
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Похожие случаи из обучающего набора и истории прогнозов")
+    parser.add_argument('features', nargs=len(scoring.FEATURES), metavar='X',
+                        help="пол (M/F) и анализы в порядке " + ", ".join(scoring.FEATURES[1:]))
+    parser.add_argument('--k', type=int, default=K)
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--model-dir', default=scoring.ARTIFACT_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        row = [scoring.encode_gender(args.features[0]), *(float(v) for v in args.features[1:])]
+    except ValueError as e:
+        parser.error(str(e))
+    _, scaler, _ = model_bundle.load_scoring_artifacts(args.model_dir)
+    started = time.perf_counter()
+    index = SimilarCases(scaler, args.db).open()
+    opened = time.perf_counter() - started
+    started = time.perf_counter()
+    cases = index.query([row], args.k)[0]
+    elapsed = time.perf_counter() - started
+    index.close()
+    for case in cases:
+        source = "CSV" if case['source'] == 'csv' else "история"
+        mark = "" if case['confirmed'] else " (прогноз)"
+        print(f"{case['distance']:8.3f}  {source:<8} #{case['id']:<8} {case['label']}{mark}")
+    print(f"строк в индексе: {index.rows}, открытие {opened:.2f} с, поиск {elapsed * 1000:.2f} мс", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
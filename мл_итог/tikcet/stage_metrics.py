@@ -0,0 +1,121 @@
+"""Легкие замеры длительности этапов с окном последних значений и журналом JSON-lines."""
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Границы корзин гистограммы, мс: логарифмическая шкала от 0.01 мс до 10 с
+BUCKETS_MS = [0.01 * 10 ** (i / 4) for i in range(25)]
+SPARK = " ▁▂▃▄▅▆▇█"
+
+
+class StageMetrics:
+    """Длительности этапов по именам ('score.forest', 'db.commit', ...).
+
+    Для каждого этапа хранится окно из window последних значений, по нему считаются
+    перцентили и гистограмма. Запись потокобезопасна: этапы меряются и в окне, и в рабочих
+    потоках. С log_path каждое значение дописывается строкой JSON для разбора потом.
+    """
+
+    def __init__(self, window=500, log_path=None):
+        self.window = window
+        self.log_path = log_path
+        self._samples = {}
+        self._totals = {}
+        self._lock = threading.Lock()
+        self._log = open(log_path, 'a', encoding='utf-8') if log_path else None
+
+    def record(self, stage, seconds):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+                self._totals[stage] = 0
+            samples.append(seconds)
+            self._totals[stage] += 1
+            if self._log is not None:
+                self._log.write(json.dumps({'ts': round(time.time(), 3), 'stage': stage,
+                                            'ms': round(seconds * 1000, 4)}) + "\n")
+
+    def stage(self, name):
+        """Контекстный менеджер, записывающий длительность блока как этап name"""
+        return _Timer(self, name)
+
+    def stages(self):
+        with self._lock:
+            return list(self._samples)
+
+    def summary(self):
+        """{этап: count, p50, p95, p99, max} в мс по окну последних значений"""
+        with self._lock:
+            snapshot = {stage: (sorted(samples), self._totals[stage]) for stage, samples in self._samples.items()}
+        result = {}
+        for stage, (values, total) in snapshot.items():
+            result[stage] = {
+                'count': total,
+                'p50': _percentile(values, 50) * 1000,
+                'p95': _percentile(values, 95) * 1000,
+                'p99': _percentile(values, 99) * 1000,
+                'max': values[-1] * 1000,
+            }
+        return result
+
+    def histogram(self, stage):
+        """Число значений окна в корзинах BUCKETS_MS (последняя - все, что дольше)"""
+        with self._lock:
+            values = list(self._samples.get(stage, ()))
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for seconds in values:
+            counts[bisect.bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+        return counts
+
+    def sparkline(self, stage):
+        """Гистограмма этапа строкой символов, от быстрых корзин к медленным"""
+        counts = self.histogram(stage)
+        used = [i for i, count in enumerate(counts) if count]
+        if not used:
+            return ""
+        counts = counts[used[0]:used[-1] + 1]
+        peak = max(counts)
+        return "".join(SPARK[-(-count * (len(SPARK) - 1) // peak)] for count in counts)
+
+    def flush(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def stage(metrics, name):
+    """metrics.stage(name) или пустой контекст, если замеры не включены"""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
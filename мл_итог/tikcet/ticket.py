@@ -1,31 +1,63 @@
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, font
-import joblib
-import numpy as np
 import webbrowser
 import random
-from PIL import Image, ImageTk
-import sqlite3
-from datetime import datetime
+import math
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# numpy, joblib, sklearn и PIL здесь не импортируются: модель грузится в фоновом потоке
+# (load_model), поэтому окно с формой появляется до того, как они будут готовы
+from prediction_cache import PredictionCache
+from prediction_store import DB_PATH, PredictionWriter, connect
+from history_view import HistoryWindow
+from analytics_view import CLASS_NAMES, AnalyticsWindow
+from worklist_view import WorklistWindow
+from frame_scheduler import FrameScheduler
+from canvas_effects import GlitchPool, render_grid
+from stage_metrics import StageMetrics
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+POLL_INTERVAL_MS = 30
+REFRESH_POLL_MS = 2000
+MAX_PENDING_PREDICTIONS = 8
+
+# Цвета пульсации на полный оборот фазы с шагом 0.05: тик берет цвет из таблицы, а не считает синус
+PULSE_STEP = 0.05
+PULSE_COLORS = [
+    "#{0:02x}{0:02x}{0:02x}".format(int((0.5 + 0.5 * abs(math.sin(i * PULSE_STEP)) * 255)))
+    for i in range(round(2 * math.pi / PULSE_STEP))
+]
 
 class CyberDiabetesApp:
-    def __init__(self, root):
+    def __init__(self, root, profile_startup=False, low_power=False, metrics_log=None, auto_refresh=None):
         self.root = root
+        self.profile_startup = profile_startup
+        # Минуты между фоновыми дообучениями; None - только подхватывать модель, обновленную извне
+        self.auto_refresh = auto_refresh
+        self.refresher = None
+        self.refresh_future = None
+        # Индекс похожих случаев; открывается и используется только в потоке скоринга
+        self.similar = None
+        # Монитор дрейфа входных данных (drift_monitor.py); как и индекс - только в потоке скоринга
+        self.drift = None
+        # Длительности этапов анализа, записи и истории; с metrics_log еще и в файл JSON-lines
+        self.metrics = StageMetrics(log_path=metrics_log)
+        self.startup_timings = {'imports': time.perf_counter() - STARTED}
+        self.model_ready = False
         self.root.title("КИБЕР-ДИАГНОСТ 3000")
         self.root.geometry("900x700")
         self.root.resizable(False, False)
         
         self.init_db()
         
-        try:
-            self.warning_img = ImageTk.PhotoImage(Image.open("warning.png").resize((100, 100)))
-            self.scan_img = ImageTk.PhotoImage(Image.open("scan.png").resize((150, 150)))
-            self.history_img = ImageTk.PhotoImage(Image.open("history.png").resize((30, 30)))
-        except:
-            self.warning_img = None
-            self.scan_img = None
-            self.history_img = None
+        self.load_images()
 
         self.root.configure(bg="#0a0a12", bd=0, highlightthickness=0)
         
@@ -41,19 +73,13 @@ class CyberDiabetesApp:
         self.glitch_offset = 2
         self.scan_pos = 0
         self.pulse_phase = 0
-        self.active_glitches = []
-        
-        try:
-            model_path = os.path.join('мл_итог', 'diabetes_model.pkl')
-            scaler_path = os.path.join('мл_итог', 'scaler.pkl')
-            le_path = os.path.join('мл_итог', 'label_encoder.pkl')
-            
-            self.model = joblib.load(model_path)
-            self.scaler = joblib.load(scaler_path)
-            self.le = joblib.load(le_path)
-        except Exception as e:
-            self.show_glitch_error(f"ОШИБКА ЗАГРУЗКИ: {str(e)}")
-            return
+        self.prediction_cache = PredictionCache(maxsize=1024, ttl=3600)
+        self.pending_predictions = deque()
+        self.discarded_predictions = set()
+
+        # Единственный рабочий поток: сначала загрузка модели, затем анализы по очереди
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self.model_future = self.executor.submit(self.load_model)
 
         self.style = ttk.Style()
         self.style.theme_use('alt')
@@ -80,7 +106,16 @@ class CyberDiabetesApp:
         self.create_grid_lines()
         
         self.scan_line = self.canvas.create_line(0, 0, 900, 0, fill=self.neon_blue, width=2)
-        self.animate_scan_line()
+        self.glitches = GlitchPool(self.canvas, bg=self.bg_color)
+
+        # Все анимации - от одного тика; пауза при сворачивании и потере фокуса
+        self.scheduler = FrameScheduler(self.root)
+        self.scheduler.add('scan', self.animate_scan_line, 50)
+        self.scheduler.add('pulse', self.animate_pulse, 100, priority=1)
+        self.scheduler.add('glitch', self.random_glitch, 3000, priority=2, optional=True)
+        self.scheduler.add('fps', self.update_fps_label, 1000, priority=3)
+        self.scheduler.add('metrics', self.update_metrics_panel, 1000, priority=3)
+        self.scheduler.set_low_power(low_power)
 
         self.scrollable_frame.bind(
             "<Configure>", 
@@ -100,64 +135,182 @@ class CyberDiabetesApp:
 
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
         
-        self.animate_pulse()
-        self.random_glitch()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.show_splash()
+        self.startup_timings['build_ui'] = time.perf_counter() - STARTED
+        self.root.after_idle(self.mark_first_frame)
+        self.root.after(POLL_INTERVAL_MS, self.poll_model)
+
+        self.low_power_var.set(low_power)
+        self.scheduler.bind_window()
+        self.scheduler.start()
+
+    def load_images(self):
+        """Иконки из каталога приложения; PIL импортируется, только если они есть"""
+        self.warning_img = None
+        self.scan_img = None
+        self.history_img = None
+        paths = [os.path.join(ASSET_DIR, name) for name in ("warning.png", "scan.png", "history.png")]
+        if not any(os.path.exists(path) for path in paths):
+            return
+        try:
+            from PIL import Image, ImageTk
+            self.warning_img = ImageTk.PhotoImage(Image.open(paths[0]).resize((100, 100)))
+            self.scan_img = ImageTk.PhotoImage(Image.open(paths[1]).resize((150, 150)))
+            self.history_img = ImageTk.PhotoImage(Image.open(paths[2]).resize((30, 30)))
+        except Exception:
+            self.warning_img = None
+            self.scan_img = None
+            self.history_img = None
+
+    def load_model(self):
+        """Выполняется в рабочем потоке: тяжелые импорты и загрузка бандла (или .pkl) модели"""
+        timings = {}
+        started = time.perf_counter()
+        import model_bundle
+        timings['import_ml'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        model, scaler, le = model_bundle.load_scoring_artifacts()
+        timings['load_model'] = time.perf_counter() - started
+        return model, scaler, le, timings
+
+    def poll_model(self):
+        if not self.model_future.done():
+            self.root.after(POLL_INTERVAL_MS, self.poll_model)
+            return
+        self.splash.destroy()
+        try:
+            self.model, self.scaler, self.le, timings = self.model_future.result()
+        except Exception as e:
+            self.connection_status.config(text=">>> ОШИБКА ЗАГРУЗКИ МОДЕЛИ <<<", fg=self.neon_pink)
+            self.predict_btn.config(text="МОДЕЛЬ НЕДОСТУПНА")
+            self.show_glitch_error(f"ОШИБКА ЗАГРУЗКИ: {str(e)}")
+            return
+        self.prediction_cache.invalidate()
+        self.model_ready = True
+        self.predict_btn.config(text="АНАЛИЗИРОВАТЬ")
+        self.connection_status.config(text=">>> СИСТЕМА ГОТОВА К АНАЛИЗУ <<<", fg=self.neon_green)
+        self.update_queue_state()
+
+        self.startup_timings.update(timings)
+        self.metrics.record('model.import', timings['import_ml'])
+        self.metrics.record('model.load', timings['load_model'])
+        self.startup_timings['model_ready'] = time.perf_counter() - STARTED
+        if self.profile_startup:
+            self.report_startup()
+            self.on_close()
+            return
+
+        import model_refresh
+        interval = self.auto_refresh * 60 if self.auto_refresh else None
+        self.refresher = model_refresh.ModelRefresher(interval=interval, db_path=DB_PATH)
+        self.root.after(REFRESH_POLL_MS, self.poll_refresh)
+        self.executor.submit(self.open_similar)
+        self.executor.submit(self.open_drift)
+
+    def open_similar(self):
+        """Выполняется в рабочем потоке: индекс похожих случаев в пространстве текущего scaler"""
+        from similar_cases import SimilarCases
+
+        try:
+            with self.metrics.stage('similar.open'):
+                self.similar = SimilarCases(self.scaler, DB_PATH).open()
+        except Exception:
+            # Без индекса (нет scipy, поврежден кэш) анализ работает, просто без похожих случаев
+            self.similar = None
+
+    def open_drift(self):
+        """Выполняется в рабочем потоке: монитор по истории predictions, дальше его пополняет анализ"""
+        import drift_monitor
+
+        try:
+            with self.metrics.stage('drift.open'):
+                self.drift = drift_monitor.open_history(self.scaler, DB_PATH)
+        except Exception:
+            self.drift = None
+
+    def close_similar(self):
+        if self.similar is not None:
+            self.similar.close()
+            self.similar = None
+
+    def refresh_model(self):
+        """Выполняется в рабочем потоке между анализами: подмена модели, если бандл обновился.
+
+        Модель читают только задачи этого же потока, поэтому анализ видит либо старую,
+        либо новую тройку (model, scaler, le) целиком, и ни один запрос не теряется.
+        """
+        started = time.perf_counter()
+        artifacts = self.refresher.poll()
+        if artifacts is None:
+            return False
+        self.model, self.scaler, self.le = artifacts
+        self.prediction_cache.invalidate()
+        if self.similar is not None and not self.similar.matches(self.scaler):
+            self.close_similar()
+            self.open_similar()
+        if self.drift is not None and not self.drift.matches(self.scaler):
+            self.open_drift()
+        self.metrics.record('model.swap', time.perf_counter() - started)
+        return True
+
+    def poll_refresh(self):
+        if self.refresh_future is not None and self.refresh_future.done():
+            try:
+                swapped = self.refresh_future.result()
+            except Exception as e:
+                swapped = False
+                self.show_glitch_error(f"ОШИБКА ОБНОВЛЕНИЯ МОДЕЛИ: {str(e)}")
+            if swapped and not self.pending_predictions:
+                self.connection_status.config(
+                    text=f">>> МОДЕЛЬ ОБНОВЛЕНА ({self.refresher.swaps}) <<<", fg=self.neon_green)
+            self.refresh_future = None
+        if self.refresh_future is None:
+            self.refresh_future = self.executor.submit(self.refresh_model)
+        self.root.after(REFRESH_POLL_MS, self.poll_refresh)
+
+    def show_splash(self):
+        """Заставка поверх формы, пока модель загружается в фоне"""
+        self.splash = tk.Label(self.root, text=">>> ИНИЦИАЛИЗАЦИЯ НЕЙРОМОДУЛЯ... <<<",
+                               font=self.button_font, bg=self.card_bg, fg=self.neon_yellow,
+                               padx=20, pady=10, highlightthickness=1,
+                               highlightbackground=self.neon_yellow)
+        self.splash.place(relx=0.5, rely=0.5, anchor="center")
+        self.predict_btn.config(text="ЗАГРУЗКА МОДЕЛИ...", state=tk.DISABLED)
+        self.connection_status.config(text=">>> ЗАГРУЗКА МОДЕЛИ... <<<", fg=self.neon_yellow)
+
+    def mark_first_frame(self):
+        self.startup_timings.setdefault('first_frame', time.perf_counter() - STARTED)
+
+    def report_startup(self):
+        """Отчет --profile-startup: время от старта процесса и длительности фоновых этапов"""
+        print("профиль запуска (с):")
+        for name in ('imports', 'build_ui', 'first_frame', 'model_ready'):
+            if name in self.startup_timings:
+                print(f"  {name:<16} +{self.startup_timings[name]:.3f} от старта")
+        for name in ('import_ml', 'load_model'):
+            if name in self.startup_timings:
+                print(f"  {name:<16} {self.startup_timings[name]:.3f} в фоновом потоке")
 
     def create_grid_lines(self):
         """Create cyberpunk grid background"""
-        for i in range(0, 900, 20):
-            self.canvas.create_line(i, 0, i, 900, fill="#102030", width=1, tags="grid")
-        for i in range(0, 900, 20):
-            self.canvas.create_line(0, i, 900, i, fill="#102030", width=1, tags="grid")
-            
-        for _ in range(30):
-            x = random.randint(0, 900)
-            y = random.randint(0, 900)
-            size = random.randint(1, 3)
-            self.canvas.create_oval(x, y, x+size, y+size, fill=self.neon_blue, tags="grid")
+        # Одна картинка вместо 90 линий и 30 точек: холст с формой прокручивается заметно легче
+        self.grid_image = render_grid(self.root, star_color=self.neon_blue, bg=self.bg_color)
+        self.canvas.create_image(0, 0, image=self.grid_image, anchor="nw", tags="grid")
 
     def init_db(self):
         """Инициализация базы данных SQLite"""
-        self.conn = sqlite3.connect('diabetes_predictions.db')
+        self.conn = connect(DB_PATH)
         self.cursor = self.conn.cursor()
-        
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS predictions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            gender TEXT NOT NULL,
-            age INTEGER NOT NULL,
-            urea REAL NOT NULL,
-            cr REAL NOT NULL,
-            hba1c REAL NOT NULL,
-            chol REAL NOT NULL,
-            tg REAL NOT NULL,
-            hdl REAL NOT NULL,
-            ldl REAL NOT NULL,
-            vldl REAL NOT NULL,
-            bmi REAL NOT NULL,
-            prediction TEXT NOT NULL,
-            probability REAL NOT NULL
-        )
-        ''')
-        self.conn.commit()
+        self.writer = PredictionWriter(DB_PATH, metrics=self.metrics)
 
-    def save_prediction(self, input_data, prediction, probability):
-        """Сохранение прогноза в базу данных"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        gender = "МУЖСКОЙ" if input_data[0][0] == 1 else "ЖЕНСКИЙ"
-        
-        self.cursor.execute('''
-        INSERT INTO predictions (
-            timestamp, gender, age, urea, cr, hba1c, chol, tg, hdl, ldl, vldl, bmi, prediction, probability
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            timestamp, gender, input_data[0][1], input_data[0][2], input_data[0][3], 
-            input_data[0][4], input_data[0][5], input_data[0][6], input_data[0][7], 
-            input_data[0][8], input_data[0][9], input_data[0][10], 
-            prediction, probability
-        ))
-        self.conn.commit()
+    def save_prediction(self, input_data, prediction, probability, explanation=None):
+        """Сохранение прогноза и вкладов признаков в базу данных (через очередь фонового писателя)"""
+        import scoring
+
+        self.writer.submit(scoring.prediction_rows(input_data, [prediction], [probability],
+                                                   explanations=[explanation]))
 
     def create_history_button(self):
         """Создание кнопки для просмотра истории"""
@@ -175,123 +328,92 @@ class CyberDiabetesApp:
         )
         self.history_btn.place(x=20, y=20, width=100 if not self.history_img else 40, height=40)
 
-    def show_history(self):
-        """Отображение истории прогнозов"""
-        history_window = tk.Toplevel(self.root)
-        history_window.title("ИСТОРИЯ ПРОГНОЗОВ")
-        history_window.geometry("1000x600")
-        history_window.configure(bg=self.bg_color)
-        
-        style = ttk.Style(history_window)
-        style.theme_use('alt')
-        style.configure("Treeview", 
-                       background=self.card_bg, 
-                       foreground=self.text_color,
-                       fieldbackground=self.card_bg,
-                       borderwidth=0,
-                       font=self.label_font)
-        style.configure("Treeview.Heading", 
-                       background=self.neon_blue, 
-                       foreground=self.bg_color,
-                       font=self.button_font)
-        style.map('Treeview', background=[('selected', self.neon_pink)])
-        
-        self.cursor.execute("SELECT * FROM predictions ORDER BY timestamp DESC")
-        records = self.cursor.fetchall()
-        
-        tree_frame = tk.Frame(history_window, bg=self.bg_color)
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
-        
-        scroll_y = ttk.Scrollbar(tree_frame, orient="vertical")
-        scroll_x = ttk.Scrollbar(tree_frame, orient="horizontal")
-        
-        columns = [
-            "id", "Дата", "Пол", "Возраст", "Мочевина", "Креатинин", 
-            "HbA1c", "Холестерин", "Триглицериды", "ЛПВП", "ЛПНП", 
-            "ЛПОНП", "ИМТ", "Прогноз"
-        ]
-        
-        tree = ttk.Treeview(
-            tree_frame, 
-            columns=columns,
-            show="headings",
-            yscrollcommand=scroll_y.set,
-            xscrollcommand=scroll_x.set
+        self.analytics_btn = tk.Button(
+            self.root,
+            text="АНАЛИТИКА",
+            command=self.show_analytics,
+            font=self.label_font,
+            bg=self.card_bg,
+            fg=self.neon_green,
+            bd=0,
+            activebackground="#202030",
+            activeforeground=self.neon_pink
         )
-        
-        for col in columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=80, anchor="center")
-        
-        tree.column("id", width=40)
-        tree.column("Дата", width=120)
-        tree.column("Пол", width=60)
-        tree.column("Возраст", width=60)
-        tree.column("Прогноз", width=80)
-        
-        for record in records:
-            prediction = "Низкий" if record[13] == 'N' else "Высокий" if record[13] == 'Y' else "Умеренный"
-            
-            tree.insert("", "end", values=(
-                record[0], record[1], record[2], record[3], record[4], 
-                record[5], record[6], record[7], record[8], record[9], 
-                record[10], record[11], record[12], prediction, f"{float(record[14])*100:.1f}%"
-            ))
-        
-        scroll_y.config(command=tree.yview)
-        scroll_x.config(command=tree.xview)
-        
-        scroll_y.pack(side="right", fill="y")
-        scroll_x.pack(side="bottom", fill="x")
-        tree.pack(fill=tk.BOTH, expand=True)
-        
-        close_btn = tk.Button(
-            history_window, 
-            text="ЗАКРЫТЬ", 
-            command=history_window.destroy,
-            font=self.button_font,
+        self.analytics_btn.place(x=20, y=70, width=100, height=30)
+
+        self.worklist_btn = tk.Button(
+            self.root,
+            text="СПИСОК",
+            command=self.show_worklist,
+            font=self.label_font,
             bg=self.card_bg,
             fg=self.neon_blue,
             bd=0,
-            padx=20,
-            pady=10,
             activebackground="#202030",
             activeforeground=self.neon_pink
         )
-        close_btn.pack(pady=10)
+        self.worklist_btn.place(x=20, y=110, width=100, height=30)
 
-    def animate_scan_line(self):
-        self.scan_pos = (self.scan_pos + 5) % 900
+    def show_history(self):
+        """Отображение истории прогнозов"""
+        with self.metrics.stage('history.open'):
+            HistoryWindow(self)
+
+    def show_analytics(self):
+        """Сводка по дням и классам из таблицы prediction_daily"""
+        with self.metrics.stage('analytics.open'):
+            AnalyticsWindow(self)
+
+    def show_worklist(self):
+        """Рабочий список: пакет пациентов из CSV или буфера обмена"""
+        with self.metrics.stage('worklist.open'):
+            WorklistWindow(self)
+
+    def animate_scan_line(self, steps=1):
+        self.scan_pos = (self.scan_pos + 5 * steps) % 900
         self.canvas.coords(self.scan_line, 0, self.scan_pos, 900, self.scan_pos)
-        self.root.after(50, self.animate_scan_line)
 
-    def animate_pulse(self):
-        self.pulse_phase = (self.pulse_phase + 0.05) % (2 * 3.14159265)
-        pulse_val = int((0.5 + 0.5 * abs(np.sin(self.pulse_phase)) * 255))
-        pulse_color = f"#{pulse_val:02x}{pulse_val:02x}{pulse_val:02x}"
-        
-        self.canvas.itemconfig(self.scan_line, fill=pulse_color)
-        self.root.after(100, self.animate_pulse)
+    def animate_pulse(self, steps=1):
+        self.pulse_phase = (self.pulse_phase + steps) % len(PULSE_COLORS)
+        self.canvas.itemconfig(self.scan_line, fill=PULSE_COLORS[self.pulse_phase])
+
+    def toggle_metrics_panel(self):
+        if self.metrics_panel.winfo_ismapped():
+            self.metrics_panel.pack_forget()
+        else:
+            self.metrics_panel.pack(after=self.connection_status, pady=(0, 10))
+            self.update_metrics_panel()
 
-    def random_glitch(self):
-        for glitch in self.active_glitches:
-            glitch.destroy()
-        self.active_glitches = []
+    def update_metrics_panel(self, steps=1):
+        """Перцентили этапов по последним замерам и их гистограммы (от быстрых к медленным)"""
+        if not self.metrics_panel.winfo_ismapped():
+            return
+        lines = [f"{'ЭТАП':<16}{'N':>6}{'P50':>9}{'P95':>9}{'MAX':>9} МС"]
+        for name, row in sorted(self.metrics.summary().items()):
+            lines.append(f"{name:<16}{row['count']:>6}{row['p50']:>9.2f}{row['p95']:>9.2f}{row['max']:>9.2f}"
+                         f"  {self.metrics.sparkline(name)}")
+        if len(lines) == 1:
+            lines.append("НЕТ ЗАМЕРОВ")
+        self.metrics_panel.config(text="\n".join(lines))
+
+    def update_fps_label(self, steps=1):
+        stats = self.scheduler.stats()
+        mode = " ЭКОНОМ" if stats['low_power'] else ""
+        self.fps_label.config(text=f"FPS {stats['fps']:.1f} | КАДР {stats['frame_ms']:.2f} МС{mode}")
+
+    def toggle_low_power(self):
+        self.scheduler.set_low_power(self.low_power_var.get())
+        if self.low_power_var.get():
+            self.glitches.hide_all()
+
+    def random_glitch(self, steps=1):
+        self.glitches.hide_all()
         
         if random.random() < 0.2:
             x = random.randint(50, 800)
             y = random.randint(50, 600)
-            glitch_text = "".join([random.choice("01!@#$%&*") for _ in range(random.randint(5, 15))])
-            glitch_label = tk.Label(self.canvas, text=glitch_text, 
-                                   font=("Courier New", random.randint(8, 12)), 
-                                   fg=random.choice([self.neon_blue, self.neon_pink, self.neon_green]),
-                                   bg=self.bg_color)
-            self.canvas.create_window(x, y, window=glitch_label)
-            self.active_glitches.append(glitch_label)
-            
-            self.root.after(random.randint(200, 800), lambda: glitch_label.destroy())
-        
-        self.root.after(3000, self.random_glitch)
+            self.glitches.show(x, y, [self.neon_blue, self.neon_pink, self.neon_green],
+                               random.randint(200, 800))
 
     def _on_mousewheel(self, event):
         self.canvas.yview_scroll(int(-1*(event.delta/120)), "units")
@@ -389,12 +511,20 @@ class CyberDiabetesApp:
                                    fg=self.neon_blue, bd=0, padx=30, pady=12,
                                    activebackground="#202030",
                                    activeforeground=self.neon_pink,
+                                   disabledforeground=self.border_color,
                                    command=self.predict_diabetes)
         self.predict_btn.pack(pady=20)
         
         self.predict_btn.bind("<Enter>", lambda e: self.predict_btn.config(fg=self.neon_pink))
         self.predict_btn.bind("<Leave>", lambda e: self.predict_btn.config(fg=self.neon_blue))
 
+        self.cancel_btn = tk.Button(result_frame, text="ОТМЕНА",
+                                  font=self.label_font, bg=self.card_bg,
+                                  fg=self.neon_yellow, bd=0, padx=20, pady=6,
+                                  activebackground="#202030",
+                                  activeforeground=self.neon_pink,
+                                  command=self.cancel_predictions)
+
         self.result_card = tk.Frame(result_frame, bg=self.card_bg, bd=1, 
                                    relief=tk.FLAT, highlightbackground=self.neon_blue,
                                    highlightthickness=1)
@@ -417,6 +547,15 @@ class CyberDiabetesApp:
                                     bg=self.card_bg, fg=self.text_color)
         self.detail_label.pack(pady=10)
 
+        # Главные вклады признаков в вероятность результата (изменение в процентных пунктах)
+        self.factors_label = tk.Label(self.result_card, text="", font=self.label_font,
+                                      bg=self.card_bg, fg=self.neon_blue)
+        self.factors_label.pack(pady=(0, 10))
+
+        self.similar_label = tk.Label(self.result_card, text="", font=self.label_font, justify=tk.LEFT,
+                                      bg=self.card_bg, fg=self.text_color)
+        self.similar_label.pack(pady=(0, 10))
+
         self.links_frame = tk.Frame(result_frame, bg=self.bg_color)
         self.links_frame.pack(pady=15)
         
@@ -450,6 +589,24 @@ class CyberDiabetesApp:
                                         font=('Courier New', 9), fg=self.neon_green, bg=self.bg_color)
         self.connection_status.pack(pady=10)
 
+        perf_frame = tk.Frame(footer_frame, bg=self.bg_color)
+        perf_frame.pack()
+        self.low_power_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(perf_frame, text="ЭКОНОМНЫЙ РЕЖИМ", variable=self.low_power_var,
+                       command=self.toggle_low_power, font=('Courier New', 8),
+                       fg=self.text_color, bg=self.bg_color, selectcolor=self.card_bg,
+                       activebackground=self.bg_color, activeforeground=self.neon_pink,
+                       bd=0, highlightthickness=0).pack(side="left", padx=10)
+        self.fps_label = tk.Label(perf_frame, text="FPS -", font=('Courier New', 8),
+                                  fg=self.border_color, bg=self.bg_color)
+        self.fps_label.pack(side="left", padx=10)
+        tk.Button(perf_frame, text="МЕТРИКИ", command=self.toggle_metrics_panel,
+                  font=('Courier New', 8), bg=self.card_bg, fg=self.neon_blue, bd=0, padx=8,
+                  activebackground="#202030", activeforeground=self.neon_pink).pack(side="left", padx=10)
+
+        self.metrics_panel = tk.Label(footer_frame, text="", font=('Courier New', 8), justify=tk.LEFT,
+                                      fg=self.neon_green, bg=self.card_bg, padx=10, pady=5)
+
     def insert_sample_data(self):
         self.age.delete(0, tk.END)
         self.age.insert(0, "35")
@@ -503,100 +660,216 @@ class CyberDiabetesApp:
                       bd=0)
         btn.pack(pady=10)
 
+    def read_input(self):
+        """Вектор признаков из формы (1 x 11); ValueError при некорректном вводе"""
+        return [[
+            1 if self.gender.get() == 'МУЖСКОЙ' else 0,
+            float(self.age.get()),
+            float(self.urea.get()),
+            float(self.cr.get()),
+            float(self.hba1c.get()),
+            float(self.chol.get()),
+            float(self.tg.get()),
+            float(self.hdl.get()),
+            float(self.ldl.get()),
+            float(self.vldl.get()),
+            float(self.bmi.get())
+        ]]
+
     def predict_diabetes(self):
+        """Постановка анализа в очередь фонового потока; окно продолжает отрисовку"""
         try:
-            self.connection_status.config(text=">>> АНАЛИЗ ДАННЫХ... <<<", fg=self.neon_yellow)
-            self.root.update()
-            
-            self.result_card.pack_forget()
-            self.info_link.pack_forget()
-            self.doctor_link.pack_forget()
-
-            input_data = np.array([
-                [1 if self.gender.get() == 'МУЖСКОЙ' else 0],
-                [float(self.age.get())],
-                [float(self.urea.get())],
-                [float(self.cr.get())],
-                [float(self.hba1c.get())],
-                [float(self.chol.get())],
-                [float(self.tg.get())],
-                [float(self.hdl.get())],
-                [float(self.ldl.get())],
-                [float(self.vldl.get())],
-                [float(self.bmi.get())]
-            ]).reshape(1, -1)
-
-            input_scaled = self.scaler.transform(input_data)
-
-            prediction = self.model.predict(input_scaled)
-            prediction_proba = self.model.predict_proba(input_scaled)
-
-            result = self.le.inverse_transform(prediction)[0]
-            probability = prediction_proba[0][prediction[0]]
-            
-            self.save_prediction(input_data, result, probability)
+            with self.metrics.stage('predict.parse'):
+                input_data = self.read_input()
+        except ValueError:
+            self.show_glitch_error("ОШИБКА: НЕКОРРЕКТНЫЕ ДАННЫЕ")
+            self.connection_status.config(text=">>> ОШИБКА ВВОДА <<<", fg=self.neon_pink)
+            return
 
-            self.result_card.pack(pady=10, fill=tk.X, ipadx=20, ipady=20)
-            
-            if result == 'N':
-                if hasattr(self, 'warning_label'):
-                    self.warning_label.pack_forget()
-                self.ascii_art.config(text=r"""
+        if not self.model_ready or len(self.pending_predictions) >= MAX_PENDING_PREDICTIONS:
+            return
+
+        self.result_card.pack_forget()
+        self.info_link.pack_forget()
+        self.doctor_link.pack_forget()
+
+        future = self.executor.submit(self.score_and_save, input_data, time.perf_counter())
+        future.submitted = time.perf_counter()
+        self.pending_predictions.append(future)
+        self.update_queue_state()
+        if len(self.pending_predictions) == 1:
+            self.root.after(POLL_INTERVAL_MS, self.poll_predictions)
+
+    def score_and_save(self, input_data, submitted=None):
+        """Выполняется в рабочем потоке: скоринг и запись в БД, без обращений к виджетам"""
+        import scoring
+
+        if submitted is not None:
+            self.metrics.record('predict.queue', time.perf_counter() - submitted)
+        with self.metrics.stage('predict.score'):
+            labels, probabilities = scoring.score_batch(
+                self.model, self.scaler, self.le, input_data, self.prediction_cache, self.metrics)
+        result, probability = labels[0], probabilities[0]
+        explanation = scoring.explain_batch(self.model, self.scaler, input_data, metrics=self.metrics)[0]
+        similar = None
+        if self.similar is not None:
+            with self.metrics.stage('similar.query'):
+                # Сначала прогнозы, записанные после прошлого анализа; текущий в базе еще не лежит
+                self.similar.sync()
+                similar = self.similar.query(input_data)[0]
+        drifted = []
+        if self.drift is not None:
+            self.drift.update(input_data)
+            drifted = self.drift.drifted()
+        with self.metrics.stage('save.submit'):
+            self.save_prediction(input_data, result, probability, explanation)
+        return result, probability, explanation, similar, drifted
+
+    def poll_predictions(self):
+        """Забирает готовые результаты в главном потоке, сохраняя порядок постановки"""
+        while self.pending_predictions and self.pending_predictions[0].done():
+            future = self.pending_predictions.popleft()
+            if future.cancelled() or future in self.discarded_predictions:
+                self.discarded_predictions.discard(future)
+                continue
+            try:
+                result, probability, explanation, similar, drifted = future.result()
+            except Exception as e:
+                self.show_glitch_error(f"СИСТЕМНЫЙ СБОЙ: {str(e)}")
+                self.connection_status.config(text=">>> СИСТЕМНЫЙ СБОЙ <<<", fg=self.neon_pink)
+                continue
+            with self.metrics.stage('ui.result'):
+                self.show_result(result, probability, explanation, similar, drifted)
+                self.root.update_idletasks()
+            self.metrics.record('predict.total', time.perf_counter() - future.submitted)
+
+        self.update_queue_state()
+        if self.pending_predictions:
+            self.root.after(POLL_INTERVAL_MS, self.poll_predictions)
+
+    def cancel_predictions(self):
+        """Отмена ожидающих анализов; результат уже выполняющегося будет проигнорирован"""
+        for future in self.pending_predictions:
+            if not future.cancel():
+                self.discarded_predictions.add(future)
+        self.connection_status.config(text=">>> АНАЛИЗ ОТМЕНЕН <<<", fg=self.neon_yellow)
+        self.update_queue_state()
+
+    def update_queue_state(self):
+        active = [f for f in self.pending_predictions
+                  if not f.cancelled() and f not in self.discarded_predictions]
+        if active:
+            self.connection_status.config(
+                text=f">>> АНАЛИЗ ДАННЫХ... В ОЧЕРЕДИ: {len(active)} <<<", fg=self.neon_yellow)
+            self.cancel_btn.pack(pady=(0, 10), after=self.predict_btn)
+        else:
+            self.cancel_btn.pack_forget()
+        full = len(self.pending_predictions) >= MAX_PENDING_PREDICTIONS
+        self.predict_btn.config(state=tk.DISABLED if full or not self.model_ready else tk.NORMAL)
+
+    def show_result(self, result, probability, explanation=None, similar=None, drifted=None):
+        self.result_card.pack(pady=10, fill=tk.X, ipadx=20, ipady=20)
+        
+        if result == 'N':
+            if hasattr(self, 'warning_label'):
+                self.warning_label.pack_forget()
+            self.ascii_art.config(text=r"""
   ╭──────────────╮
   │   НОРМА      │
   │Все системы в │
   │  порядке     │
   ╰──────────────╯
-                """, fg=self.neon_green)
-                self.result_label.config(text="РИСК НИЗКИЙ", fg=self.neon_green)
-                self.detail_label.config(
-                    text=f"БИОМЕТРИЯ В НОРМЕ. КИБЕР-ИММУНИТЕТ УСТОЙЧИВ.\nРЕКОМЕНДУЕТСЯ СТАНДАРТНЫЙ МОНИТОРИНГ.")
-                self.info_link.pack(pady=5)
-            elif result == 'Y':
-                if hasattr(self, 'warning_label'):
-                    self.warning_label.pack(pady=10)
-                self.ascii_art.config(text=r"""
+            """, fg=self.neon_green)
+            self.result_label.config(text="РИСК НИЗКИЙ", fg=self.neon_green)
+            self.detail_label.config(
+                text=f"БИОМЕТРИЯ В НОРМЕ. КИБЕР-ИММУНИТЕТ УСТОЙЧИВ.\nРЕКОМЕНДУЕТСЯ СТАНДАРТНЫЙ МОНИТОРИНГ.")
+            self.info_link.pack(pady=5)
+        elif result == 'Y':
+            if hasattr(self, 'warning_label'):
+                self.warning_label.pack(pady=10)
+            self.ascii_art.config(text=r"""
   ╭──────────────╮
   │   ⚠ ОПАСНО  │
   │ требуются    │
   │Немедленные меры│
   ╰──────────────╯
-                """, fg="#ff0000")
-                self.result_label.config(text="ВЫСОКИЙ РИСК", fg=self.neon_pink)
-                self.detail_label.config(
-                    text=f"ОБНАРУЖЕНА АНОМАЛИЯ! \nНЕОБХОДИМА НЕМЕДЛЕННАЯ КОНСУЛЬТАЦИЯ КИБЕР-ВРАЧА.")
-                self.doctor_link.pack(pady=5)
-            else:
-                if hasattr(self, 'warning_label'):
-                    self.warning_label.pack(pady=10)
-                self.ascii_art.config(text=r"""
+            """, fg="#ff0000")
+            self.result_label.config(text="ВЫСОКИЙ РИСК", fg=self.neon_pink)
+            self.detail_label.config(
+                text=f"ОБНАРУЖЕНА АНОМАЛИЯ! \nНЕОБХОДИМА НЕМЕДЛЕННАЯ КОНСУЛЬТАЦИЯ КИБЕР-ВРАЧА.")
+            self.doctor_link.pack(pady=5)
+        else:
+            if hasattr(self, 'warning_label'):
+                self.warning_label.pack(pady=10)
+            self.ascii_art.config(text=r"""
   ╭──────────────╮
   │  ◑ ВНИМАНИЕ │
   │ Требуется    │
   │ проверка     │
   ╰──────────────╯
-                """, fg=self.neon_yellow)
-                self.result_label.config(text="УМЕРЕННЫЙ РИСК", fg=self.neon_yellow)
-                self.detail_label.config(
-                    text=f"ОБНАРУЖЕНЫ ОТКЛОНЕНИЯ.\nРЕКОМЕНДУЕТСЯ КОРРЕКЦИЯ И ДОПОЛНИТЕЛЬНЫЕ ТЕСТЫ.")
-                self.info_link.pack(pady=5)
-
+            """, fg=self.neon_yellow)
+            self.result_label.config(text="УМЕРЕННЫЙ РИСК", fg=self.neon_yellow)
+            self.detail_label.config(
+                text=f"ОБНАРУЖЕНЫ ОТКЛОНЕНИЯ.\nРЕКОМЕНДУЕТСЯ КОРРЕКЦИЯ И ДОПОЛНИТЕЛЬНЫЕ ТЕСТЫ.")
+            self.info_link.pack(pady=5)
+
+        factors = "  ·  ".join(f"{name} {value * 100:+.0f}%" for name, value in explanation or ())
+        self.factors_label.config(text=f"ГЛАВНЫЕ ФАКТОРЫ: {factors}" if factors else "")
+        self.similar_label.config(text=self.format_similar(similar))
+        if drifted:
+            # Поток анализов заметно отличается от обучающей выборки - прогнозам доверять осторожнее
+            self.connection_status.config(
+                text=f">>> АНАЛИЗ ЗАВЕРШЕН · ДРЕЙФ ДАННЫХ: {', '.join(drifted)} <<<", fg=self.neon_yellow)
+        else:
             self.connection_status.config(text=">>> АНАЛИЗ ЗАВЕРШЕН <<<", fg=self.neon_green)
-            self.canvas.yview_moveto(1)
-
-        except ValueError as e:
-            self.show_glitch_error("ОШИБКА: НЕКОРРЕКТНЫЕ ДАННЫЕ")
-            self.connection_status.config(text=">>> ОШИБКА ВВОДА <<<", fg=self.neon_pink)
-        except Exception as e:
-            self.show_glitch_error(f"СИСТЕМНЫЙ СБОЙ: {str(e)}")
-            self.connection_status.config(text=">>> СИСТЕМНЫЙ СБОЙ <<<", fg=self.neon_pink)
+        self.canvas.yview_moveto(1)
+
+    def format_similar(self, similar):
+        """Ближайшие известные случаи: исход, источник и расстояние в пространстве scaler"""
+        if not similar:
+            return ""
+        lines = ["ПОХОЖИЕ СЛУЧАИ:"]
+        for case in similar:
+            source = f"ДАТАСЕТ #{case['id']}" if case['source'] == 'csv' else f"ИСТОРИЯ #{case['id']}"
+            mark = "" if case['confirmed'] else " (ПРОГНОЗ)"
+            lines.append(f"  {CLASS_NAMES.get(case['label'], case['label']):<10} {source:<16} "
+                         f"d={case['distance']:.2f}{mark}")
+        return "\n".join(lines)
+
+    def on_close(self):
+        self.scheduler.stop()
+        for future in self.pending_predictions:
+            future.cancel()
+        # Соединение индекса принадлежит потоку скоринга - закрываем там же
+        self.executor.submit(self.close_similar)
+        self.executor.shutdown(wait=True)
+        if self.refresher is not None:
+            self.refresher.close()
+        self.writer.close()
+        self.metrics.close()
+        self.root.destroy()
 
     def __del__(self):
         if hasattr(self, 'conn'):
             self.conn.close()
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Окно прогноза риска диабета")
+    parser.add_argument('--metrics-log', metavar='PATH', help="писать длительности этапов в файл JSON-lines")
+    parser.add_argument('--auto-refresh', type=float, metavar='MINUTES',
+                        help="дообучать модель в фоне каждые MINUTES минут (model_refresh.py)")
+    parser.add_argument('--profile-startup', action='store_true', help="вывести время этапов запуска и закрыть окно")
+    parser.add_argument('--low-power', action='store_true', help="экономный режим анимации с самого запуска")
+    args = parser.parse_args(argv)
+    if args.auto_refresh is not None and args.auto_refresh <= 0:
+        parser.error("--auto-refresh должен быть положительным")
+    return args
+
+
 if __name__ == "__main__":
+    args = parse_args()
     root = tk.Tk()
-    app = CyberDiabetesApp(root)
+    app = CyberDiabetesApp(root, profile_startup=args.profile_startup, low_power=args.low_power,
+                           metrics_log=args.metrics_log, auto_refresh=args.auto_refresh)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,260 @@
+"""Обучение модели риска диабета вместо ячеек мл.ipynb.
+
+Загружает "Dataset of Diabetes .csv", подбирает гиперпараметры RandomForestClassifier
+кросс-валидацией на всех ядрах (процессы joblib, --n-jobs) и записывает артефакты, которые
+грузит приложение: diabetes_model.pkl, scaler.pkl, label_encoder.pkl, бандл модели и
+отчет с метриками. Повторяющиеся строки CSV схлопываются в одну с весом (числом повторов),
+а подготовленная матрица кэшируется по хэшу CSV в колонках float32 для загрузки через mmap.
+
+    python мл_итог/tikcet/training.py                 # поиск по сетке, артефакты в мл_итог
+    python мл_итог/tikcet/training.py --quick         # одна модель с параметрами из ноутбука
+
+Все случайные состояния задаются --seed, поэтому повторный запуск дает те же артефакты.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+import scoring
+import model_bundle
+
+CACHE_DIR = os.path.join(scoring.ARTIFACT_DIR, '.cache')
+REPORT_FILE = 'training_report.json'
+
+# Параметры из мл.ipynb
+NOTEBOOK_PARAMS = {'n_estimators': 100}
+
+PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [None, 8, 16],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 0.5],
+}
+
+
+def parse_dataset(path, ids=False):
+    """Матрица признаков в порядке scoring.FEATURES и метки классов из CSV.
+
+    Пол кодируется как в форме (F = 0, M = 1, регистр не важен), пробелы в метках
+    ('N ', 'Y ') убираются, пропуски заполняются средним по колонке, как в ноутбуке.
+    С ids=True третьим элементом возвращается колонка ID (без нее или для нечислового
+    значения - номер строки данных с 1).
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader)]
+        feature_idx = [header.index(name.lower()) for name in scoring.FEATURES]
+        class_idx = header.index('class')
+        id_idx = header.index('id') if 'id' in header else None
+        rows, labels, case_ids = [], [], []
+        for record in reader:
+            if not record:
+                continue
+            row = [float(scoring.encode_gender(record[feature_idx[0]]))]
+            row.extend(float(record[i]) if record[i].strip() else np.nan for i in feature_idx[1:])
+            rows.append(row)
+            labels.append(record[class_idx].strip().upper())
+            if ids:
+                try:
+                    case_ids.append(int(record[id_idx]))
+                except (TypeError, ValueError):
+                    case_ids.append(len(rows))
+    X = np.array(rows, dtype=np.float64)
+    if np.isnan(X).any():
+        means = np.nanmean(X, axis=0)
+        X = np.where(np.isnan(X), means, X)
+    if ids:
+        return X, np.array(labels), np.array(case_ids, dtype=np.int64)
+    return X, np.array(labels)
+
+
+def unique_rows(X, y):
+    """Индексы первого появления уникальных строк (признаки и класс) по порядку и число повторов"""
+    rows = np.column_stack([X, np.unique(y, return_inverse=True)[1]])
+    _, first, counts = np.unique(rows, axis=0, return_index=True, return_counts=True)
+    order = np.argsort(first)
+    return first[order], counts[order]
+
+
+def deduplicate(X, y):
+    """Схлопывание одинаковых строк (признаки и класс): (X, y, weights) в порядке первого появления,
+    weights - число повторов строки, передается в fit как sample_weight"""
+    keep, counts = unique_rows(X, y)
+    return X[keep], y[keep], counts.astype(np.float32)
+
+
+def dataset_ids(path=model_bundle.TRAINING_DATA):
+    """ID из CSV для строк load_dataset: ID первого появления каждой уникальной строки"""
+    X, y, case_ids = parse_dataset(path, ids=True)
+    keep, _ = unique_rows(X, y)
+    return case_ids[keep]
+
+
+def load_dataset(path=model_bundle.TRAINING_DATA, cache_dir=CACHE_DIR):
+    """Очищенный набор без дубликатов: (X, y, weights, digest).
+
+    X - float32 по колонкам (порядок Fortran), y - метки, weights - число повторов строки.
+    Кэш - каталог dataset-v2-<SHA-256 CSV> с .npy, которые открываются через mmap, поэтому
+    повторная загрузка не читает файл целиком; cache_dir=None - разбор CSV без кэша.
+    """
+    digest = model_bundle.file_sha256(path)
+    if cache_dir is None:
+        X, y, weights = deduplicate(*parse_dataset(path))
+        return np.asfortranarray(X, dtype=np.float32), y, weights, digest
+
+    cache = os.path.join(cache_dir, f"dataset-v2-{digest[:16]}")
+    if not os.path.isdir(cache):
+        X, y, weights = deduplicate(*parse_dataset(path))
+        tmp = f"{cache}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, 'X.npy'), np.asfortranarray(X, dtype=np.float32))
+        np.save(os.path.join(tmp, 'y.npy'), y)
+        np.save(os.path.join(tmp, 'weights.npy'), weights)
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'source': os.path.basename(path), 'sha256': digest, 'features': scoring.FEATURES,
+                       'rows': int(weights.sum()), 'unique_rows': int(len(weights))}, f, ensure_ascii=False)
+        try:
+            os.rename(tmp, cache)
+        except OSError:
+            # Кэш уже собран параллельным процессом
+            shutil.rmtree(tmp, ignore_errors=True)
+    return tuple(np.load(os.path.join(cache, f"{name}.npy"), mmap_mode='r')
+                 for name in ('X', 'y', 'weights')) + (digest,)
+
+
+def train(X, y, param_grid=None, cv=5, n_jobs=-1, seed=42, test_size=0.2, sample_weight=None):
+    """Подбор и обучение модели.
+
+    Возвращает (model, scaler, le, report). Масштабатор обучается внутри конвейера,
+    поэтому на каждом фолде он видит только обучающую часть. sample_weight (число повторов
+    строки из load_dataset) передается лесу; метрики считаются по уникальным строкам.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+    from sklearn.model_selection import GridSearchCV, StratifiedKFold, train_test_split
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    le = LabelEncoder()
+    y_encoded = le.fit_transform(y)
+    if sample_weight is None:
+        sample_weight = np.ones(len(X), dtype=np.float32)
+    X_train, X_test, y_train, y_test, w_train, _ = train_test_split(
+        X, y_encoded, sample_weight, test_size=test_size, random_state=seed, stratify=y_encoded)
+
+    pipeline = Pipeline([
+        ('scaler', StandardScaler()),
+        ('model', RandomForestClassifier(random_state=seed, n_jobs=1)),
+    ])
+    grid = {f"model__{name}": values for name, values in (param_grid or PARAM_GRID).items()}
+    started = time.perf_counter()
+    if all(len(values) == 1 for values in grid.values()):
+        # Один кандидат: без кросс-валидации, но лес строится на всех ядрах
+        pipeline.set_params(**{name: values[0] for name, values in grid.items()}, model__n_jobs=n_jobs)
+        pipeline.fit(X_train, y_train, model__sample_weight=w_train)
+        pipeline.set_params(model__n_jobs=None)
+        best, cv_report = pipeline, None
+    else:
+        search = GridSearchCV(
+            pipeline, grid, scoring='f1_macro',
+            cv=StratifiedKFold(cv, shuffle=True, random_state=seed),
+            n_jobs=n_jobs, refit=True,
+        )
+        search.fit(X_train, y_train, model__sample_weight=w_train)
+        best = search.best_estimator_
+        cv_report = {
+            'scoring': 'f1_macro',
+            'folds': cv,
+            'candidates': len(search.cv_results_['params']),
+            'best_score': float(search.best_score_),
+            'best_score_std': float(search.cv_results_['std_test_score'][search.best_index_]),
+        }
+    fit_seconds = time.perf_counter() - started
+
+    scaler, model = best.named_steps['scaler'], best.named_steps['model']
+    y_pred = model.predict(scaler.transform(X_test))
+    labels = [str(label) for label in le.classes_]
+    report = {
+        'params': {name: value for name, value in model.get_params().items()
+                   if name in ('n_estimators', 'max_depth', 'min_samples_leaf', 'max_features', 'random_state')},
+        'cv': cv_report,
+        'fit_seconds': round(fit_seconds, 3),
+        'n_jobs': n_jobs,
+        'seed': seed,
+        'n_train': int(len(X_train)),
+        'n_test': int(len(X_test)),
+        'test_accuracy': float(accuracy_score(y_test, y_pred)),
+        'classification_report': classification_report(
+            y_test, y_pred, labels=range(len(labels)), target_names=labels, output_dict=True, zero_division=0),
+        'confusion_matrix': confusion_matrix(y_test, y_pred, labels=range(len(labels))).tolist(),
+        'classes': labels,
+    }
+    return model, scaler, le, report
+
+
+def save_artifacts(model, scaler, le, output_dir, training_data):
+    """Запись .pkl (через временные файлы) и бандла, собранного из них"""
+    import joblib
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, obj in ((scoring.MODEL_FILE, model), (scoring.SCALER_FILE, scaler),
+                      (scoring.LABEL_ENCODER_FILE, le)):
+        path = os.path.join(output_dir, name)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        joblib.dump(obj, tmp)
+        os.replace(tmp, path)
+    bundle = os.path.join(output_dir, os.path.basename(model_bundle.BUNDLE_DIR))
+    return model_bundle.build_bundle(model, scaler, le, bundle, training_data, source_dir=output_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обучение модели риска диабета")
+    parser.add_argument('--data', default=model_bundle.TRAINING_DATA, help="обучающий CSV")
+    parser.add_argument('--output-dir', default=scoring.ARTIFACT_DIR, help="куда записать .pkl, бандл и отчет")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="число процессов (-1 - все ядра)")
+    parser.add_argument('--cv', type=int, default=5, help="число фолдов кросс-валидации")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--quick', action='store_true', help="без поиска: параметры из мл.ipynb")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="каталог кэша подготовленных данных")
+    parser.add_argument('--no-cache', action='store_true', help="не использовать кэш данных")
+    parser.add_argument('--dry-run', action='store_true', help="только метрики, артефакты не записываются")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    X, y, weights, digest = load_dataset(args.data, None if args.no_cache else args.cache_dir)
+    load_seconds = time.perf_counter() - started
+
+    grid = {name: [value] for name, value in NOTEBOOK_PARAMS.items()} if args.quick else PARAM_GRID
+    model, scaler, le, report = train(X, y, grid, cv=args.cv, n_jobs=args.n_jobs, seed=args.seed,
+                                      sample_weight=weights)
+    report.update({
+        'data': os.path.basename(args.data),
+        'data_sha256': digest,
+        'n_rows': int(weights.sum()),
+        'n_unique_rows': int(len(X)),
+        'load_seconds': round(load_seconds, 3),
+    })
+
+    if not args.dry_run:
+        save_artifacts(model, scaler, le, args.output_dir, args.data)
+        with open(os.path.join(args.output_dir, REPORT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    cv = report['cv']
+    if cv is not None:
+        print(f"кросс-валидация: {cv['candidates']} кандидатов x {cv['folds']} фолдов, "
+              f"{cv['scoring']} {cv['best_score']:.4f} ± {cv['best_score_std']:.4f}")
+    print(f"параметры: {report['params']}")
+    print(f"точность на отложенной выборке: {report['test_accuracy']:.4f} ({report['n_test']} строк)")
+    print(f"данные {report['load_seconds']:.2f} с, обучение {report['fit_seconds']:.2f} с", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""Рабочий список: много пациентов из CSV или буфера обмена, проверка и анализ одним пакетом.
+
+Строки разбираются и проверяются все сразу (ошибки видны в колонке "Статус"), корректные
+скорятся в потоке скоринга окна блоками по WORKLIST_CHUNK строк - каждый блок одним вызовом
+score_batch (transform + predict_proba) - и пишутся в predictions одной пачкой писателя, то есть
+одной транзакцией. Таблица сортируется щелчком по заголовку.
+"""
+import csv
+import io
+import math
+import time
+import tkinter as tk
+from tkinter import filedialog, ttk
+
+from analytics_view import CLASS_NAMES
+from history_view import COLUMNS as HISTORY_COLUMNS
+from stage_metrics import stage
+
+# Пол, возраст и анализы - те же подписи, что в истории
+FEATURE_COLUMNS = HISTORY_COLUMNS[2:13]
+COLUMNS = ["№", "ID", *FEATURE_COLUMNS, "Прогноз", "Вероятность", "Главный фактор", "Статус"]
+WORKLIST_CHUNK = 1000
+POLL_INTERVAL_MS = 50
+
+
+class WorklistRow:
+    """Строка списка: номер строки во входе, ID пациента, признаки или ошибка и результат анализа"""
+
+    __slots__ = ('line', 'patient', 'values', 'error', 'label', 'probability', 'factor')
+
+    def __init__(self, line, patient, values=None, error=None):
+        self.line = line
+        self.patient = patient
+        self.values = values
+        self.error = error
+        self.label = self.probability = self.factor = None
+
+
+def _number(text, delimiter):
+    # В CSV с ';' или табуляцией из русского Excel дробная часть отделяется запятой
+    text = text.strip()
+    return float(text.replace(',', '.') if delimiter != ',' else text)
+
+
+def parse_worklist(text):
+    """Разбор CSV/TSV: с заголовком как в "Dataset of Diabetes .csv" или без него.
+
+    Без заголовка в строке 11 признаков в порядке scoring.FEATURES, перед ними может стоять ID.
+    Возвращает список WorklistRow; у некорректных строк values = None и текст ошибки.
+    """
+    import scoring
+
+    # Разделитель по первой строке: табуляция (копия из таблицы), ';' (русский Excel) или ','
+    # Файл читается с newline='', а исходный CSV размечен одиночными CR - приводим переводы строк
+    lines = text.strip().splitlines() or ['']
+    delimiter = next((d for d in '\t;' if d in lines[0]), ',')
+    records = [record for record in csv.reader(io.StringIO(text, newline=None), delimiter=delimiter)
+               if any(cell.strip() for cell in record)]
+    if not records:
+        return []
+
+    n_features = len(scoring.FEATURES)
+    names = {cell.strip().lower() for cell in records[0]}
+    if any(feature.lower() in names for feature in scoring.FEATURES):
+        from batch_score import column_index
+
+        feature_idx, passthrough = column_index(records[0])
+        id_idx = passthrough[0][1] if passthrough else None
+        records = records[1:]
+        first_line = 2
+    else:
+        feature_idx = id_idx = None
+        first_line = 1
+
+    rows = []
+    for line, record in enumerate(records, start=first_line):
+        if feature_idx is None:
+            if len(record) not in (n_features, n_features + 1):
+                rows.append(WorklistRow(line, "", error=f"ожидается {n_features} значений, получено {len(record)}"))
+                continue
+            patient = record[0].strip() if len(record) > n_features else ""
+            cells = record[-n_features:]
+        else:
+            if len(record) <= max(feature_idx):
+                rows.append(WorklistRow(line, "", error="не хватает колонок"))
+                continue
+            patient = record[id_idx].strip() if id_idx is not None and id_idx < len(record) else ""
+            cells = [record[i] for i in feature_idx]
+        try:
+            values = [float(scoring.encode_gender(cells[0]))]
+        except ValueError as e:
+            rows.append(WorklistRow(line, patient, error=str(e)))
+            continue
+        bad = []
+        for name, cell in zip(scoring.FEATURES[1:], cells[1:]):
+            try:
+                value = _number(cell, delimiter)
+            except ValueError:
+                bad.append(name)
+                continue
+            if not math.isfinite(value) or value < 0:
+                bad.append(name)
+            values.append(value)
+        if bad:
+            rows.append(WorklistRow(line, patient, error=f"неверные значения: {', '.join(bad)}"))
+        else:
+            rows.append(WorklistRow(line, patient, values))
+    return rows
+
+
+class WorklistWindow:
+    """Пакет пациентов: импорт, проверка, анализ в фоне с прогрессом и сортируемые результаты"""
+
+    def __init__(self, app):
+        self.app = app
+        self.rows = []
+        self.items = {}
+        self.job = None
+        self.job_started = None
+        # Сколько строк уже прошло скоринг; пишет поток скоринга, читает главный поток
+        self.scored = 0
+        self.sort_column = None
+        self.sort_reverse = False
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("РАБОЧИЙ СПИСОК")
+        self.window.geometry("1200x650")
+        self.window.configure(bg=app.bg_color)
+
+        bar = tk.Frame(self.window, bg=app.bg_color)
+        bar.pack(fill=tk.X, padx=10, pady=(10, 0))
+        self.buttons = []
+        for text, command, color in (("ИМПОРТ CSV", self.import_csv, app.neon_blue),
+                                     ("ВСТАВИТЬ", self.paste, app.neon_blue),
+                                     ("АНАЛИЗИРОВАТЬ ВСЕ", self.analyze, app.neon_green),
+                                     ("ОЧИСТИТЬ", self.clear, app.neon_yellow)):
+            button = tk.Button(bar, text=text, command=command,
+                               font=app.label_font, bg=app.card_bg, fg=color, bd=0, padx=10,
+                               activebackground="#202030", activeforeground=app.neon_pink)
+            button.pack(side="left", padx=(0, 10))
+            self.buttons.append(button)
+
+        self.progress = ttk.Progressbar(bar, orient="horizontal", mode="determinate", length=250)
+        self.progress.pack(side="right")
+
+        self.create_tree()
+
+        self.status = tk.Label(self.window, text=">>> ИМПОРТИРУЙТЕ CSV ИЛИ ВСТАВЬТЕ СТРОКИ ИЗ ТАБЛИЦЫ <<<",
+                               font=app.label_font, bg=app.bg_color, fg=app.neon_green)
+        self.status.pack()
+
+        tk.Button(self.window, text="ЗАКРЫТЬ", command=self.window.destroy,
+                  font=app.button_font, bg=app.card_bg, fg=app.neon_blue, bd=0, padx=20, pady=10,
+                  activebackground="#202030", activeforeground=app.neon_pink).pack(pady=10)
+
+    def create_tree(self):
+        tree_frame = tk.Frame(self.window, bg=self.app.bg_color)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        scroll_y = ttk.Scrollbar(tree_frame, orient="vertical")
+        scroll_x = ttk.Scrollbar(tree_frame, orient="horizontal")
+        self.tree = ttk.Treeview(tree_frame, columns=COLUMNS, show="headings",
+                                 yscrollcommand=scroll_y.set, xscrollcommand=scroll_x.set)
+        for col in COLUMNS:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=75, anchor="center")
+        self.tree.column("№", width=45)
+        self.tree.column("ID", width=70)
+        self.tree.column("Прогноз", width=95)
+        self.tree.column("Главный фактор", width=120)
+        self.tree.column("Статус", width=260, anchor="w")
+        self.tree.tag_configure('error', foreground=self.app.neon_pink)
+        self.tree.tag_configure('Y', foreground=self.app.neon_pink)
+        self.tree.tag_configure('P', foreground=self.app.neon_yellow)
+        self.tree.tag_configure('N', foreground=self.app.neon_green)
+
+        scroll_y.config(command=self.tree.yview)
+        scroll_x.config(command=self.tree.xview)
+        scroll_y.pack(side="right", fill="y")
+        scroll_x.pack(side="bottom", fill="x")
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+    def import_csv(self):
+        path = filedialog.askopenfilename(parent=self.window, title="CSV С АНАЛИЗАМИ",
+                                          filetypes=[("CSV", "*.csv *.tsv *.txt"), ("Все файлы", "*")])
+        if not path:
+            return
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            self.status.config(text=f">>> НЕ УДАЛОСЬ ПРОЧИТАТЬ ФАЙЛ: {e} <<<", fg=self.app.neon_pink)
+            return
+        self.load_text(text)
+
+    def paste(self):
+        try:
+            text = self.window.clipboard_get()
+        except tk.TclError:
+            text = ""
+        self.load_text(text)
+
+    def load_text(self, text):
+        """Разбор и проверка всех строк сразу; корректные ждут анализа"""
+        if self.job is not None:
+            return
+        try:
+            with stage(self.app.metrics, 'worklist.parse'):
+                rows = parse_worklist(text)
+        except ValueError as e:
+            # Заголовок есть, но без нужных колонок
+            self.status.config(text=f">>> {str(e).upper()} <<<", fg=self.app.neon_pink)
+            return
+        if not rows:
+            self.status.config(text=">>> НЕТ СТРОК ДЛЯ АНАЛИЗА <<<", fg=self.app.neon_yellow)
+            return
+        self.rows = rows
+        self.render()
+        errors = sum(row.values is None for row in rows)
+        self.status.config(text=f">>> СТРОК: {len(rows)}, К АНАЛИЗУ: {len(rows) - errors}, С ОШИБКАМИ: {errors} <<<",
+                           fg=self.app.neon_yellow if errors else self.app.neon_green)
+
+    def format_row(self, row):
+        import scoring
+
+        if row.values is None:
+            features = [""] * len(FEATURE_COLUMNS)
+        else:
+            features = [scoring.gender_label(row.values[0]), f"{row.values[1]:g}",
+                        *(f"{value:g}" for value in row.values[2:])]
+        if row.label is None:
+            result = ["", "", ""]
+            status = f"ОШИБКА: {row.error}" if row.error else "ОЖИДАЕТ"
+        else:
+            result = [CLASS_NAMES.get(row.label, row.label), f"{row.probability * 100:.1f}%", row.factor]
+            status = "ГОТОВО"
+        return (row.line, row.patient, *features, *result, status)
+
+    def render(self):
+        with stage(self.app.metrics, 'worklist.render'):
+            self.tree.delete(*self.tree.get_children())
+            self.items = {}
+            for row in self.rows:
+                tag = 'error' if row.values is None else (row.label or '')
+                self.items[self.tree.insert("", "end", values=self.format_row(row), tags=(tag,))] = row
+        if self.sort_column is not None:
+            self.sort_by(self.sort_column, toggle=False)
+
+    def sort_key(self, column, row):
+        """Ключ сортировки по исходным значениям: числа - как числа, пустые - в конце"""
+        if column == "№":
+            return (0, row.line)
+        if column == "ID":
+            return (0, row.patient)
+        if column in FEATURE_COLUMNS:
+            if row.values is None:
+                return (1, 0.0)
+            return (0, row.values[FEATURE_COLUMNS.index(column)])
+        if column == "Прогноз":
+            return (0, "NPY".find(row.label)) if row.label else (1, 0)
+        if column == "Вероятность":
+            return (0, row.probability) if row.label else (1, 0.0)
+        if column == "Главный фактор":
+            return (0, row.factor) if row.label else (1, "")
+        return (0, row.error or "")
+
+    def sort_by(self, column, toggle=True):
+        if toggle:
+            self.sort_reverse = column == self.sort_column and not self.sort_reverse
+        self.sort_column = column
+        ordered = sorted(self.items, key=lambda item: self.sort_key(column, self.items[item]),
+                         reverse=self.sort_reverse)
+        for index, item in enumerate(ordered):
+            self.tree.move(item, "", index)
+        for col in COLUMNS:
+            arrow = (" ▼" if self.sort_reverse else " ▲") if col == column else ""
+            self.tree.heading(col, text=col + arrow)
+
+    def clear(self):
+        if self.job is not None:
+            return
+        self.rows = []
+        self.render()
+        self.progress.config(value=0)
+        self.status.config(text=">>> СПИСОК ОЧИЩЕН <<<", fg=self.app.neon_green)
+
+    def analyze(self):
+        pending = [row for row in self.rows if row.values is not None and row.label is None]
+        if self.job is not None or not pending:
+            return
+        if not self.app.model_ready:
+            self.status.config(text=">>> МОДЕЛЬ ЕЩЕ ЗАГРУЖАЕТСЯ <<<", fg=self.app.neon_yellow)
+            return
+        for button in self.buttons:
+            button.config(state=tk.DISABLED)
+        self.scored = 0
+        self.progress.config(maximum=len(pending), value=0)
+        self.status.config(text=f">>> АНАЛИЗ {len(pending)} ПАЦИЕНТОВ... <<<", fg=self.app.neon_yellow)
+        self.job_started = time.perf_counter()
+        # Тот же поток, что у одиночного анализа: модель и монитор дрейфа читаются только в нем
+        self.job = self.app.executor.submit(self.score_rows, pending)
+        self.window.after(POLL_INTERVAL_MS, self.poll_job)
+
+    def score_rows(self, rows):
+        """Выполняется в потоке скоринга: скоринг блоками, вклады признаков, одна запись в predictions"""
+        import numpy as np
+
+        import scoring
+
+        app = self.app
+        X = np.array([row.values for row in rows], dtype=np.float64)
+        labels, probabilities, explanations = [], [], []
+        with stage(app.metrics, 'worklist.score'):
+            for start in range(0, len(X), WORKLIST_CHUNK):
+                chunk = X[start:start + WORKLIST_CHUNK]
+                chunk_labels, chunk_probabilities = scoring.score_batch(
+                    app.model, app.scaler, app.le, chunk, app.prediction_cache)
+                labels.extend(chunk_labels.tolist())
+                probabilities.extend(chunk_probabilities.tolist())
+                explanations.extend(scoring.explain_batch(app.model, app.scaler, chunk))
+                self.scored = start + len(chunk)
+        if app.drift is not None:
+            app.drift.update(X)
+        with stage(app.metrics, 'worklist.save'):
+            # Одна пачка писателя - одна транзакция; flush - чтобы "ГОТОВО" означало записано
+            # (если писатель упал, flush поднимет WriterError - это уйдет в СБОЙ АНАЛИЗА)
+            app.writer.submit(scoring.prediction_rows(X, labels, probabilities, explanations=explanations))
+            app.writer.flush()
+        return labels, probabilities, explanations
+
+    def poll_job(self):
+        if not self.window.winfo_exists():
+            return
+        self.progress.config(value=self.scored)
+        if not self.job.done():
+            self.window.after(POLL_INTERVAL_MS, self.poll_job)
+            return
+        job, self.job = self.job, None
+        for button in self.buttons:
+            button.config(state=tk.NORMAL)
+        try:
+            labels, probabilities, explanations = job.result()
+        except Exception as e:
+            self.status.config(text=f">>> СБОЙ АНАЛИЗА: {e} <<<", fg=self.app.neon_pink)
+            return
+        pending = [row for row in self.rows if row.values is not None and row.label is None]
+        for row, label, probability, explanation in zip(pending, labels, probabilities, explanations):
+            row.label, row.probability = label, probability
+            row.factor = f"{explanation[0][0]} {explanation[0][1] * 100:+.0f}%" if explanation else ""
+        self.render()
+        elapsed = time.perf_counter() - self.job_started
+        counts = {label: labels.count(label) for label in CLASS_NAMES}
+        summary = ", ".join(f"{name}: {counts[label]}" for label, name in CLASS_NAMES.items())
+        self.status.config(text=f">>> ПРОАНАЛИЗИРОВАНО {len(labels)} ЗА {elapsed:.2f} С · {summary} <<<",
+                           fg=self.app.neon_green)